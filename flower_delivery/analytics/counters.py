@@ -0,0 +1,40 @@
+from datetime import date as date_type
+from decimal import Decimal
+from typing import Optional
+import pytz
+from django.db.models import F
+from django.utils import timezone
+from .models import DailyReport
+
+MOSCOW_TZ = pytz.timezone('Europe/Moscow')
+
+
+def business_date(moment=None) -> date_type:
+    """Дата рабочего дня по московскому времени"""
+    return timezone.localtime(moment or timezone.now(), MOSCOW_TZ).date()
+
+
+def ensure_daily_report(date: date_type) -> None:
+    """Создание строки отчёта за день без риска IntegrityError при гонке"""
+    DailyReport.objects.bulk_create([DailyReport(date=date)], ignore_conflicts=True)
+
+
+def apply_daily_delta(date: date_type, orders: int = 0, revenue: Optional[Decimal] = None) -> None:
+    """
+    Атомарное изменение счётчиков отчёта за день.
+
+    Приращение выполняется в БД через F(), поэтому параллельные заказы не теряют обновлений.
+    """
+    changes = {
+        'order_count': F('order_count') + orders,
+        'total_revenue': F('total_revenue') + (revenue or Decimal('0.00')),
+    }
+    if DailyReport.objects.filter(date=date).update(**changes):
+        return
+    ensure_daily_report(date)
+    DailyReport.objects.filter(date=date).update(**changes)
+
+
+def record_order(order) -> None:
+    """Учёт нового заказа в отчёте за день его создания; учтённая сумма — order.reported_amount"""
+    apply_daily_delta(business_date(order.created_at), 1, order.reported_amount)
@@ -0,0 +1,31 @@
+from django.db.models import Avg, DurationField, ExpressionWrapper, F, OuterRef, Q, Subquery
+from orders.models import Order, OrderStatusHistory
+
+
+def average_status_durations(since=None) -> dict:
+    """
+    Среднее время пребывания заказов в каждом статусе.
+
+    Время выхода из статуса берётся из следующей записи истории того же заказа
+    подзапросом по индексу (order, changed_at), а среднее по статусам считает
+    сама БД: в Python возвращается по строке на статус.
+    """
+    history = OrderStatusHistory.objects.all()
+    if since is not None:
+        history = history.filter(order__created_at__gte=since)
+    following = OrderStatusHistory.objects.filter(
+        Q(changed_at__gt=OuterRef('changed_at')) | Q(changed_at=OuterRef('changed_at'), id__gt=OuterRef('id')),
+        order_id=OuterRef('order_id'),
+    ).order_by('changed_at', 'id').values('changed_at')[:1]
+    rows = history.annotate(left_at=Subquery(following)).values('to_status').annotate(
+        duration=Avg(ExpressionWrapper(F('left_at') - F('changed_at'), output_field=DurationField()))
+    ).order_by().values_list('to_status', 'duration')
+    # Для текущего статуса следующей записи нет, такие строки AVG пропускает
+    durations = {status: duration for status, duration in rows if duration is not None}
+
+    labels = dict(Order.STATUS_CHOICES)
+    return {
+        labels[status]: durations[status]
+        for status, _ in Order.STATUS_CHOICES
+        if status in durations
+    }
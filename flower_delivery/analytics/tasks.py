@@ -1,7 +1,6 @@
 import logging
 from celery import shared_task
-from .models import DailyReport
-from django.utils import timezone
+from .counters import business_date, ensure_daily_report
 from bot.telegram import trigger_daily_report
 
 logger = logging.getLogger(__name__)
@@ -13,14 +12,7 @@ def send_daily_report_task():
     """
     logger.info("Запуск задачи ежедневного отчета...")
     try:
-        today = timezone.now().date()
-        report, created = DailyReport.objects.get_or_create(date=today)
-
-        if created:
-            report.order_count = 0
-            report.total_revenue = 0.00
-            report.save()
-
+        ensure_daily_report(business_date())
         trigger_daily_report()
     except Exception as e:
         logger.error(f"Ошибка в задаче ежедневного отчета: {e}", exc_info=True)
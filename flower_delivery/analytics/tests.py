@@ -1,7 +1,14 @@
-from django.test import TestCase, Client
+import threading
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, Client
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from analytics.models import DailyReport
+from analytics.counters import apply_daily_delta, business_date
+from analytics.reports import average_status_durations
+from orders.models import Order, OrderStatusHistory
 from django.utils import timezone
 from django.utils.formats import date_format, number_format
 
@@ -92,3 +99,84 @@ class AnalyticsTests(TestCase):
         # Проверяем, что доступ запрещен
         self.assertEqual(response.status_code, 302)  # Ожидается редирект
         self.assertRedirects(response, '/admin/login/?next=/analytics/reports/')
+
+
+class DailyCountersTests(TestCase):
+    def test_business_date_uses_moscow_time(self):
+        # 22:30 UTC 31 декабря — это уже 1 января по Москве
+        moment = datetime(2024, 12, 31, 22, 30, tzinfo=dt_timezone.utc)
+        self.assertEqual(business_date(moment), date(2025, 1, 1))
+
+    def test_apply_daily_delta_creates_and_updates(self):
+        day = date(2025, 3, 8)
+        apply_daily_delta(day, 1, Decimal('1500.00'))
+        apply_daily_delta(day, 2, Decimal('300.50'))
+        apply_daily_delta(day, -1, Decimal('-1500.00'))
+        report = DailyReport.objects.get(date=day)
+        self.assertEqual(report.order_count, 2)
+        self.assertEqual(report.total_revenue, Decimal('300.50'))
+
+    def test_apply_daily_delta_existing_row_single_query(self):
+        day = date(2025, 2, 14)
+        DailyReport.objects.create(date=day)
+        with self.assertNumQueries(1):
+            apply_daily_delta(day, 1, Decimal('100.00'))
+
+
+class DailyCountersConcurrencyTests(TransactionTestCase):
+    THREADS = 8
+    INCREMENTS = 250
+
+    def test_concurrent_increments_are_not_lost(self):
+        day = date(2025, 3, 8)
+        errors = []
+        barrier = threading.Barrier(self.THREADS)
+
+        def worker():
+            try:
+                barrier.wait()
+                for _ in range(self.INCREMENTS):
+                    apply_daily_delta(day, 1, Decimal('10.00'))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        report = DailyReport.objects.get(date=day)
+        total = self.THREADS * self.INCREMENTS
+        self.assertEqual(report.order_count, total)
+        self.assertEqual(report.total_revenue, Decimal('10.00') * total)
+
+
+class StatusDurationsTests(TestCase):
+    def test_average_status_durations(self):
+        user = get_user_model().objects.create_user(
+            username='timinguser',
+            email='timinguser@example.com',
+            password='testpass123'
+        )
+        start = timezone.now()
+        for minutes_in_new in (10, 30):
+            order = Order.objects.create(
+                user=user,
+                delivery_address='Москва',
+                delivery_time=start + timezone.timedelta(hours=3)
+            )
+            OrderStatusHistory.objects.filter(order=order).update(changed_at=start)
+            OrderStatusHistory.objects.create(
+                order=order,
+                from_status='new',
+                to_status='in_progress',
+                changed_at=start + timezone.timedelta(minutes=minutes_in_new)
+            )
+
+        with self.assertNumQueries(1):
+            durations = average_status_durations()
+        self.assertEqual(durations, {'Новый': timezone.timedelta(minutes=20)})
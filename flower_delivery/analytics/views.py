@@ -1,8 +1,12 @@
 from django.shortcuts import render
 from django.contrib.admin.views.decorators import staff_member_required
 from .models import DailyReport
+from .reports import average_status_durations
 
 @staff_member_required
 def daily_report_list(request):
     reports = DailyReport.objects.all()
-    return render(request, 'analytics/daily_report_list.html', {'reports': reports})
\ No newline at end of file
+    return render(request, 'analytics/daily_report_list.html', {
+        'reports': reports,
+        'status_durations': average_status_durations(),
+    })
\ No newline at end of file
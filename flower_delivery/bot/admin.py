@@ -0,0 +1,8 @@
+from django.contrib import admin
+from .models import NotificationOutbox
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at']
+    list_filter = ['status', 'kind']
+    readonly_fields = ['created_at', 'sent_at', 'claim_token', 'claimed_until']
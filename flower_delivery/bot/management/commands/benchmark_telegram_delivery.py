@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+from aiohttp import web
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from django.core.management.base import BaseCommand
+from bot.runtime import DeliveryRuntime
+
+STUB_TOKEN = '123456:benchmark'
+
+
+async def _stub_handler(request):
+    data = await request.post()
+    return web.json_response({
+        'ok': True,
+        'result': {
+            'message_id': 1,
+            'date': int(time.time()),
+            'chat': {'id': int(data.get('chat_id', 1)), 'type': 'private'},
+            'text': data.get('text', ''),
+        },
+    })
+
+
+class StubTelegramServer:
+    """Локальная заглушка Bot API в отдельном потоке"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.url = None
+        self._runner = None
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self.loop).result()
+        return self
+
+    async def _start(self):
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', _stub_handler)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f'http://127.0.0.1:{port}'
+
+    def __exit__(self, *exc):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+
+class Command(BaseCommand):
+    help = 'Сравнение стоимости отправки сообщения: новый цикл и сессия на каждое сообщение против долгоживущего цикла'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=200)
+
+    def _make_bot(self, url):
+        return Bot(token=STUB_TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(url)))
+
+    def _per_message_loop(self, url, count):
+        # Прежняя схема: новый цикл событий и новая сессия на каждое уведомление
+        started = time.perf_counter()
+        for i in range(count):
+            bot = self._make_bot(url)
+            loop = asyncio.new_event_loop()
+            try:
+                loop.run_until_complete(bot.send_message(chat_id=1, text=f'Сообщение {i}'))
+                loop.run_until_complete(bot.session.close())
+            finally:
+                loop.close()
+        return time.perf_counter() - started
+
+    def _shared_runtime(self, url, count):
+        bot = self._make_bot(url)
+        runtime = DeliveryRuntime(shutdown_hooks=[bot.session.close])
+        runtime.run(bot.send_message(chat_id=1, text='Прогрев'))
+        started = time.perf_counter()
+        for i in range(count):
+            runtime.run(bot.send_message(chat_id=1, text=f'Сообщение {i}'))
+        elapsed = time.perf_counter() - started
+        runtime.shutdown()
+        return elapsed
+
+    def handle(self, *args, **options):
+        count = options['messages']
+        with StubTelegramServer() as server:
+            before = self._per_message_loop(server.url, count)
+            after = self._shared_runtime(server.url, count)
+
+        self.stdout.write(f"Сообщений: {count}")
+        self.stdout.write(f"Новый цикл и сессия на сообщение: {before / count * 1000:.2f} мс/сообщение")
+        self.stdout.write(f"Долгоживущий цикл доставки:       {after / count * 1000:.2f} мс/сообщение")
+        self.stdout.write(self.style.SUCCESS(f"Ускорение: {before / after:.1f}x"))
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.4 on 2026-10-18 08:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0002_telegram_file'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notificationoutbox',
+            name='kind',
+            field=models.CharField(choices=[('order', 'Уведомление о заказе'), ('digest', 'Сводка по заказам')], max_length=20, verbose_name='Тип'),
+        ),
+    ]
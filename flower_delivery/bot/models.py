@@ -0,0 +1,53 @@
+from django.db import models
+from django.utils import timezone
+from catalog.models import Product
+
+class NotificationOutbox(models.Model):
+    KIND_CHOICES = (
+        ('order', 'Уведомление о заказе'),
+        ('digest', 'Сводка по заказам'),
+    )
+    STATUS_CHOICES = (
+        ('pending', 'Ожидает отправки'),
+        ('processing', 'Отправляется'),
+        ('sent', 'Доставлено'),
+        ('failed', 'Ошибка'),
+    )
+
+    kind = models.CharField('Тип', max_length=20, choices=KIND_CHOICES)
+    payload = models.JSONField('Данные', default=dict)
+    status = models.CharField('Статус', max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField('Попыток', default=0)
+    next_attempt_at = models.DateTimeField('Следующая попытка', default=timezone.now)
+    claim_token = models.CharField('Токен обработчика', max_length=32, blank=True)
+    claimed_until = models.DateTimeField('Захвачено до', null=True, blank=True)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created_at = models.DateTimeField('Дата создания', auto_now_add=True)
+    sent_at = models.DateTimeField('Дата отправки', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Исходящее уведомление'
+        verbose_name_plural = 'Исходящие уведомления'
+        ordering = ['id']
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+
+    def __str__(self):
+        return f'{self.get_kind_display()} #{self.pk} ({self.get_status_display()})'
+
+
+class TelegramFile(models.Model):
+    """Идентификатор загруженного в Telegram изображения товара"""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='telegram_file')
+    image_name = models.CharField('Файл изображения', max_length=255)
+    file_id = models.CharField('file_id в Telegram', max_length=255)
+    updated_at = models.DateTimeField('Дата обновления', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Файл в Telegram'
+        verbose_name_plural = 'Файлы в Telegram'
+
+    def __str__(self):
+        return f'{self.product} → {self.file_id}'
+
+    def matches(self, image_name: str) -> bool:
+        return self.image_name == image_name
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import uuid
+from datetime import timedelta
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import NotificationOutbox
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+CONCURRENCY = 10
+CLAIM_TIMEOUT = timedelta(minutes=5)
+RETRY_BASE_DELAY = timedelta(seconds=30)
+RETRY_MAX_DELAY = timedelta(hours=1)
+MAX_ATTEMPTS = 8
+
+
+class PermanentDeliveryError(Exception):
+    """Ошибка, при которой повторная отправка не имеет смысла"""
+
+
+def enqueue_order_notification(order_pk: int, status: str, is_new: bool = True) -> NotificationOutbox:
+    """
+    Постановка уведомления о заказе в outbox.
+
+    Вызывается внутри транзакции заказа, поэтому уведомление появляется
+    только вместе с зафиксированными изменениями. Статус сохраняется в
+    payload: к моменту отправки заказ может успеть перейти дальше.
+    """
+    return NotificationOutbox.objects.create(
+        kind='order',
+        payload={'order_id': order_pk, 'is_new': is_new, 'status': status}
+    )
+
+
+def enqueue_order_notifications(order_pks: list, status: str, is_new: bool = True) -> list:
+    """Постановка уведомлений о нескольких заказах одним INSERT"""
+    return NotificationOutbox.objects.bulk_create([
+        NotificationOutbox(kind='order', payload={'order_id': pk, 'is_new': is_new, 'status': status})
+        for pk in order_pks
+    ])
+
+
+def enqueue_status_digest(order_pks: list, status: str) -> NotificationOutbox:
+    """Постановка сводного уведомления о массовой смене статуса"""
+    return NotificationOutbox.objects.create(
+        kind='digest',
+        payload={'order_ids': list(order_pks), 'status': status}
+    )
+
+
+def _claimable(now):
+    return (
+        Q(status='pending', next_attempt_at__lte=now)
+        | Q(status='processing', claimed_until__lt=now)
+    )
+
+
+def claim_batch(limit: int = BATCH_SIZE) -> list:
+    """
+    Захват пачки уведомлений для отправки.
+
+    Захват выполняется условным UPDATE, поэтому два обработчика не получат одну запись,
+    а записи упавшего обработчика освобождаются по истечении CLAIM_TIMEOUT.
+    """
+    now = timezone.now()
+    ids = list(
+        NotificationOutbox.objects.filter(_claimable(now))
+        .order_by('id')
+        .values_list('id', flat=True)[:limit]
+    )
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    NotificationOutbox.objects.filter(_claimable(now), pk__in=ids).update(
+        status='processing',
+        claim_token=token,
+        claimed_until=now + CLAIM_TIMEOUT,
+    )
+    return list(NotificationOutbox.objects.filter(claim_token=token, status='processing'))
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Экспоненциальная задержка перед повторной попыткой"""
+    factor = 2 ** min(attempts - 1, 16)
+    return min(RETRY_BASE_DELAY * factor, RETRY_MAX_DELAY)
+
+
+async def _deliver(entry: NotificationOutbox) -> None:
+    from orders.models import Order
+    from .telegram import deliver_order_notification, deliver_status_digest
+
+    if entry.kind == 'order':
+        try:
+            await deliver_order_notification(
+                entry.payload.get('order_id'), entry.payload.get('is_new', True), entry.payload.get('status')
+            )
+        except Order.DoesNotExist:
+            raise PermanentDeliveryError(f"Заказ {entry.payload.get('order_id')} не найден")
+    elif entry.kind == 'digest':
+        await deliver_status_digest(entry.payload['order_ids'], entry.payload['status'])
+    else:
+        raise PermanentDeliveryError(f"Неизвестный тип уведомления: {entry.kind}")
+
+
+async def _deliver_batch(entries: list) -> list:
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def deliver_one(entry):
+        async with semaphore:
+            try:
+                await _deliver(entry)
+            except Exception as e:
+                return e
+            return None
+
+    return await asyncio.gather(*(deliver_one(entry) for entry in entries))
+
+
+def _finish(entries: list, results: list) -> None:
+    now = timezone.now()
+    delivered = [entry.pk for entry, error in zip(entries, results) if error is None]
+    if delivered:
+        NotificationOutbox.objects.filter(pk__in=delivered).update(
+            status='sent', sent_at=now, claim_token='', claimed_until=None, last_error=''
+        )
+
+    for entry, error in zip(entries, results):
+        if error is None:
+            continue
+        attempts = entry.attempts + 1
+        permanent = isinstance(error, PermanentDeliveryError) or attempts >= MAX_ATTEMPTS
+        logger.warning(f"Не удалось отправить уведомление {entry.pk} (попытка {attempts}): {error}")
+        NotificationOutbox.objects.filter(pk=entry.pk, claim_token=entry.claim_token).update(
+            status='failed' if permanent else 'pending',
+            attempts=F('attempts') + 1,
+            next_attempt_at=now + retry_delay(attempts),
+            claim_token='',
+            claimed_until=None,
+            last_error=str(error)[:2000],
+        )
+
+
+def drain_outbox(batch_size: int = BATCH_SIZE, max_batches: int = 20) -> int:
+    """Отправка накопившихся уведомлений, возвращает количество обработанных записей"""
+    from .telegram import runtime
+
+    processed = 0
+    for _ in range(max_batches):
+        entries = claim_batch(batch_size)
+        if not entries:
+            break
+        results = runtime.run(_deliver_batch(entries))
+        _finish(entries, results)
+        processed += len(entries)
+    return processed
@@ -0,0 +1,93 @@
+import asyncio
+import atexit
+import logging
+import os
+import threading
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DeliveryRuntime:
+    """
+    Долгоживущий цикл событий для отправки сообщений в Telegram.
+
+    Один цикл в фоновом потоке на процесс: сессия бота и её соединения
+    переиспользуются между уведомлениями. Синхронный код Django отправляет
+    корутины через submit()/run().
+    """
+
+    def __init__(self, shutdown_hooks: Iterable[Callable[[], Awaitable]] = ()):
+        self._shutdown_hooks = list(shutdown_hooks)
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._atexit_registered = False
+
+    @property
+    def is_running(self) -> bool:
+        return (
+            self._loop is not None
+            and self._pid == os.getpid()
+            and self._thread is not None
+            and self._thread.is_alive()
+        )
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            # После fork (prefork-воркеры Celery) поток родителя недоступен, запускаем свой
+            if self.is_running:
+                return self._loop
+            loop = asyncio.new_event_loop()
+            started = threading.Event()
+            thread = threading.Thread(
+                target=self._run_loop,
+                args=(loop, started),
+                name='telegram-delivery',
+                daemon=True,
+            )
+            thread.start()
+            started.wait()
+            self._loop, self._thread, self._pid = loop, thread, os.getpid()
+            if not self._atexit_registered:
+                atexit.register(self.shutdown)
+                self._atexit_registered = True
+            return loop
+
+    @staticmethod
+    def _run_loop(loop: asyncio.AbstractEventLoop, started: threading.Event) -> None:
+        asyncio.set_event_loop(loop)
+        loop.call_soon(started.set)
+        loop.run_forever()
+        loop.close()
+
+    def submit(self, coro: Awaitable) -> Future:
+        """Запуск корутины в цикле доставки без ожидания результата"""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_started())
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = None):
+        """Синхронное выполнение корутины в цикле доставки"""
+        return self.submit(coro).result(timeout)
+
+    async def _close(self) -> None:
+        for hook in self._shutdown_hooks:
+            try:
+                await hook()
+            except Exception as e:
+                logger.error(f"Ошибка при остановке цикла доставки: {str(e)}", exc_info=True)
+
+    def shutdown(self, timeout: float = 5) -> None:
+        """Закрытие сессий и остановка цикла"""
+        with self._lock:
+            if not self.is_running:
+                return
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = self._pid = None
+        try:
+            asyncio.run_coroutine_threadsafe(self._close(), loop).result(timeout)
+        except Exception as e:
+            logger.error(f"Не удалось корректно закрыть сессии: {str(e)}", exc_info=True)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
@@ -0,0 +1,11 @@
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+from catalog.models import Product
+from .models import TelegramFile
+
+@receiver(pre_save, sender=Product)
+def forget_replaced_image(sender, instance, **kwargs):
+    # Новый файл ещё не записан в хранилище: file_id прежнего изображения больше не годится,
+    # даже если имя файла совпадёт
+    if instance.pk and instance.image and not instance.image._committed:
+        TelegramFile.objects.filter(product_id=instance.pk).delete()
@@ -0,0 +1,83 @@
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional, Tuple
+import pytz
+from django.utils import timezone
+from orders.models import Order, OrderItem
+from .models import TelegramFile
+
+MOSCOW_TZ = pytz.timezone('Europe/Moscow')
+
+
+@dataclass(frozen=True, slots=True)
+class OrderLine:
+    product_id: int
+    name: str
+    quantity: int
+    price: Decimal
+    image_name: str
+    image_path: Optional[str]
+    file_id: Optional[str]
+
+
+@dataclass(frozen=True, slots=True)
+class OrderSnapshot:
+    """Неизменяемый снимок заказа для форматирования и отправки уведомлений"""
+    id: int
+    status: str
+    status_display: str
+    created_at: datetime
+    delivery_time: datetime
+    delivery_address: str
+    comment: str
+    total_amount: Decimal
+    lines: Tuple[OrderLine, ...]
+
+    @property
+    def photos(self) -> Tuple[OrderLine, ...]:
+        return tuple(line for line in self.lines if line.image_path)
+
+
+def _cached_file_id(product) -> Optional[str]:
+    try:
+        cached = product.telegram_file
+    except TelegramFile.DoesNotExist:
+        return None
+    return cached.file_id if cached.matches(product.image.name) else None
+
+
+def load_order_snapshot(order_id: int) -> OrderSnapshot:
+    """
+    Загрузка заказа, позиций, товаров и закешированных file_id одним запросом.
+
+    Заказ без позиций подгружается отдельным запросом.
+    """
+    items = list(
+        OrderItem.objects.filter(order_id=order_id)
+        .select_related('order', 'product__telegram_file')
+        .order_by('pk')
+    )
+    order = items[0].order if items else Order.objects.get(pk=order_id)
+    return OrderSnapshot(
+        id=order.id,
+        status=order.status,
+        status_display=order.get_status_display(),
+        created_at=timezone.localtime(order.created_at, MOSCOW_TZ),
+        delivery_time=timezone.localtime(order.delivery_time, MOSCOW_TZ),
+        delivery_address=order.delivery_address,
+        comment=order.comment,
+        total_amount=order.total_amount,
+        lines=tuple(
+            OrderLine(
+                product_id=item.product_id,
+                name=item.product.name,
+                quantity=item.quantity,
+                price=item.price,
+                image_name=item.product.image.name or '',
+                image_path=item.product.image.path if item.product.image else None,
+                file_id=_cached_file_id(item.product) if item.product.image else None,
+            )
+            for item in items
+        ),
+    )
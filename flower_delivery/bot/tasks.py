@@ -0,0 +1,22 @@
+import logging
+from celery import shared_task
+from celery.signals import worker_process_shutdown
+from .outbox import drain_outbox
+
+logger = logging.getLogger(__name__)
+
+@worker_process_shutdown.connect
+def shutdown_delivery_runtime(**kwargs):
+    """Закрытие сессии бота при остановке процесса воркера"""
+    from .telegram import runtime
+
+    runtime.shutdown()
+
+@shared_task
+def drain_notification_outbox():
+    """
+    Задача Celery для отправки уведомлений из outbox.
+    """
+    processed = drain_outbox()
+    if processed:
+        logger.info(f"Обработано уведомлений: {processed}")
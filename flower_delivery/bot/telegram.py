@@ -1,54 +1,59 @@
 import logging
-import asyncio
+from dataclasses import replace
 from typing import List, Optional
-import pytz
 from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
-from aiogram.types import FSInputFile
+from aiogram.types import FSInputFile, InputMediaPhoto
 from django.conf import settings
-from django.utils import timezone
 from asgiref.sync import sync_to_async
 
 # Models
-from orders.models import Order, OrderItem
+from orders.models import Order
 from analytics.models import DailyReport
+from .models import TelegramFile
+from .snapshot import OrderLine, OrderSnapshot, load_order_snapshot
+from analytics.counters import business_date
+from .runtime import DeliveryRuntime
 
 logger = logging.getLogger(__name__)
 
-# Инициализация бота
-bot = Bot(token=settings.TELEGRAM_BOT_TOKEN, parse_mode=ParseMode.HTML)
-MOSCOW_TZ = pytz.timezone('Europe/Moscow')
+# Инициализация бота: сессия живёт столько же, сколько цикл доставки процесса
+bot = Bot(token=settings.TELEGRAM_BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+runtime = DeliveryRuntime(shutdown_hooks=[bot.session.close])
+MEDIA_GROUP_LIMIT = 10
+# Telegram принимает не больше 4096 символов в сообщении, поэтому сводка перечисляет
+# только первые номера заказов, остальные указываются числом
+DIGEST_MAX_IDS = 100
 
 # ====== Утилиты ======
-@sync_to_async
-def _get_order_details(order: Order) -> tuple:
-    """Получение деталей заказа из БД"""
-    items = list(OrderItem.objects.filter(order=order).select_related('product'))
-    return (
-        timezone.localtime(order.created_at, MOSCOW_TZ),
-        timezone.localtime(order.delivery_time, MOSCOW_TZ),
-        items
-    )
+_load_order_snapshot = sync_to_async(load_order_snapshot)
 
 @sync_to_async
-def _get_product_images(order: Order) -> List[str]:
-    """Получение путей к изображениям товаров"""
-    return [
-        item.product.image.path
-        for item in OrderItem.objects.filter(order=order).select_related('product')
-        if item.product.image
+def _remember_file_ids(photos: List[OrderLine], messages: list) -> None:
+    """Сохранение file_id, полученных при загрузке изображений"""
+    cache = [
+        TelegramFile(product_id=photo.product_id, image_name=photo.image_name, file_id=message.photo[-1].file_id)
+        for photo, message in zip(photos, messages)
+        if photo.file_id is None and message.photo
     ]
+    if cache:
+        TelegramFile.objects.bulk_create(
+            cache,
+            update_conflicts=True,
+            unique_fields=['product'],
+            update_fields=['image_name', 'file_id', 'updated_at'],
+        )
 
 # ====== Форматирование сообщений ======
-async def _format_order_header(order: Order, is_new: bool) -> str:
-    created_at, delivery_time, _ = await _get_order_details(order)
+def _format_order_header(order: OrderSnapshot, is_new: bool) -> str:
     if is_new:
         return (
             "🌸 *НОВЫЙ ЗАКАЗ ЦВЕТОВ* 🌸\n"
             "📦 *Детали заказа:*\n"
             f"🆔 *Номер:* {order.id}\n"
-            f"📅 *Дата:* {created_at.strftime('%d.%m.%Y %H:%M')}\n"
-            f"⏰ *Доставка:* {delivery_time.strftime('%d.%m.%Y %H:%M')}\n"
+            f"📅 *Дата:* {order.created_at.strftime('%d.%m.%Y %H:%M')}\n"
+            f"⏰ *Доставка:* {order.delivery_time.strftime('%d.%m.%Y %H:%M')}\n"
             f"📍 *Адрес:* {order.delivery_address}\n"
             f"💬 *Комментарий:* {order.comment or 'отсутствует'}\n"
         )
@@ -57,83 +62,117 @@ async def _format_order_header(order: Order, is_new: bool) -> str:
             "🌸 *ИЗМЕНЕНИЕ СТАТУСА ЗАКАЗА* 🌸\n"
             "📦 *Детали заказа:*\n"
             f"🆔 *Номер:* {order.id}\n"
-            f"📅 *Дата:* {created_at.strftime('%d.%m.%Y %H:%M')}\n"
-            f"⏰ *Доставка:* {delivery_time.strftime('%d.%m.%Y %H:%M')}\n"
+            f"📅 *Дата:* {order.created_at.strftime('%d.%m.%Y %H:%M')}\n"
+            f"⏰ *Доставка:* {order.delivery_time.strftime('%d.%m.%Y %H:%M')}\n"
             f"📍 *Адрес:* {order.delivery_address}\n"
             f"💬 *Комментарий:* {order.comment or 'отсутствует'}\n"
         )
 
-async def _format_order_items(order: Order) -> str:
-    _, _, items = await _get_order_details(order)
+def _format_order_items(order: OrderSnapshot) -> str:
     items_text = "\n".join(
-        f"➖ {item.product.name} ({item.quantity} шт.) - {item.price:.2f}₽"
-        for item in items
+        f"➖ {line.name} ({line.quantity} шт.) - {line.price:.2f}₽"
+        for line in order.lines
     )
     return f"*Состав заказа:*\n{items_text}\n"
 
-async def _format_order_footer(order: Order) -> str:
-    # Используем sync_to_async для доступа к свойству total_price
-    total_price = await sync_to_async(lambda: order.total_price)()
+def _format_order_footer(order: OrderSnapshot) -> str:
     if order.status == 'new':
         return (
-            f"💰 *ИТОГО:* {total_price:.2f}₽\n"
-            f"📦 *Статус заказа:* {order.get_status_display()}\n"
+            f"💰 *ИТОГО:* {order.total_amount:.2f}₽\n"
+            f"📦 *Статус заказа:* {order.status_display}\n"
         )
     else:
         return (
-            f"💰 *ИТОГО:* {total_price:.2f}₽\n"
-            f"📦 *Новый статус заказа:* {order.get_status_display()}\n"
+            f"💰 *ИТОГО:* {order.total_amount:.2f}₽\n"
+            f"📦 *Новый статус заказа:* {order.status_display}\n"
         )
 
 # ====== Основные функции ======
 async def _send_telegram_message(text: str) -> None:
-    """Отправка текстового сообщения"""
-    try:
-        await bot.send_message(
-            chat_id=settings.TELEGRAM_CHAT_ID,
-            text=text,
-            parse_mode=ParseMode.MARKDOWN
-        )
-    except Exception as e:
-        logger.error(f"Ошибка отправки сообщения: {str(e)}", exc_info=True)
+    """Отправка текстового сообщения, ошибки пробрасываются вызывающему"""
+    await bot.send_message(
+        chat_id=settings.TELEGRAM_CHAT_ID,
+        text=text,
+        parse_mode=ParseMode.MARKDOWN
+    )
 
-async def _send_telegram_photo(image_path: str, caption: str = "") -> None:
-    """Отправка изображения"""
-    try:
-        photo = FSInputFile(image_path)
-        await bot.send_photo(
-            chat_id=settings.TELEGRAM_CHAT_ID,
-            photo=photo,
-            caption=caption,
-            parse_mode=ParseMode.MARKDOWN
-        )
-    except Exception as e:
-        logger.error(f"Ошибка отправки изображения: {str(e)}", exc_info=True)
+def _photo_source(photo: OrderLine):
+    return photo.file_id or FSInputFile(photo.image_path)
+
+async def _send_telegram_photos(photos: List[OrderLine], caption: str = "") -> None:
+    """
+    Отправка изображений альбомами до 10 штук.
+
+    Уже загруженные изображения отправляются по file_id, новые — файлом,
+    после чего их file_id запоминается.
+    """
+    for start in range(0, len(photos), MEDIA_GROUP_LIMIT):
+        chunk = photos[start:start + MEDIA_GROUP_LIMIT]
+        try:
+            if len(chunk) == 1:
+                messages = [await bot.send_photo(
+                    chat_id=settings.TELEGRAM_CHAT_ID,
+                    photo=_photo_source(chunk[0]),
+                    caption=caption,
+                    parse_mode=ParseMode.MARKDOWN
+                )]
+            else:
+                messages = await bot.send_media_group(
+                    chat_id=settings.TELEGRAM_CHAT_ID,
+                    media=[
+                        InputMediaPhoto(
+                            media=_photo_source(photo),
+                            caption=caption if index == 0 else None,
+                            parse_mode=ParseMode.MARKDOWN
+                        )
+                        for index, photo in enumerate(chunk)
+                    ]
+                )
+            if any(photo.file_id is None for photo in chunk):
+                await _remember_file_ids(chunk, messages)
+        except Exception as e:
+            logger.error(f"Ошибка отправки изображений: {str(e)}", exc_info=True)
 
 # ====== Публичные методы ======
-async def handle_order_notification(order: Order, is_new: bool = True) -> None:
-    """Обработка уведомления о заказе"""
-    try:
-        header = await _format_order_header(order, is_new)
-        items = await _format_order_items(order)
-        footer = await _format_order_footer(order)
-        message = header + items + footer
-
-        await _send_telegram_message(message)
-
-        image_paths = await _get_product_images(order)
-        for path in image_paths:
-            await _send_telegram_photo(path, f"📸 Товар из заказа №{order.id}")
-
-    except Exception as e:
-        logger.error(f"Ошибка обработки заказа {order.id}: {str(e)}", exc_info=True)
-    finally:
-        await bot.session.close()
+async def deliver_order_notification(order_id: int, is_new: bool = True, status: Optional[str] = None) -> None:
+    """
+    Отправка уведомления о заказе.
+
+    Все данные заказа загружаются одним снимком за один переход в синхронный поток.
+    Статус берётся из уведомления, а не из заказа на момент отправки; без него
+    (записи outbox старого формата) показывается текущий статус заказа.
+    Ошибка отправки текста пробрасывается, чтобы outbox повторил попытку;
+    фотографии отправляются по возможности.
+    """
+    order = await _load_order_snapshot(order_id)
+    if status is not None:
+        order = replace(order, status=status, status_display=dict(Order.STATUS_CHOICES).get(status, status))
+    message = _format_order_header(order, is_new) + _format_order_items(order) + _format_order_footer(order)
+
+    await _send_telegram_message(message)
+
+    if order.photos:
+        await _send_telegram_photos(list(order.photos), f"📸 Товары из заказа №{order.id}")
+
+def _format_order_ids(order_ids: List[int], limit: int = DIGEST_MAX_IDS) -> str:
+    listed = ', '.join(str(pk) for pk in order_ids[:limit])
+    rest = len(order_ids) - limit
+    return f"{listed} и ещё {rest}" if rest > 0 else listed
+
+async def deliver_status_digest(order_ids: List[int], status: str) -> None:
+    """Отправка одной сводки вместо отдельных уведомлений о каждом заказе"""
+    status_display = dict(Order.STATUS_CHOICES).get(status, status)
+    message = (
+        "🌸 *МАССОВАЯ СМЕНА СТАТУСА* 🌸\n"
+        f"📦 Заказов переведено в статус «{status_display}»: {len(order_ids)}\n"
+        f"🆔 *Номера:* {_format_order_ids(order_ids)}\n"
+    )
+    await _send_telegram_message(message)
 
 async def send_daily_report() -> None:
     """Отправка ежедневного отчета"""
     try:
-        today = timezone.now().date()
+        today = business_date()
         report = await sync_to_async(DailyReport.objects.filter(date=today).first)()
 
         if not report:
@@ -156,31 +195,11 @@ async def send_daily_report() -> None:
 
     except Exception as e:
         logger.error(f"Ошибка отправки ежедневного отчета: {str(e)}", exc_info=True)
-    finally:
-        await bot.session.close()
 
 # ====== Синхронные обертки для Celery ======
-def send_order_notification(order_pk: int, is_new: bool = True) -> None:
-    """Синхронная обертка для уведомлений"""
-    try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        order = Order.objects.get(pk=order_pk)
-        loop.run_until_complete(handle_order_notification(order, is_new))
-    except Order.DoesNotExist:
-        logger.error(f"Заказ с pk={order_pk} не найден")
-    except Exception as e:
-        logger.error(f"Ошибка в задаче отправки уведомления: {str(e)}", exc_info=True)
-    finally:
-        loop.close()
-
 def trigger_daily_report() -> None:
     """Синхронная обертка для ежедневного отчета"""
     try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(send_daily_report())
+        runtime.run(send_daily_report())
     except Exception as e:
         logger.error(f"Ошибка в задаче ежедневного отчета: {str(e)}", exc_info=True)
-    finally:
-        loop.close()
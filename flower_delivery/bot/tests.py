@@ -1,15 +1,30 @@
-from django.test import TestCase, TransactionTestCase
+import tempfile
+from dataclasses import FrozenInstanceError
+from asgiref.sync import SyncToAsync
+from aiogram.types import FSInputFile
+from django.test import TestCase, TransactionTestCase, override_settings
 from unittest.mock import patch, AsyncMock, MagicMock
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 from orders.models import Order, OrderItem
 from catalog.models import Product
-from bot.telegram import handle_order_notification, send_order_notification
+from bot.telegram import DIGEST_MAX_IDS, trigger_daily_report
+from bot.runtime import DeliveryRuntime
+from bot.snapshot import load_order_snapshot
+from bot.models import NotificationOutbox, TelegramFile
+from bot.outbox import (
+    enqueue_order_notification, enqueue_status_digest, drain_outbox, claim_batch, retry_delay,
+    RETRY_BASE_DELAY, RETRY_MAX_DELAY,
+)
 import asyncio
 from django.core.files.uploadedfile import SimpleUploadedFile
 
 class BotTestCase(TransactionTestCase):
     def setUp(self):
+        # Построение вариантов изображений не относится к этим тестам
+        renditions = patch('catalog.signals.build_product_renditions_task')
+        renditions.start()
+        self.addCleanup(renditions.stop)
         self.user = get_user_model().objects.create_user(
             username='testuser',
             email='testuser@example.com',
@@ -46,19 +61,261 @@ class BotTestCase(TransactionTestCase):
 
     @patch('bot.telegram.bot.send_message', new_callable=AsyncMock)
     @patch('bot.telegram.bot.send_photo', new_callable=AsyncMock)
-    def test_handle_order_notification(self, mock_send_photo, mock_send_message):
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(handle_order_notification(self.order))
-        loop.close()
+    def test_order_notification_sent_from_outbox(self, mock_send_photo, mock_send_message):
+        mock_send_photo.return_value = MagicMock(photo=[MagicMock(file_id='rose-file-id')])
+        entry = enqueue_order_notification(self.order.pk, 'new')
+        drain_outbox()
 
         mock_send_message.assert_called_once()
         mock_send_photo.assert_called_once()
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, 'sent')
 
-    @patch('bot.telegram.handle_order_notification', new_callable=AsyncMock)
-    def test_send_order_notification(self, mock_async_send):
-        send_order_notification(self.order.pk)
-        mock_async_send.assert_called_once_with(self.order, True)
+    @patch('bot.telegram.bot.send_message', new_callable=AsyncMock)
+    @patch('bot.telegram.bot.send_photo', new_callable=AsyncMock)
+    def test_notification_shows_status_it_was_queued_with(self, mock_send_photo, mock_send_message):
+        mock_send_photo.return_value = MagicMock(photo=[MagicMock(file_id='rose-file-id')])
+        enqueue_order_notification(self.order.pk, 'in_delivery', is_new=False)
+        # К отправке заказ уже выполнен, но уведомление — о переходе в доставку
+        Order.objects.filter(pk=self.order.pk).update(status='completed')
+        drain_outbox()
+        text = mock_send_message.await_args.kwargs['text']
+        self.assertIn('Новый статус заказа:* В доставке', text)
+        self.assertNotIn('Выполнен', text)
 
     def tearDown(self):
         self.product.image.delete()
+
+
+TEST_IMAGE = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x00\x00\x00\x21\xf9\x04\x01\x0a\x00\x01\x00'
+    b'\x2c\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02\x4c\x01\x00\x3b'
+)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ProductPhotoCacheTestCase(TransactionTestCase):
+    def setUp(self):
+        # Построение вариантов изображений не относится к этим тестам
+        renditions = patch('catalog.signals.build_product_renditions_task')
+        renditions.start()
+        self.addCleanup(renditions.stop)
+        user = get_user_model().objects.create_user(
+            username='photouser',
+            email='photouser@example.com',
+            password='testpass'
+        )
+        self.order = Order.objects.create(
+            user=user,
+            delivery_address='Москва, ул. Пушкина, д. 10',
+            delivery_time=timezone.now() + timezone.timedelta(hours=1)
+        )
+        self.products = []
+        for i in range(12):
+            product = Product.objects.create(
+                name=f'Роза {i}',
+                price=100,
+                image=SimpleUploadedFile(f'rose_{i}.jpg', TEST_IMAGE, content_type='image/jpeg')
+            )
+            OrderItem.objects.create(order=self.order, product=product, quantity=1)
+            self.products.append(product)
+
+    def _notify(self):
+        enqueue_order_notification(self.order.pk, self.order.status)
+        drain_outbox()
+
+    @staticmethod
+    def _uploaded(media):
+        return [m for m in media if isinstance(m.media, FSInputFile)]
+
+    @patch('bot.telegram.bot.send_message', new_callable=AsyncMock)
+    @patch('bot.telegram.bot.send_media_group', new_callable=AsyncMock)
+    @patch('bot.telegram.bot.send_photo', new_callable=AsyncMock)
+    def test_photos_grouped_and_file_ids_reused(self, mock_send_photo, mock_send_group, mock_send_message):
+        counter = iter(range(1000))
+
+        def reply(chat_id, media):
+            return [MagicMock(photo=[MagicMock(file_id=f'file-{next(counter)}')]) for _ in media]
+
+        mock_send_group.side_effect = reply
+        mock_send_photo.side_effect = lambda **kwargs: MagicMock(
+            photo=[MagicMock(file_id=f'file-{next(counter)}')]
+        )
+
+        self._notify()
+        # 12 фотографий: альбом из 10 и альбом из 2
+        self.assertEqual(mock_send_group.await_count, 2)
+        mock_send_photo.assert_not_awaited()
+        first_media = mock_send_group.await_args_list[0].kwargs['media']
+        self.assertEqual(len(first_media), 10)
+        self.assertEqual(len(self._uploaded(first_media)), 10)
+        self.assertEqual(TelegramFile.objects.count(), 12)
+
+        mock_send_group.reset_mock()
+        self._notify()
+        for call in mock_send_group.await_args_list:
+            self.assertEqual(self._uploaded(call.kwargs['media']), [])
+
+    def test_snapshot_loaded_in_single_query(self):
+        with self.assertNumQueries(1):
+            snapshot = load_order_snapshot(self.order.pk)
+        self.assertEqual(len(snapshot.lines), 12)
+        self.assertEqual(len(snapshot.photos), 12)
+        with self.assertRaises(FrozenInstanceError):
+            snapshot.status = 'canceled'
+        self.assertFalse(hasattr(snapshot, '__dict__'))
+
+    @patch('bot.telegram.bot.send_message', new_callable=AsyncMock)
+    @patch('bot.telegram.bot.send_media_group', new_callable=AsyncMock)
+    def test_single_thread_hop_per_notification(self, mock_send_group, mock_send_message):
+        mock_send_group.side_effect = lambda chat_id, media: [
+            MagicMock(photo=[MagicMock(file_id='cached')]) for _ in media
+        ]
+        self._notify()  # первая отправка загружает и кеширует изображения
+
+        hops = []
+        original_call = SyncToAsync.__call__
+
+        async def counting_call(self, *args, **kwargs):
+            hops.append(self.func)
+            return await original_call(self, *args, **kwargs)
+
+        with patch.object(SyncToAsync, '__call__', counting_call):
+            self._notify()
+        self.assertEqual(len(hops), 1)
+        message = mock_send_message.await_args.kwargs['text']
+        self.assertIn('Роза 11 (1 шт.)', message)
+
+    @patch('bot.telegram.bot.send_message', new_callable=AsyncMock)
+    @patch('bot.telegram.bot.send_media_group', new_callable=AsyncMock)
+    def test_cache_invalidated_when_image_replaced(self, mock_send_group, mock_send_message):
+        mock_send_group.side_effect = lambda chat_id, media: [
+            MagicMock(photo=[MagicMock(file_id='cached')]) for _ in media
+        ]
+        self._notify()
+        product = self.products[0]
+        product.image = SimpleUploadedFile('rose_new.jpg', TEST_IMAGE, content_type='image/jpeg')
+        product.save()
+        self.assertFalse(TelegramFile.objects.filter(product=product).exists())
+
+        mock_send_group.reset_mock()
+        self._notify()
+        uploaded = [
+            m for call in mock_send_group.await_args_list for m in self._uploaded(call.kwargs['media'])
+        ]
+        self.assertEqual(len(uploaded), 1)
+
+
+class NotificationOutboxTestCase(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user(
+            username='outboxuser',
+            email='outboxuser@example.com',
+            password='testpass'
+        )
+        self.order = Order.objects.create(
+            user=user,
+            delivery_address='Москва, ул. Пушкина, д. 10',
+            delivery_time=timezone.now() + timezone.timedelta(hours=1)
+        )
+
+    @patch('bot.telegram.deliver_order_notification', new_callable=AsyncMock)
+    def test_drain_delivers_and_marks_sent(self, mock_deliver):
+        for _ in range(3):
+            enqueue_order_notification(self.order.pk, 'in_progress', is_new=False)
+
+        self.assertEqual(drain_outbox(batch_size=2), 3)
+
+        self.assertEqual(mock_deliver.await_count, 3)
+        self.assertFalse(NotificationOutbox.objects.exclude(status='sent').exists())
+        self.assertEqual(drain_outbox(), 0)
+
+    @patch('bot.telegram.deliver_order_notification', new_callable=AsyncMock)
+    def test_failed_delivery_is_retried_with_backoff(self, mock_deliver):
+        mock_deliver.side_effect = RuntimeError('Telegram недоступен')
+        entry = enqueue_order_notification(self.order.pk, 'new')
+
+        drain_outbox()
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, 'pending')
+        self.assertEqual(entry.attempts, 1)
+        self.assertGreater(entry.next_attempt_at, timezone.now())
+        self.assertIn('Telegram недоступен', entry.last_error)
+
+        # До наступления next_attempt_at запись не захватывается повторно
+        self.assertEqual(drain_outbox(), 0)
+
+        NotificationOutbox.objects.filter(pk=entry.pk).update(next_attempt_at=timezone.now())
+        mock_deliver.side_effect = None
+        drain_outbox()
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, 'sent')
+
+    @patch('bot.telegram._load_order_snapshot', new_callable=AsyncMock, side_effect=Order.DoesNotExist)
+    def test_missing_order_fails_permanently(self, mock_load):
+        entry = enqueue_order_notification(self.order.pk + 1000, 'new')
+        drain_outbox()
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, 'failed')
+
+    @patch('bot.telegram.bot.send_message', new_callable=AsyncMock)
+    def test_digest_sent_as_single_message(self, mock_send_message):
+        enqueue_status_digest(list(range(1, 43)), 'in_delivery')
+        drain_outbox()
+        mock_send_message.assert_awaited_once()
+        text = mock_send_message.await_args.kwargs['text']
+        self.assertIn('В доставке', text)
+        self.assertIn('42', text)
+
+    @patch('bot.telegram.bot.send_message', new_callable=AsyncMock)
+    def test_large_digest_fits_telegram_limit(self, mock_send_message):
+        order_ids = list(range(100000, 101000))
+        entry = enqueue_status_digest(order_ids, 'canceled')
+        drain_outbox()
+        text = mock_send_message.await_args.kwargs['text']
+        self.assertLessEqual(len(text), 4096)
+        self.assertIn('1000', text)
+        self.assertIn(f'{order_ids[DIGEST_MAX_IDS - 1]} и ещё {len(order_ids) - DIGEST_MAX_IDS}', text)
+        self.assertNotIn(str(order_ids[DIGEST_MAX_IDS]), text)
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, 'sent')
+
+    def test_claim_is_exclusive(self):
+        enqueue_order_notification(self.order.pk, 'new')
+        self.assertEqual(len(claim_batch()), 1)
+        self.assertEqual(claim_batch(), [])
+
+    def test_retry_delay_grows_exponentially(self):
+        self.assertEqual(retry_delay(1), RETRY_BASE_DELAY)
+        self.assertEqual(retry_delay(3), RETRY_BASE_DELAY * 4)
+        self.assertEqual(retry_delay(50), RETRY_MAX_DELAY)
+
+
+class DeliveryRuntimeTestCase(TestCase):
+    def test_runtime_reuses_single_loop(self):
+        runtime = DeliveryRuntime()
+
+        async def current_loop():
+            return asyncio.get_running_loop()
+
+        first = runtime.run(current_loop())
+        second = runtime.run(current_loop())
+        self.assertIs(first, second)
+        self.assertTrue(runtime.is_running)
+        runtime.shutdown()
+        self.assertFalse(runtime.is_running)
+
+    def test_shutdown_runs_hooks_once(self):
+        hook = AsyncMock()
+        runtime = DeliveryRuntime(shutdown_hooks=[hook])
+        runtime.run(asyncio.sleep(0))
+        runtime.shutdown()
+        runtime.shutdown()
+        hook.assert_awaited_once()
+
+    @patch('bot.telegram.bot.send_message', new_callable=AsyncMock)
+    def test_session_not_closed_between_notifications(self, mock_send_message):
+        with patch('bot.telegram.bot.session.close', new_callable=AsyncMock) as mock_close:
+            trigger_daily_report()
+            trigger_daily_report()
+        mock_close.assert_not_awaited()
@@ -1,9 +1,16 @@
 from django.contrib import admin
 from .models import Product
+from .search import get_backend
 
 class ProductAdmin(admin.ModelAdmin):
     list_display = ('name', 'price', 'available')
     list_filter = ('available',)
     search_fields = ('name', 'description')
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по полнотекстовому индексу вместо icontains по всей таблице
+        if not search_term.strip():
+            return queryset, False
+        return get_backend().filter(queryset, search_term), False
+
 admin.site.register(Product, ProductAdmin)
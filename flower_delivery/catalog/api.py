@@ -0,0 +1,147 @@
+"""
+JSON API каталога только для чтения.
+
+Ответы собираются из строк values() без создания экземпляров Product.
+Параметр fields задаёт набор полей через запятую, список товаров
+листается курсором next_cursor, все ответы отдают ETag по версии каталога.
+"""
+from operator import itemgetter
+from django.core.exceptions import BadRequest
+from django.http import Http404, JsonResponse
+from django.urls import reverse
+from django.views.decorators.http import condition, require_GET
+from flower_delivery.conditional import page_etag
+from flower_delivery.pagination import keyset_paginate
+from flower_delivery.storage import content_storage
+from .cache import get_catalog_version
+from .models import Product, rating_average
+
+API_PAGE_SIZE = 24
+API_MAX_PAGE_SIZE = 100
+API_BULK_LIMIT = 200
+
+
+def _column(name):
+    return (name,), lambda: itemgetter(name)
+
+
+def _image_url():
+    return lambda row: content_storage.url(row['image']) if row['image'] else None
+
+
+def _rating_avg():
+    return lambda row: rating_average(row['rating_sum'], row['rating_count'])
+
+
+def _detail_url():
+    # reverse() на каждую строку дороже всей остальной сериализации, поэтому адрес собирается по шаблону
+    template = reverse('catalog:product_detail', args=[0]).replace('/0/', '/{}/')
+    return lambda row: template.format(row['id'])
+
+
+# Поле ответа: (колонки для values(), фабрика функции, достающей значение из строки).
+# Фабрика вызывается один раз на ответ.
+API_FIELDS = {
+    'id': _column('id'),
+    'name': _column('name'),
+    'price': _column('price'),
+    'excerpt': _column('excerpt'),
+    'description': _column('description'),
+    'available': _column('available'),
+    'image': (('image',), _image_url),
+    'rating_avg': (('rating_sum', 'rating_count'), _rating_avg),
+    'rating_count': _column('rating_count'),
+    'url': (('id',), _detail_url),
+    'created_at': _column('created_at'),
+    'updated_at': _column('updated_at'),
+}
+DEFAULT_FIELDS = ('id', 'name', 'price', 'excerpt', 'available', 'image', 'rating_avg', 'rating_count', 'url')
+
+
+def requested_fields(request) -> tuple:
+    value = request.GET.get('fields')
+    if not value:
+        return DEFAULT_FIELDS
+    fields = tuple(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in API_FIELDS]
+    if unknown or not fields:
+        raise BadRequest(f"Неизвестные поля: {', '.join(unknown)}")
+    return fields
+
+
+def columns(fields, *extra) -> list:
+    """Колонки для values(): нужные полям ответа и дополнительные, например ключ сортировки"""
+    return list(dict.fromkeys(
+        [column for field in fields for column in API_FIELDS[field][0]] + list(extra)
+    ))
+
+
+def serializer(fields):
+    """Функция, превращающая строку values() в словарь ответа"""
+    getters = [(field, API_FIELDS[field][1]()) for field in fields]
+    return lambda row: {field: getter(row) for field, getter in getters}
+
+
+def _json(data):
+    return JsonResponse(data, json_dumps_params={'ensure_ascii': False})
+
+
+def _parse_int(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise BadRequest(f"Некорректное значение {name}: {value}")
+
+
+def _api_etag(request, *args, **kwargs):
+    # Путь с параметрами различает поля, курсор и набор id
+    return page_etag(request, 'api', get_catalog_version(), request.get_full_path())
+
+
+@require_GET
+@condition(etag_func=_api_etag)
+def product_list(request):
+    """Доступные товары, новые первыми"""
+    fields = requested_fields(request)
+    limit = _parse_int(request.GET.get('limit', API_PAGE_SIZE), 'limit')
+    if not 1 <= limit <= API_MAX_PAGE_SIZE:
+        raise BadRequest(f"limit должен быть от 1 до {API_MAX_PAGE_SIZE}")
+    rows = Product.objects.filter(available=True).values(*columns(fields, 'created_at', 'id'))
+    page = keyset_paginate(rows, request.GET.get('cursor'), limit)
+    serialize = serializer(fields)
+    return _json({'results': [serialize(row) for row in page], 'next_cursor': page.next_cursor})
+
+
+@require_GET
+@condition(etag_func=_api_etag)
+def product_detail(request, pk):
+    """Товар по id, в том числе недоступный к заказу"""
+    fields = requested_fields(request)
+    row = Product.objects.filter(pk=pk).values(*columns(fields)).first()
+    if row is None:
+        raise Http404("Товар не найден")
+    return _json(serializer(fields)(row))
+
+
+@require_GET
+@condition(etag_func=_api_etag)
+def product_bulk(request):
+    """
+    Товары по списку id (?ids=1,2,3) одним запросом к БД.
+
+    Результаты идут в порядке запроса; id, которых нет в каталоге, перечислены в missing.
+    """
+    fields = requested_fields(request)
+    ids = list(dict.fromkeys(
+        _parse_int(value, 'ids') for value in request.GET.get('ids', '').split(',') if value.strip()
+    ))
+    if not ids:
+        raise BadRequest("Не указаны id товаров")
+    if len(ids) > API_BULK_LIMIT:
+        raise BadRequest(f"Не больше {API_BULK_LIMIT} id за запрос")
+    rows = {row['id']: row for row in Product.objects.filter(pk__in=ids).order_by().values(*columns(fields, 'id'))}
+    serialize = serializer(fields)
+    return _json({
+        'results': [serialize(rows[pk]) for pk in ids if pk in rows],
+        'missing': [pk for pk in ids if pk not in rows],
+    })
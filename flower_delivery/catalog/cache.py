@@ -0,0 +1,114 @@
+import time
+from django.core.cache import cache
+from django.db import transaction
+
+CATALOG_VERSION_KEY = 'catalog:version'
+SNAPSHOT_TIMEOUT = 60 * 60 * 24
+FRAGMENT_TIMEOUT = 60 * 60 * 24
+# Пока один запрос строит фрагмент, остальные ждут его не дольше FRAGMENT_WAIT секунд
+FRAGMENT_LOCK_TIMEOUT = 10
+FRAGMENT_WAIT = 2.0
+FRAGMENT_POLL_INTERVAL = 0.05
+FRAGMENT_STATS_KEYS = {
+    'hits': 'catalog:fragments:hits',
+    'misses': 'catalog:fragments:misses',
+}
+
+
+def get_catalog_version() -> int:
+    """Текущая версия каталога"""
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # Стартуем с метки времени, чтобы после вытеснения ключа не попасть на старые снимки
+        cache.add(CATALOG_VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version() -> int:
+    """Инвалидация всех закешированных данных каталога"""
+    try:
+        return cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        version = int(time.time() * 1000)
+        cache.set(CATALOG_VERSION_KEY, version, None)
+        return version
+
+
+def bump_catalog_version_on_commit() -> None:
+    """
+    Инвалидация данных каталога после фиксации текущей транзакции.
+
+    Если поднять версию до COMMIT, параллельный запрос промахнётся мимо кеша,
+    прочитает ещё старые строки и сохранит их под новой версией.
+    """
+    transaction.on_commit(bump_catalog_version)
+
+
+def get_available_products() -> tuple:
+    """Снимок доступных товаров в виде кортежа (id, name)"""
+    from .models import Product
+
+    key = f'catalog:available_products:{get_catalog_version()}'
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = tuple(Product.objects.filter(available=True).values_list('id', 'name'))
+        cache.set(key, snapshot, SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+def _count(kind: str) -> None:
+    key = FRAGMENT_STATS_KEYS[kind]
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, None)
+
+
+def fragment_stats() -> dict:
+    """Счётчики попаданий и промахов кеша фрагментов"""
+    values = cache.get_many(FRAGMENT_STATS_KEYS.values())
+    return {kind: values.get(key, 0) for kind, key in FRAGMENT_STATS_KEYS.items()}
+
+
+def reset_fragment_stats() -> None:
+    cache.delete_many(FRAGMENT_STATS_KEYS.values())
+
+
+def fragment_key(name: str, *parts) -> str:
+    return ':'.join(['catalog:fragment', str(get_catalog_version()), name, *map(str, parts)])
+
+
+def cached_fragment(name: str, parts, builder, timeout: int = FRAGMENT_TIMEOUT):
+    """
+    Фрагмент из кеша или результат builder().
+
+    Ключ включает версию каталога, поэтому любое изменение товаров или отзывов
+    делает все фрагменты устаревшими без явного удаления. Перестраивает
+    фрагмент только запрос, получивший блокировку; остальные дожидаются его
+    результата и строят фрагмент сами, лишь если ожидание затянулось.
+    """
+    key = fragment_key(name, *parts)
+    value = cache.get(key)
+    if value is not None:
+        _count('hits')
+        return value
+    _count('misses')
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, FRAGMENT_LOCK_TIMEOUT):
+        try:
+            value = builder()
+            cache.set(key, value, timeout)
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    deadline = time.monotonic() + FRAGMENT_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(FRAGMENT_POLL_INTERVAL)
+        value = cache.get(key)
+        if value is not None:
+            return value
+    return builder()
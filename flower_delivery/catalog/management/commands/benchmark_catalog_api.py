@@ -0,0 +1,84 @@
+import random
+import statistics
+import time
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from django.urls import reverse
+from catalog import api, views
+from catalog.models import Product
+from .benchmark_search import FLOWERS, VARIETIES, WORDS
+
+
+def _median_ms(func, repeat, before=None):
+    samples = []
+    for _ in range(repeat):
+        if before:
+            before()
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+class Command(BaseCommand):
+    help = "Сравнение скорости JSON API и HTML-страницы каталога в строках в секунду (изменения откатываются)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=30)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def _request(self, url, params=None):
+        request = self.factory.get(url, params or {})
+        request.user = AnonymousUser()
+        return request
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        repeat = options['repeat']
+        self.factory = RequestFactory()
+
+        with transaction.atomic():
+            Product.objects.bulk_create([
+                Product(
+                    name=f"{rng.choice(FLOWERS)} {rng.choice(VARIETIES)} {i}",
+                    price=rng.randint(100, 5000),
+                    description=' '.join(rng.choices(WORDS, k=25)),
+                    available=True,
+                    rating_count=rng.randint(0, 50),
+                    rating_sum=rng.randint(0, 250),
+                )
+                for i in range(options['products'])
+            ], batch_size=500)
+            ids = list(Product.objects.values_list('pk', flat=True)[:api.API_BULK_LIMIT])
+
+            html_url = reverse('catalog:product_list')
+            list_url = reverse('catalog:api_product_list')
+            bulk_url = reverse('catalog:api_product_bulk')
+            cases = [
+                ("HTML, холодный кеш", views.PRODUCTS_PER_PAGE,
+                 lambda: views.product_list(self._request(html_url)), cache.clear),
+                ("HTML, кеш карточек", views.PRODUCTS_PER_PAGE,
+                 lambda: views.product_list(self._request(html_url)), None),
+                ("API, список", api.API_PAGE_SIZE,
+                 lambda: api.product_list(self._request(list_url)), None),
+                ("API, список по 100", api.API_MAX_PAGE_SIZE,
+                 lambda: api.product_list(self._request(list_url, {'limit': api.API_MAX_PAGE_SIZE})), None),
+                ("API, id и цена", api.API_MAX_PAGE_SIZE,
+                 lambda: api.product_list(self._request(
+                     list_url, {'limit': api.API_MAX_PAGE_SIZE, 'fields': 'id,price,available'}
+                 )), None),
+                (f"API, {len(ids)} id", len(ids),
+                 lambda: api.product_bulk(self._request(bulk_url, {'ids': ','.join(map(str, ids))})), None),
+            ]
+
+            self.stdout.write(f"{'ответ':<24}{'строк':>7}{'p50, мс':>10}{'строк/с':>11}")
+            for title, rows, func, before in cases:
+                func()
+                median = _median_ms(func, repeat, before)
+                self.stdout.write(f"{title:<24}{rows:>7}{median:>10.2f}{rows / median * 1000:>11.0f}")
+            transaction.set_rollback(True)
+        cache.clear()
@@ -0,0 +1,75 @@
+import random
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from catalog.models import Product
+from catalog.search import INDEX_BATCH_SIZE, get_backend
+
+FLOWERS = ['Роза', 'Тюльпан', 'Пион', 'Хризантема', 'Лилия', 'Гербера', 'Орхидея', 'Ромашка', 'Гортензия', 'Эустома']
+VARIETIES = ['Mona Lisa', 'Red Naomi', 'Аллегрия', 'Аллилуйя', 'Sarah Bernhardt', 'Avalanche', 'Пинк Флойд',
+             'Coral Charm', 'Explorer', 'Freedom', 'Сноу Белл', 'Sweet Pretty']
+WORDS = ['красные', 'белые', 'розовые', 'нежные', 'крупными', 'бутонами', 'ароматом', 'свадебного', 'букета',
+         'лепестками', 'махровые', 'садовые', 'высокие', 'стойкие', 'срезке', 'цветками', 'оттенком', 'кремовый']
+QUERIES = ['роза', 'розы mona lisa', 'Мона Лиза', 'red naomi', 'Ред Наоми', 'пионы', 'белых тюльпанов',
+           'свадебный букет', 'ароматные', 'Avalanche', 'хризантемы махровые', 'несуществующий сорт']
+
+
+def _timings(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+class Command(BaseCommand):
+    help = "Сравнение скорости поиска по индексу и icontains на синтетическом каталоге (изменения откатываются)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=50000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        count, repeat = options['products'], options['repeat']
+        backend = get_backend()
+
+        with transaction.atomic():
+            started = time.perf_counter()
+            products = Product.objects.bulk_create([
+                Product(
+                    name=f"{rng.choice(FLOWERS)} {rng.choice(VARIETIES)} {i}",
+                    price=rng.randint(100, 5000),
+                    description=' '.join(rng.choices(WORDS, k=25)),
+                    available=rng.random() > 0.1,
+                )
+                for i in range(count)
+            ], batch_size=INDEX_BATCH_SIZE)
+            created = time.perf_counter() - started
+
+            started = time.perf_counter()
+            for start in range(0, len(products), INDEX_BATCH_SIZE * 10):
+                backend.index(products[start:start + INDEX_BATCH_SIZE * 10])
+            indexed = time.perf_counter() - started
+
+            self.stdout.write(f"Товаров: {count}; создание {created:.1f} с, индексация {indexed:.1f} с")
+            self.stdout.write(f"{'запрос':<24}{'найдено':>9}{'индекс p50/p95, мс':>22}{'icontains p50/p95, мс':>25}")
+            for query in QUERIES:
+                terms = query.split()
+                condition = Q()
+                for term in terms:
+                    condition &= Q(name__icontains=term) | Q(description__icontains=term)
+                scan = Product.objects.filter(condition, available=True).values_list('pk', flat=True)
+
+                found = len(backend.search(query, limit=50))
+                index_p50, index_p95 = _timings(lambda: backend.search(query, limit=50), repeat)
+                scan_p50, scan_p95 = _timings(lambda: list(scan[:50]), repeat)
+                self.stdout.write(
+                    f"{query:<24}{found:>9}{index_p50:>12.2f} / {index_p95:<8.2f}{scan_p50:>14.2f} / {scan_p95:<8.2f}"
+                )
+            transaction.set_rollback(True)
@@ -0,0 +1,62 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+from catalog.models import Product
+from catalog.renditions import build_product_renditions
+
+
+def _init_worker():
+    # При запуске через spawn дочерний процесс начинает с чистого интерпретатора
+    django.setup()
+
+
+def _build(product_id, force):
+    try:
+        return product_id, build_product_renditions(product_id, force=force), None
+    except Exception as e:
+        return product_id, False, str(e)
+
+
+class Command(BaseCommand):
+    help = "Построение вариантов изображений для уже загруженных товаров"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Количество процессов (1 — без пула)")
+        parser.add_argument('--force', action='store_true',
+                            help="Пересобрать варианты, даже если они уже построены")
+
+    def handle(self, *args, **options):
+        force = options['force']
+        product_ids = list(
+            Product.objects.exclude(image='').order_by('pk').values_list('pk', flat=True)
+        )
+        if not product_ids:
+            self.stdout.write("Нет товаров с изображениями")
+            return
+
+        workers = max(1, min(options['workers'], len(product_ids)))
+        if workers == 1:
+            results = [_build(pk, force) for pk in product_ids]
+        else:
+            # Соединения с БД не должны наследоваться дочерними процессами
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                futures = [pool.submit(_build, pk, force) for pk in product_ids]
+                results = [future.result() for future in as_completed(futures)]
+
+        built = failed = 0
+        for product_id, done, error in results:
+            if error:
+                failed += 1
+                self.stderr.write(f"Товар {product_id}: {error}")
+            elif done:
+                built += 1
+        self.stdout.write(f"Товаров с изображениями: {len(product_ids)}")
+        self.stdout.write(f"Построено: {built}, пропущено: {len(product_ids) - built - failed}")
+        if failed:
+            self.stdout.write(self.style.WARNING(f"С ошибками: {failed}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Готово"))
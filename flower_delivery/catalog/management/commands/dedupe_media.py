@@ -0,0 +1,108 @@
+import posixpath
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from catalog.cache import bump_catalog_version
+from catalog.models import Product
+from catalog.renditions import RENDITION_FORMATS
+from flower_delivery.storage import (
+    CONTENT_REFERENCES, content_hash, content_storage, hashed_name, is_content_addressed,
+)
+
+
+def _rendition_files() -> set:
+    names = set()
+    for renditions in Product.objects.exclude(renditions={}).values_list('renditions', flat=True):
+        for variant in (renditions or {}).get('variants', {}).values():
+            names.update(variant[fmt] for fmt in RENDITION_FORMATS if variant.get(fmt))
+    return names
+
+
+def _walk_files(storage, directory: str):
+    """Все файлы каталога, включая подкаталоги по содержимому (products/ab/...)"""
+    subdirectories, filenames = storage.listdir(directory)
+    for filename in filenames:
+        yield posixpath.join(directory, filename)
+    for subdirectory in subdirectories:
+        yield from _walk_files(storage, posixpath.join(directory, subdirectory))
+
+
+class Command(BaseCommand):
+    help = "Перевод существующих медиафайлов на имена по содержимому с удалением дубликатов"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Только показать, что будет сделано")
+        parser.add_argument('--prune-orphans', action='store_true',
+                            help="Удалить файлы, на которые не ссылается ни одна запись")
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        storage = content_storage
+        moved = missing = 0
+        freed = 0
+        directories = set()
+        targets = {}
+
+        for app_label, model_name, field_name in CONTENT_REFERENCES:
+            model = apps.get_model(app_label, model_name)
+            directories.add(model._meta.get_field(field_name).upload_to.rstrip('/'))
+            names = (
+                model._default_manager.exclude(**{f'{field_name}__isnull': True}).exclude(**{field_name: ''})
+                .order_by().values_list(field_name, flat=True).distinct()
+            )
+            for name in names:
+                if is_content_addressed(name):
+                    continue
+                if not storage.exists(name):
+                    missing += 1
+                    self.stderr.write(f"Файл не найден: {name}")
+                    continue
+                size = storage.size(name)
+                if dry_run:
+                    with storage.open(name) as content:
+                        new_name = hashed_name(name, content_hash(content))
+                    freed += size if new_name in targets.values() else 0
+                    targets[name] = new_name
+                    moved += 1
+                    continue
+
+                with storage.open(name) as content:
+                    new_name = storage.save(name, content)
+                with transaction.atomic():
+                    model._default_manager.filter(**{field_name: name}).update(**{field_name: new_name})
+                    if model is Product:
+                        # Варианты изображения остаются действительными и после переименования исходника
+                        products = list(Product.objects.filter(renditions__image=name).only('pk', 'renditions'))
+                        for product in products:
+                            product.renditions['image'] = new_name
+                        Product.objects.bulk_update(products, ['renditions'])
+                if new_name in targets.values():
+                    freed += size
+                targets[name] = new_name
+                storage.delete(name)
+                moved += 1
+
+        pruned = 0
+        if options['prune_orphans']:
+            referenced = set(targets) | set(targets.values()) | _rendition_files()
+            for app_label, model_name, field_name in CONTENT_REFERENCES:
+                model = apps.get_model(app_label, model_name)
+                referenced.update(model._default_manager.values_list(field_name, flat=True))
+            for directory in sorted(directories):
+                if not storage.exists(directory):
+                    continue
+                for name in list(_walk_files(storage, directory)):
+                    if name in referenced:
+                        continue
+                    freed += storage.size(name)
+                    pruned += 1
+                    if not dry_run:
+                        storage.delete_unreferenced(name)
+
+        if not dry_run and moved:
+            bump_catalog_version()
+
+        prefix = "[проверка] " if dry_run else ""
+        self.stdout.write(f"{prefix}Переименовано файлов: {moved}, уникальных: {len(set(targets.values()))}")
+        self.stdout.write(f"{prefix}Удалено сирот: {pruned}, не найдено: {missing}")
+        self.stdout.write(self.style.SUCCESS(f"{prefix}Освобождено: {freed / 1024 / 1024:.1f} МБ"))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from catalog.models import Product
+from catalog.search import INDEX_BATCH_SIZE, get_backend
+
+
+class Command(BaseCommand):
+    help = "Полная перестройка поискового индекса каталога"
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        products = Product.objects.only('pk', 'name', 'description').order_by('pk')
+        indexed = 0
+        with transaction.atomic():
+            backend.clear()
+            batch = []
+            for product in products.iterator(chunk_size=INDEX_BATCH_SIZE):
+                batch.append(product)
+                if len(batch) == INDEX_BATCH_SIZE:
+                    backend.index(batch)
+                    indexed += len(batch)
+                    batch = []
+            backend.index(batch)
+            indexed += len(batch)
+        self.stdout.write(self.style.SUCCESS(f"Проиндексировано товаров: {indexed}"))
@@ -0,0 +1,33 @@
+import time
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from catalog.cache import fragment_stats
+from catalog.models import Product
+from catalog.views import CARD_FIELDS, product_detail_page
+
+
+class Command(BaseCommand):
+    help = "Прогрев кеша карточек и страниц товаров перед пиковой нагрузкой"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--include-unavailable', action='store_true',
+                            help="Прогреть также страницы недоступных товаров")
+
+    def handle(self, *args, **options):
+        products = Product.objects.only(*CARD_FIELDS).order_by('pk')
+        if not options['include_unavailable']:
+            products = products.filter(available=True)
+
+        before = fragment_stats()
+        started = time.perf_counter()
+        warmed = 0
+        for product in products.iterator(chunk_size=500):
+            render_to_string('catalog/includes/product_card.html', {'product': product})
+            product_detail_page(product.pk)
+            warmed += 1
+        elapsed = time.perf_counter() - started
+
+        after = fragment_stats()
+        built = after['misses'] - before['misses']
+        self.stdout.write(f"Товаров: {warmed}, построено фрагментов: {built}, уже в кеше: {after['hits'] - before['hits']}")
+        self.stdout.write(self.style.SUCCESS(f"Прогрев занял {elapsed:.1f} с"))
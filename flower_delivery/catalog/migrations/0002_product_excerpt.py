@@ -0,0 +1,28 @@
+# Generated by Django 5.0.4 on 2026-10-18 08:34
+
+from django.db import migrations, models
+from django.utils.text import Truncator
+
+
+def backfill_excerpt(apps, schema_editor):
+    Product = apps.get_model('catalog', 'Product')
+    products = list(Product.objects.only('pk', 'description'))
+    for product in products:
+        product.excerpt = Truncator(product.description).chars(100)
+    Product.objects.bulk_update(products, ['excerpt'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='excerpt',
+            field=models.CharField(blank=True, editable=False, max_length=100, verbose_name='Краткое описание'),
+        ),
+        migrations.RunPython(backfill_excerpt, migrations.RunPython.noop),
+    ]
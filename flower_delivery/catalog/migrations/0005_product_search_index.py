@@ -0,0 +1,41 @@
+# Generated by Django 5.0.4 on 2026-10-18 09:05
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    from catalog.search import SEARCH_TABLE, document
+
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+        f"name, description, phonetic, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    Product = apps.get_model('catalog', 'Product')
+    rows = [(product.pk, *document(product)) for product in Product.objects.only('pk', 'name', 'description')]
+    if rows:
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, name, description, phonetic) VALUES (%s, %s, %s, %s)',
+                rows
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    from catalog.search import SEARCH_TABLE
+
+    schema_editor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0004_product_ratings'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
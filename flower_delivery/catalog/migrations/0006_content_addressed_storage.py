@@ -0,0 +1,19 @@
+# Generated by Django 5.0.4 on 2026-10-18 09:01
+
+import flower_delivery.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.ImageField(storage=flower_delivery.storage.get_content_storage, upload_to='products/', verbose_name='Изображение'),
+        ),
+    ]
@@ -1,12 +1,29 @@
 from django.db import models
 from django.urls import reverse
+from django.utils.functional import cached_property
+from django.utils.text import Truncator
+from flower_delivery.storage import get_content_storage
+from .renditions import ProductRenditions
+
+EXCERPT_LENGTH = 100
+
+def rating_average(rating_sum: int, rating_count: int):
+    """Средняя оценка с точностью до десятых или None, если оценок нет"""
+    if not rating_count:
+        return None
+    return round(rating_sum / rating_count, 1)
 
 class Product(models.Model):
     name = models.CharField('Название', max_length=255)
     price = models.DecimalField('Цена', max_digits=10, decimal_places=2)
     description = models.TextField('Описание', blank=True)
-    image = models.ImageField('Изображение', upload_to='products/')
+    excerpt = models.CharField('Краткое описание', max_length=EXCERPT_LENGTH, blank=True, editable=False)
+    image = models.ImageField('Изображение', upload_to='products/', storage=get_content_storage)
+    renditions = models.JSONField('Варианты изображения', default=dict, blank=True, editable=False)
     available = models.BooleanField('Доступен', default=True)
+    # Агрегаты отзывов поддерживаются приложением reviews
+    rating_count = models.PositiveIntegerField('Количество оценок', default=0, editable=False)
+    rating_sum = models.PositiveIntegerField('Сумма оценок', default=0, editable=False)
     created_at = models.DateTimeField('Дата создания', auto_now_add=True)
     updated_at = models.DateTimeField('Дата обновления', auto_now=True)
 
@@ -14,9 +31,38 @@ class Product(models.Model):
         verbose_name = 'Товар'
         verbose_name_plural = 'Товары'
         ordering = ['-created_at']
+        # Частичный индекс: витрина читает только доступные товары, а SQLite
+        # не использует обычный индекс для условия WHERE "available"
+        indexes = [
+            models.Index(fields=['created_at'], condition=models.Q(available=True), name='product_available_created_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Прежнее изображение освобождается после замены
+        instance._loaded_image = instance.__dict__.get('image')
+        return instance
+
+    @property
+    def rating_avg(self):
+        return rating_average(self.rating_sum, self.rating_count)
+
+    @cached_property
+    def image_renditions(self):
+        return ProductRenditions(self)
+
+    def save(self, *args, **kwargs):
+        self.excerpt = Truncator(self.description).chars(EXCERPT_LENGTH)
+        update_fields = kwargs.get('update_fields')
+        if update_fields:
+            # Дата обновления служит валидатором для условных GET-запросов
+            extra = {'updated_at', 'excerpt'} if 'description' in update_fields else {'updated_at'}
+            kwargs['update_fields'] = {*update_fields, *extra}
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse('catalog:product_detail', args=[self.pk])
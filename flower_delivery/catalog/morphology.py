@@ -0,0 +1,164 @@
+"""
+Нормализация слов для поискового индекса каталога.
+
+Стемминг — алгоритм Snowball для русского языка, латиница переводится
+в кириллицу, а для названий сортов дополнительно строится фонетическая
+форма, чтобы «Mona Lisa» находилась по запросу «Мона Лиза» и наоборот.
+"""
+import re
+from functools import lru_cache
+
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = (('в', 'вши', 'вшись'), ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'))
+REFLEXIVE = ('ся', 'сь')
+ADJECTIVE = (
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым', 'ом',
+    'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею',
+)
+PARTICIPLE = (('ем', 'нн', 'вш', 'ющ', 'щ'), ('ивш', 'ывш', 'ующ'))
+VERB = (
+    ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет', 'ют', 'ны', 'ть', 'ешь', 'нно'),
+    ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй', 'ил', 'ыл', 'им', 'ым', 'ен',
+     'ило', 'ыло', 'ено', 'ят', 'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'),
+)
+NOUN = (
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и', 'ией', 'ей', 'ой', 'ий', 'й',
+    'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я',
+)
+SUPERLATIVE = ('ейше', 'ейш')
+DERIVATIONAL = ('ость', 'ост')
+
+# Сначала многобуквенные сочетания, затем одиночные буквы
+LATIN_TO_CYRILLIC = (
+    ('shch', 'щ'), ('sch', 'щ'), ('ch', 'ч'), ('sh', 'ш'), ('zh', 'ж'), ('kh', 'х'), ('ts', 'ц'),
+    ('yu', 'ю'), ('ya', 'я'), ('yo', 'ё'), ('ye', 'е'), ('ju', 'ю'), ('ja', 'я'), ('jo', 'ё'),
+    ('ck', 'к'), ('ph', 'ф'), ('th', 'т'), ('ee', 'и'), ('oo', 'у'),
+    ('a', 'а'), ('b', 'б'), ('c', 'к'), ('d', 'д'), ('e', 'е'), ('f', 'ф'), ('g', 'г'), ('h', 'х'),
+    ('i', 'и'), ('j', 'дж'), ('k', 'к'), ('l', 'л'), ('m', 'м'), ('n', 'н'), ('o', 'о'), ('p', 'п'),
+    ('q', 'к'), ('r', 'р'), ('s', 'с'), ('t', 'т'), ('u', 'у'), ('v', 'в'), ('w', 'в'), ('x', 'кс'),
+    ('y', 'и'), ('z', 'з'),
+)
+_LATIN_PATTERN = re.compile('|'.join(latin for latin, _ in LATIN_TO_CYRILLIC))
+_LATIN_MAP = dict(LATIN_TO_CYRILLIC)
+
+# Звонкие и глухие согласные, гласные и мягкий/твёрдый знак сводятся к одному виду
+PHONETIC = str.maketrans({
+    'ё': 'е', 'э': 'е', 'ы': 'и', 'й': 'и', 'я': 'а', 'о': 'а', 'ю': 'у',
+    'з': 'с', 'б': 'п', 'в': 'ф', 'г': 'к', 'д': 'т', 'ж': 'ш', 'щ': 'ш',
+    'ь': None, 'ъ': None,
+})
+
+_WORD = re.compile(r'[0-9a-zа-яё]+')
+_REPEATED = re.compile(r'(.)\1+')
+
+
+def tokenize(text: str) -> list:
+    return _WORD.findall((text or '').lower())
+
+
+def to_cyrillic(word: str) -> str:
+    """Транслитерация латинского слова в кириллицу"""
+    return _LATIN_PATTERN.sub(lambda match: _LATIN_MAP[match.group(0)], word)
+
+
+@lru_cache(maxsize=100_000)
+def phonetic(word: str) -> str:
+    """Грубая фонетическая форма для сопоставления вариантов написания"""
+    return _REPEATED.sub(r'\1', to_cyrillic(word).translate(PHONETIC))
+
+
+def _regions(word: str):
+    """Начала областей RV и R2 алгоритма Snowball"""
+    rv = next((i + 1 for i, char in enumerate(word) if char in VOWELS), len(word))
+
+    def next_region(start):
+        for i in range(start + 1, len(word)):
+            if word[i] not in VOWELS and word[i - 1] in VOWELS:
+                return i + 1
+        return len(word)
+
+    return rv, next_region(next_region(0))
+
+
+def _strip(word: str, start: int, endings, preceded_by: str = '') -> str:
+    """Удаление самого длинного окончания в области [start:]; None, если окончания нет"""
+    region = word[start:]
+    for ending in sorted(endings, key=len, reverse=True):
+        if not region.endswith(ending):
+            continue
+        if preceded_by:
+            stem = region[:-len(ending)]
+            if not stem or stem[-1] not in preceded_by:
+                continue
+        return word[:-len(ending)]
+    return None
+
+
+def _strip_grouped(word: str, start: int, groups) -> str:
+    first, second = groups
+    candidates = [
+        result for result in (_strip(word, start, first, preceded_by='ая'), _strip(word, start, second))
+        if result is not None
+    ]
+    # Из двух групп выбирается более длинное совпавшее окончание
+    return min(candidates, key=len) if candidates else None
+
+
+def stem(word: str) -> str:
+    """Основа русского слова по алгоритму Snowball"""
+    word = word.lower().replace('ё', 'е')
+    if len(word) < 3:
+        return word
+    rv, r2 = _regions(word)
+
+    # Шаг 1: деепричастие, иначе возвратная частица и прилагательное/глагол/существительное
+    result = _strip_grouped(word, rv, PERFECTIVE_GERUND)
+    if result is None:
+        word = _strip(word, rv, REFLEXIVE) or word
+        result = _strip(word, rv, ADJECTIVE)
+        if result is not None:
+            result = _strip_grouped(result, rv, PARTICIPLE) or result
+        else:
+            result = _strip_grouped(word, rv, VERB)
+            if result is None:
+                result = _strip(word, rv, NOUN)
+    word = result if result is not None else word
+
+    # Шаг 2
+    if word[rv:].endswith('и'):
+        word = word[:-1]
+
+    # Шаг 3
+    word = _strip(word, r2, DERIVATIONAL) or word
+
+    # Шаг 4
+    if word[rv:].endswith('нн'):
+        word = word[:-1]
+    else:
+        superlative = _strip(word, rv, SUPERLATIVE)
+        if superlative is not None:
+            word = superlative[:-1] if superlative[rv:].endswith('нн') else superlative
+        elif word[rv:].endswith('ь'):
+            word = word[:-1]
+    return word
+
+
+@lru_cache(maxsize=100_000)
+def normalize(word: str) -> str:
+    """Поисковая форма слова: кириллица и основа"""
+    return stem(to_cyrillic(word)) if not word.isdigit() else word
+
+
+def query_prefix(word: str) -> str:
+    """
+    Префикс для поиска по индексу.
+
+    Snowball не всегда идемпотентен («тюльпанов» -> «тюльпан», но «тюльпан» -> «тюльпа»),
+    поэтому запрос ищется по основе основы, если она не слишком короткая.
+    """
+    stemmed = normalize(word)
+    if word.isdigit():
+        return stemmed
+    shorter = stem(stemmed)
+    return shorter if len(shorter) >= 3 else stemmed
@@ -0,0 +1,186 @@
+import io
+import logging
+import os
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Ширина вариантов изображения; больше оригинала изображение не растягивается
+RENDITION_WIDTHS = {
+    'thumb': 160,
+    'card': 480,
+    'detail': 1200,
+}
+
+RENDITION_FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 6}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def rendition_name(image_name: str, rendition: str, fmt: str) -> str:
+    """Имя варианта рядом с оригиналом: products/rose.jpg -> products/rose_card.webp"""
+    stem, _ = os.path.splitext(image_name)
+    return f"{stem}_{rendition}.{RENDITION_FORMATS[fmt][1]}"
+
+
+def _prepare(image: Image.Image, fmt: str) -> Image.Image:
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    if fmt == 'jpeg' and has_alpha:
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image.convert('RGBA'), mask=image.convert('RGBA').getchannel('A'))
+        return background
+    if has_alpha:
+        return image.convert('RGBA')
+    return image.convert('RGB')
+
+
+def render_variants(source) -> dict:
+    """
+    Уменьшенные копии изображения во всех форматах.
+
+    Возвращает {вариант: {'width', 'height', формат: байты}}.
+    """
+    with Image.open(source) as original:
+        original = ImageOps.exif_transpose(original)
+        variants = {}
+        for rendition, width in RENDITION_WIDTHS.items():
+            width = min(width, original.width)
+            height = max(1, round(original.height * width / original.width))
+            resized = original.resize((width, height), Image.LANCZOS)
+            variant = {'width': width, 'height': height}
+            for fmt, (pil_format, _, options) in RENDITION_FORMATS.items():
+                buffer = io.BytesIO()
+                _prepare(resized, fmt).save(buffer, pil_format, **options)
+                variant[fmt] = buffer.getvalue()
+            variants[rendition] = variant
+    return variants
+
+
+def _delete_files(renditions: dict) -> None:
+    for variant in renditions.get('variants', {}).values():
+        for fmt in RENDITION_FORMATS:
+            name = variant.get(fmt)
+            if name:
+                default_storage.delete(name)
+
+
+def _release_files(renditions: dict, product_id: int) -> None:
+    """Удаление прежних вариантов, если их не использует другой товар с тем же изображением"""
+    from .models import Product
+
+    image = renditions.get('image')
+    if image and not Product.objects.filter(renditions__image=image).exclude(pk=product_id).exists():
+        _delete_files(renditions)
+
+
+def build_product_renditions(product_id: int, force: bool = False) -> bool:
+    """
+    Построение вариантов изображения товара.
+
+    Варианты сохраняются рядом с оригиналом, их имена записываются в Product.renditions.
+    Запись выполняется условным UPDATE: если изображение успели заменить,
+    результат отбрасывается. Возвращает True, если варианты были построены.
+    """
+    from .cache import bump_catalog_version_on_commit
+    from .models import Product
+
+    product = Product.objects.filter(pk=product_id).only('image', 'renditions').first()
+    if product is None or not product.image:
+        return False
+    source = product.image.name
+    previous = product.renditions or {}
+    if previous.get('image') == source and not force:
+        return False
+
+    shared = None if force else (
+        Product.objects.filter(renditions__image=source).exclude(pk=product_id)
+        .values_list('renditions', flat=True).first()
+    )
+    if shared:
+        # То же изображение у другого товара (хранилище по содержимому): варианты общие
+        updated = Product.objects.filter(pk=product_id, image=source).update(
+            renditions=shared, updated_at=timezone.now()
+        )
+        if updated:
+            _release_files(previous, product_id)
+            bump_catalog_version_on_commit()
+        return bool(updated)
+
+    try:
+        with product.image.open('rb') as image_file:
+            variants = render_variants(image_file)
+    except (OSError, Image.DecompressionBombError) as e:
+        logger.error(f"Не удалось обработать изображение {source}: {str(e)}")
+        return False
+
+    if previous.get('image') == source:
+        # Пересборка того же изображения: прежние файлы заменяются новыми под теми же именами
+        _delete_files(previous)
+    renditions = {'image': source, 'variants': {}}
+    for rendition, variant in variants.items():
+        stored = {'width': variant['width'], 'height': variant['height']}
+        for fmt in RENDITION_FORMATS:
+            stored[fmt] = default_storage.save(
+                rendition_name(source, rendition, fmt), ContentFile(variant[fmt])
+            )
+        renditions['variants'][rendition] = stored
+
+    updated = Product.objects.filter(pk=product_id, image=source).update(
+        renditions=renditions, updated_at=timezone.now()
+    )
+    if not updated:
+        _delete_files(renditions)
+        return False
+    if previous.get('image') != source:
+        _release_files(previous, product_id)
+    bump_catalog_version_on_commit()
+    return True
+
+
+class ProductRenditions:
+    """
+    Доступ к вариантам изображения из шаблонов.
+
+    Пока варианты не построены, все адреса указывают на оригинал.
+    """
+
+    def __init__(self, product):
+        self._product = product
+        data = product.renditions or {}
+        self._variants = data.get('variants', {}) if product.image and data.get('image') == product.image.name else {}
+
+    @property
+    def ready(self) -> bool:
+        return bool(self._variants)
+
+    def url(self, rendition: str, fmt: str = 'jpeg') -> str:
+        variant = self._variants.get(rendition)
+        if variant and variant.get(fmt):
+            return default_storage.url(variant[fmt])
+        return self._product.image.url if self._product.image else ''
+
+    def srcset(self, fmt: str = 'jpeg') -> str:
+        entries, widths = [], set()
+        for variant in sorted(self._variants.values(), key=lambda v: v['width']):
+            if variant['width'] in widths or not variant.get(fmt):
+                continue
+            widths.add(variant['width'])
+            entries.append(f"{default_storage.url(variant[fmt])} {variant['width']}w")
+        return ', '.join(entries)
+
+    @property
+    def webp_srcset(self) -> str:
+        return self.srcset('webp')
+
+    @property
+    def jpeg_srcset(self) -> str:
+        return self.srcset('jpeg')
+
+    def __getitem__(self, rendition: str) -> str:
+        if rendition not in RENDITION_WIDTHS:
+            raise KeyError(rendition)
+        return self.url(rendition)
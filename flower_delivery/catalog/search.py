@@ -0,0 +1,175 @@
+"""
+Полнотекстовый поиск по каталогу.
+
+По умолчанию используется таблица SQLite FTS5 catalog_product_search, в которую
+пишутся уже нормализованные формы слов (см. catalog.morphology). Другой бэкенд
+подключается настройкой CATALOG_SEARCH_BACKEND; для других СУБД без неё
+используется поиск через icontains.
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from .morphology import normalize, phonetic, query_prefix, tokenize
+
+SEARCH_TABLE = 'catalog_product_search'
+INDEX_BATCH_SIZE = 500
+# Вес совпадений в названии, описании и фонетической форме названия для bm25
+RANK_WEIGHTS = (10.0, 1.0, 4.0)
+
+
+def document(product) -> tuple:
+    """Нормализованные колонки индекса для товара"""
+    name_tokens = tokenize(product.name)
+    return (
+        ' '.join(normalize(token) for token in name_tokens),
+        ' '.join(normalize(token) for token in tokenize(product.description)),
+        ' '.join(phonetic(token) for token in name_tokens if not token.isdigit()),
+    )
+
+
+def build_match(query: str) -> str:
+    """
+    Запрос FTS5: каждое слово ищется префиксом по основе в названии и описании
+    или по фонетической форме в названии; слова объединяются через AND.
+    """
+    clauses = []
+    for token in tokenize(query):
+        clause = f'{{name description}} : "{query_prefix(token)}"*'
+        sound = phonetic(token) if not token.isdigit() else ''
+        if sound:
+            clause = f'({clause} OR phonetic : "{sound}"*)'
+        clauses.append(clause)
+    return ' AND '.join(clauses)
+
+
+class SearchBackend:
+    """Интерфейс поискового бэкенда каталога"""
+
+    def index(self, products) -> None:
+        raise NotImplementedError
+
+    def remove(self, product_ids) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def search(self, query: str, limit: int = 50, available_only: bool = True) -> list:
+        """id товаров в порядке релевантности"""
+        raise NotImplementedError
+
+    def filter(self, queryset, query: str):
+        """Ограничение выборки товаров совпадениями без ранжирования"""
+        raise NotImplementedError
+
+
+class SQLiteFTSBackend(SearchBackend):
+    def index(self, products) -> None:
+        rows = [(product.pk, *document(product)) for product in products]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), INDEX_BATCH_SIZE):
+                batch = rows[start:start + INDEX_BATCH_SIZE]
+                cursor.execute(
+                    f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({", ".join(["%s"] * len(batch))})',
+                    [row[0] for row in batch]
+                )
+                cursor.executemany(
+                    f'INSERT INTO {SEARCH_TABLE} (rowid, name, description, phonetic) VALUES (%s, %s, %s, %s)',
+                    batch
+                )
+
+    def remove(self, product_ids) -> None:
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({", ".join(["%s"] * len(product_ids))})',
+                product_ids
+            )
+
+    def clear(self) -> None:
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+
+    def search(self, query: str, limit: int = 50, available_only: bool = True) -> list:
+        match = build_match(query)
+        if not match:
+            return []
+        sql = (
+            f'SELECT s.rowid FROM {SEARCH_TABLE} s '
+            f'JOIN catalog_product p ON p.id = s.rowid '
+            f'WHERE {SEARCH_TABLE} MATCH %s'
+        )
+        if available_only:
+            sql += ' AND p.available'
+        sql += f' ORDER BY bm25({SEARCH_TABLE}, %s, %s, %s) LIMIT %s'
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [match, *RANK_WEIGHTS, limit])
+            return [row[0] for row in cursor.fetchall()]
+
+    def filter(self, queryset, query: str):
+        match = build_match(query)
+        if not match:
+            return queryset
+        return queryset.filter(
+            pk__in=RawSQL(f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s', [match])
+        )
+
+
+class IContainsBackend(SearchBackend):
+    """Поиск без индекса: подстроки в названии и описании"""
+
+    def index(self, products) -> None:
+        pass
+
+    def remove(self, product_ids) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+    def _condition(self, query: str) -> Q:
+        condition = Q()
+        for token in tokenize(query):
+            condition &= Q(name__icontains=token) | Q(description__icontains=token)
+        return condition
+
+    def search(self, query: str, limit: int = 50, available_only: bool = True) -> list:
+        from .models import Product
+
+        if not tokenize(query):
+            return []
+        products = Product.objects.filter(self._condition(query))
+        if available_only:
+            products = products.filter(available=True)
+        name_match = Case(When(name__icontains=query.strip(), then=Value(0)), default=Value(1), output_field=IntegerField())
+        return list(products.order_by(name_match, '-created_at').values_list('pk', flat=True)[:limit])
+
+    def filter(self, queryset, query: str):
+        return queryset.filter(self._condition(query))
+
+
+def get_backend() -> SearchBackend:
+    path = getattr(settings, 'CATALOG_SEARCH_BACKEND', None)
+    if path is None:
+        return SQLiteFTSBackend() if connection.vendor == 'sqlite' else IContainsBackend()
+    return import_string(path)()
+
+
+def search_products(query: str, limit: int = 50, fields=None) -> list:
+    """Доступные товары по запросу в порядке релевантности"""
+    from .models import Product
+
+    ids = get_backend().search(query, limit=limit)
+    if not ids:
+        return []
+    products = Product.objects.all()
+    if fields:
+        products = products.only(*fields)
+    found = products.in_bulk(ids)
+    return [found[pk] for pk in ids if pk in found]
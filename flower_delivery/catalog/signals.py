@@ -0,0 +1,47 @@
+from functools import partial
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from flower_delivery.storage import release_file
+from .cache import bump_catalog_version_on_commit
+from .models import Product
+from .renditions import _release_files
+from .search import get_backend
+from .tasks import build_product_renditions_task
+
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, instance, **kwargs):
+    bump_catalog_version_on_commit()
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not {'name', 'description'} & set(update_fields):
+        return
+    get_backend().index([instance])
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    get_backend().remove([instance.pk])
+
+@receiver(post_save, sender=Product)
+def schedule_renditions(sender, instance, **kwargs):
+    # Варианты строятся только для нового или заменённого изображения
+    if instance.image and (instance.renditions or {}).get('image') != instance.image.name:
+        product_id = instance.pk
+        # robust=True логирует __qualname__ упавшего обработчика, которого нет у partial
+        transaction.on_commit(lambda: build_product_renditions_task.delay(product_id), robust=True)
+
+@receiver(post_save, sender=Product)
+def release_replaced_image(sender, instance, **kwargs):
+    old_image = getattr(instance, '_loaded_image', None)
+    if old_image and old_image != instance.image.name:
+        transaction.on_commit(partial(release_file, old_image))
+    instance._loaded_image = instance.image.name
+
+@receiver(post_delete, sender=Product)
+def release_deleted_image(sender, instance, **kwargs):
+    if instance.image:
+        transaction.on_commit(partial(release_file, instance.image.name))
+    if instance.renditions:
+        # Варианты общие для товаров с тем же изображением и удаляются вместе с последним из них
+        transaction.on_commit(partial(_release_files, instance.renditions, instance.pk))
@@ -0,0 +1,13 @@
+import logging
+from celery import shared_task
+from .renditions import build_product_renditions
+
+logger = logging.getLogger(__name__)
+
+@shared_task
+def build_product_renditions_task(product_id, force=False):
+    """
+    Задача Celery для построения вариантов изображения товара.
+    """
+    if build_product_renditions(product_id, force=force):
+        logger.info(f"Построены варианты изображения товара {product_id}")
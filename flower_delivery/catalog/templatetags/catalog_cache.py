@@ -0,0 +1,35 @@
+from django import template
+from ..cache import cached_fragment
+
+register = template.Library()
+
+
+class CachedFragmentNode(template.Node):
+    def __init__(self, nodelist, name, parts):
+        self.nodelist = nodelist
+        self.name = name
+        self.parts = parts
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        parts = [part.resolve(context) for part in self.parts]
+        return cached_fragment(name, parts, lambda: self.nodelist.render(context))
+
+
+@register.tag('cached_fragment')
+def do_cached_fragment(parser, token):
+    """
+    Кеширование фрагмента шаблона с привязкой к версии каталога:
+
+        {% cached_fragment "product_card" product.pk %} ... {% endcached_fragment %}
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' требует имя фрагмента")
+    nodelist = parser.parse(('endcached_fragment',))
+    parser.delete_first_token()
+    return CachedFragmentNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        [parser.compile_filter(bit) for bit in bits[2:]],
+    )
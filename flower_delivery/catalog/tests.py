@@ -1,6 +1,31 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest.mock import patch
+from PIL import Image
+from django.core.cache import cache
+from django.core.checks.registry import registry
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.utils import timezone
+from . import api
 from .models import Product
+from .cache import cached_fragment, fragment_stats, get_catalog_version, reset_fragment_stats
+from .morphology import normalize, phonetic, stem
+from .renditions import RENDITION_WIDTHS, build_product_renditions
+from .search import get_backend, search_products
+from .views import PRODUCTS_PER_PAGE
+from flower_delivery.checks import check_shared_cache
+from flower_delivery.testing import QueryPlanAssertions, analyze
+from flower_delivery.storage import IMMUTABLE_CACHE_CONTROL, is_content_addressed, serve_media
 
 class CatalogViewsTests(TestCase):
     @classmethod
@@ -71,3 +96,609 @@ class CatalogViewsTests(TestCase):
     def test_unavailable_product_not_in_list(self):
         response = self.client.get(reverse('catalog:product_list'))
         self.assertNotContains(response, self.unavailable_rose.name)
+
+
+class ProductListPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        created_at = timezone.now()
+        Product.objects.bulk_create([
+            Product(name=f"Роза {i}", price=100, description="Роза " * 50, available=True)
+            for i in range(PRODUCTS_PER_PAGE * 2 + 5)
+        ])
+        # Одинаковая дата создания у всех товаров: порядок держится на id
+        Product.objects.update(created_at=created_at)
+        Product.objects.create(name="Свежая роза", price=100, description="Новинка", available=True)
+        Product.objects.filter(name="Свежая роза").update(created_at=created_at + timedelta(hours=1))
+
+    def _walk(self):
+        names, cursor, pages = [], None, 0
+        while True:
+            params = {'cursor': cursor} if cursor else {}
+            response = self.client.get(reverse('catalog:product_list'), params)
+            self.assertEqual(response.status_code, 200)
+            names.extend(product.name for product in response.context['products'])
+            pages += 1
+            page = response.context['page']
+            if not page.has_next:
+                return names, pages
+            cursor = page.next_cursor
+
+    def test_pages_cover_catalog_without_duplicates(self):
+        names, pages = self._walk()
+        self.assertEqual(pages, 3)
+        self.assertEqual(len(names), Product.objects.count())
+        self.assertEqual(len(set(names)), len(names))
+        self.assertEqual(names[0], "Свежая роза")
+
+    def test_cursor_is_stable_when_products_are_added(self):
+        first = self.client.get(reverse('catalog:product_list')).context['page']
+        Product.objects.create(name="Ещё новее", price=100, available=True)
+        second = self.client.get(reverse('catalog:product_list'), {'cursor': first.next_cursor})
+        self.assertNotIn(first.object_list[-1], second.context['products'])
+        self.assertNotIn("Ещё новее", [product.name for product in second.context['products']])
+
+    def test_deep_page_query_count_is_flat(self):
+        first = self.client.get(reverse('catalog:product_list')).context['page']
+        second = self.client.get(reverse('catalog:product_list'), {'cursor': first.next_cursor}).context['page']
+        with self.assertNumQueries(1):
+            self.client.get(reverse('catalog:product_list'), {'cursor': second.next_cursor})
+
+    def test_listing_defers_description(self):
+        response = self.client.get(reverse('catalog:product_list'))
+        product = response.context['products'][0]
+        self.assertIn('description', product.get_deferred_fields())
+        self.assertContains(response, product.excerpt)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('catalog:product_list'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ProductExcerptTests(TestCase):
+    def test_excerpt_is_truncated_description(self):
+        product = Product.objects.create(name="Роза", price=100, description="а" * 300)
+        self.assertEqual(len(product.excerpt), 100)
+        self.assertTrue(product.excerpt.endswith("…"))
+
+    def test_excerpt_follows_description_update(self):
+        product = Product.objects.create(name="Роза", price=100, description="Старое")
+        product.description = "Новое"
+        product.save(update_fields=['description'])
+        product.refresh_from_db()
+        self.assertEqual(product.excerpt, "Новое")
+
+
+def make_jpeg(name, size, color='red'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class ProductRenditionsTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_upload_schedules_renditions_after_commit(self):
+        with patch('catalog.signals.build_product_renditions_task') as task:
+            with self.captureOnCommitCallbacks(execute=True):
+                product = Product.objects.create(name="Роза", price=100, image=make_jpeg('rose.jpg', (2000, 1000)))
+        task.delay.assert_called_once_with(product.pk)
+
+    def test_broker_failure_does_not_break_save(self):
+        with patch('catalog.signals.build_product_renditions_task') as task:
+            task.delay.side_effect = ConnectionError("Redis недоступен")
+            with self.assertLogs('django', 'ERROR'):
+                with self.captureOnCommitCallbacks(execute=True):
+                    product = Product.objects.create(name="Роза", price=100, image=make_jpeg('rose.jpg', (800, 400)))
+        task.delay.assert_called_once_with(product.pk)
+        self.assertTrue(Product.objects.filter(pk=product.pk).exists())
+
+    def test_build_renditions(self):
+        product = Product.objects.create(name="Роза", price=100, image=make_jpeg('rose.jpg', (2000, 1000)))
+        self.assertTrue(build_product_renditions(product.pk))
+        product.refresh_from_db()
+
+        variants = product.renditions['variants']
+        self.assertEqual(product.renditions['image'], product.image.name)
+        self.assertEqual(set(variants), set(RENDITION_WIDTHS))
+        for rendition, width in RENDITION_WIDTHS.items():
+            self.assertEqual(os.path.dirname(variants[rendition]['webp']), os.path.dirname(product.image.name))
+            with default_storage.open(variants[rendition]['webp']) as f, Image.open(f) as image:
+                self.assertEqual(image.format, 'WEBP')
+                self.assertEqual(image.size, (width, width // 2))
+            with default_storage.open(variants[rendition]['jpeg']) as f, Image.open(f) as image:
+                self.assertEqual(image.format, 'JPEG')
+
+        renditions = product.image_renditions
+        self.assertTrue(renditions.ready)
+        self.assertIn('480w', renditions.webp_srcset)
+        self.assertIn('1200w', renditions.jpeg_srcset)
+        self.assertTrue(renditions['card'].endswith('_card.jpg'))
+
+        # Повторный вызов для того же изображения ничего не делает
+        self.assertFalse(build_product_renditions(product.pk))
+
+    def test_small_image_is_not_upscaled(self):
+        product = Product.objects.create(name="Роза", price=100, image=make_jpeg('small.jpg', (300, 200)))
+        build_product_renditions(product.pk)
+        product.refresh_from_db()
+        widths = {variant['width'] for variant in product.renditions['variants'].values()}
+        self.assertEqual(widths, {160, 300})
+        self.assertEqual(product.image_renditions.jpeg_srcset.count('w'), 2)
+
+    def test_replaced_image_falls_back_to_original(self):
+        product = Product.objects.create(name="Роза", price=100, image=make_jpeg('rose.jpg', (800, 600)))
+        build_product_renditions(product.pk)
+        product.refresh_from_db()
+        old_card = product.renditions['variants']['card']['jpeg']
+
+        product.image = make_jpeg('rose_new.jpg', (800, 600), 'white')
+        product.save()
+        product = Product.objects.get(pk=product.pk)
+        self.assertFalse(product.image_renditions.ready)
+        self.assertEqual(product.image_renditions['card'], product.image.url)
+
+        build_product_renditions(product.pk)
+        self.assertFalse(default_storage.exists(old_card))
+
+    def test_catalog_renders_srcset(self):
+        product = Product.objects.create(name="Роза", price=100, image=make_jpeg('rose.jpg', (800, 600)))
+        build_product_renditions(product.pk)
+        response = self.client.get(reverse('catalog:product_list'))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, '_card.jpg')
+
+    def test_backfill_command(self):
+        for i in range(3):
+            Product.objects.create(name=f"Роза {i}", price=100, image=make_jpeg(f'rose_{i}.jpg', (400, 300)))
+        out = io.StringIO()
+        call_command('build_renditions', workers=1, stdout=out)
+        self.assertIn("Построено: 3", out.getvalue())
+        self.assertFalse(Product.objects.filter(renditions={}).exists())
+
+
+class MorphologyTests(TestCase):
+    def test_stem_merges_word_forms(self):
+        self.assertEqual(stem('розы'), stem('розами'))
+        self.assertEqual(stem('свадебный'), stem('свадебные'))
+        self.assertEqual(stem('красивейший'), 'красив')
+
+    def test_transliteration(self):
+        self.assertEqual(normalize('naomi'), normalize('наоми'))
+        self.assertEqual(phonetic('lisa'), phonetic('лиза'))
+
+
+class ProductSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.mona_lisa = Product.objects.create(name="Роза Mona Lisa", price=300, description="Нежно-розовые цветки")
+        cls.naomi = Product.objects.create(name="Роза Ред Наоми", price=350, description="Тёмно-красные бутоны с ароматом")
+        cls.tulip = Product.objects.create(name="Тюльпан", price=100, description="Весенние цветы, подходят к розам")
+        cls.hidden = Product.objects.create(name="Роза Mona Lisa XL", price=500, available=False)
+
+    def _search(self, query):
+        return [product.name for product in search_products(query)]
+
+    def test_russian_word_forms(self):
+        self.assertEqual(set(self._search('розы')), {self.mona_lisa.name, self.naomi.name, self.tulip.name})
+        self.assertIn(self.naomi.name, self._search('красный аромат'))
+
+    def test_transliterated_variety_names(self):
+        self.assertEqual(self._search('Мона Лиза'), [self.mona_lisa.name])
+        self.assertEqual(self._search('red naomi'), [self.naomi.name])
+
+    def test_name_matches_rank_first(self):
+        self.assertEqual(self._search('роза')[-1], self.tulip.name)
+
+    def test_index_follows_changes(self):
+        self.tulip.name = "Тюльпан Avalanche"
+        self.tulip.save()
+        self.assertEqual(self._search('аваланч'), [self.tulip.name])
+        self.tulip.delete()
+        self.assertEqual(self._search('тюльпан'), [])
+
+    def test_search_view(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('catalog:product_search'), {'q': 'mona lisa'})
+        self.assertContains(response, self.mona_lisa.name)
+        self.assertNotContains(response, self.hidden.name)
+        self.assertContains(self.client.get(reverse('catalog:product_search'), {'q': 'орхидея'}), "ничего не найдено")
+
+    def test_admin_filter_uses_index(self):
+        found = get_backend().filter(Product.objects.all(), 'мона')
+        self.assertEqual(set(found), {self.mona_lisa, self.hidden})
+        self.assertIn('MATCH', str(found.query))
+
+    @override_settings(CATALOG_SEARCH_BACKEND='catalog.search.IContainsBackend')
+    def test_icontains_backend(self):
+        self.assertEqual(self._search('Mona'), [self.mona_lisa.name])
+
+    def test_rebuild_command(self):
+        get_backend().clear()
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(self._search('Мона Лиза'), [self.mona_lisa.name])
+
+
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(name="Аллегрия", price=300, description="Оранжевые розы")
+
+    def test_detail_page_is_served_from_cache(self):
+        url = reverse('catalog:product_detail', args=[self.product.pk])
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, "Оранжевые розы")
+        self.assertContains(response, "<title>Аллегрия</title>", html=False)
+
+    def test_product_change_invalidates_fragments(self):
+        url = reverse('catalog:product_detail', args=[self.product.pk])
+        self.client.get(url)
+        self.client.get(reverse('catalog:product_list'))
+        self.product.description = "Жёлтые розы"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        self.assertContains(self.client.get(url), "Жёлтые розы")
+        self.assertContains(self.client.get(reverse('catalog:product_list')), "Жёлтые розы")
+
+    def test_review_invalidates_rating(self):
+        from reviews.models import Review
+
+        url = reverse('catalog:product_detail', args=[self.product.pk])
+        self.client.get(url)
+        user = get_user_model().objects.create_user(username='rater', email='rater@example.com', password='x')
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(product=self.product, user=user, rating=4, comment="Хорошо")
+        self.assertContains(self.client.get(url), "Посмотреть отзывы (1)")
+
+    def test_version_bumped_only_after_commit(self):
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = 350
+            self.product.save()
+            # До COMMIT параллельный запрос читает старые строки и не должен кешировать их под новой версией
+            self.assertEqual(get_catalog_version(), version)
+        self.assertGreater(get_catalog_version(), version)
+
+    def test_missing_product_is_not_cached(self):
+        url = reverse('catalog:product_detail', args=[self.product.pk + 100])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_hit_and_miss_counters(self):
+        reset_fragment_stats()
+        self.client.get(reverse('catalog:product_list'))
+        self.client.get(reverse('catalog:product_list'))
+        self.assertEqual(fragment_stats(), {'hits': 1, 'misses': 1})
+
+    def test_concurrent_misses_build_once(self):
+        calls = []
+
+        def build():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'fragment'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cached_fragment('slow', (1,), build)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['fragment'] * 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_warm_command(self):
+        out = io.StringIO()
+        call_command('warm_catalog_cache', stdout=out)
+        self.assertIn("построено фрагментов: 2", out.getvalue())
+        with self.assertNumQueries(0):
+            self.client.get(reverse('catalog:product_detail', args=[self.product.pk]))
+
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.media_root = media_root
+        task_patcher = patch('catalog.signals.build_product_renditions_task')
+        task_patcher.start()
+        self.addCleanup(task_patcher.stop)
+
+    def files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.media_root)
+            for root, _, names in os.walk(self.media_root) for name in names
+        )
+
+    def test_identical_uploads_share_file(self):
+        first = Product.objects.create(name="Роза", price=100, image=make_jpeg('rose.JPG', (400, 300)))
+        second = Product.objects.create(name="Роза 2", price=100, image=make_jpeg('other.jpg', (400, 300)))
+        self.assertTrue(is_content_addressed(first.image.name))
+        self.assertTrue(first.image.name.endswith('.jpg'))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(self.files(), [first.image.name])
+
+    def test_shared_file_removed_with_last_reference(self):
+        first = Product.objects.create(name="Роза", price=100, image=make_jpeg('rose.jpg', (400, 300)))
+        second = Product.objects.create(name="Роза 2", price=100, image=make_jpeg('rose.jpg', (400, 300)))
+        name = first.image.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(default_storage.exists(name))
+
+        second = Product.objects.get(pk=second.pk)
+        second.image = make_jpeg('rose_new.jpg', (400, 300), 'white')
+        with self.captureOnCommitCallbacks(execute=True):
+            second.save()
+        self.assertFalse(default_storage.exists(name))
+        self.assertEqual(self.files(), [second.image.name])
+
+    def test_avatar_references_are_counted(self):
+        product = Product.objects.create(name="Роза", price=100, image=make_jpeg('rose.jpg', (400, 300)))
+        user = get_user_model().objects.create_user(
+            username='buyer', email='buyer@example.com', password='pass', avatar=make_jpeg('me.jpg', (400, 300))
+        )
+        self.assertEqual(user.avatar.name, product.image.name.replace('products/', 'avatars/'))
+
+        product = Product.objects.get(pk=product.pk)
+        product.image = make_jpeg('rose.jpg', (400, 300), 'white')
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        user = get_user_model().objects.get(pk=user.pk)
+        user.avatar = product.image
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        # Старый аватар удалён, новый указывает на файл товара
+        self.assertEqual(self.files(), [product.image.name])
+
+    def test_renditions_are_shared(self):
+        first = Product.objects.create(name="Роза", price=100, image=make_jpeg('rose.jpg', (400, 300)))
+        second = Product.objects.create(name="Роза 2", price=100, image=make_jpeg('rose.jpg', (400, 300)))
+        build_product_renditions(first.pk)
+        files = self.files()
+        self.assertTrue(build_product_renditions(second.pk))
+        self.assertEqual(self.files(), files)
+
+        first.refresh_from_db()
+        second = Product.objects.get(pk=second.pk)
+        self.assertEqual(first.renditions, second.renditions)
+        second.image = make_jpeg('rose.jpg', (400, 300), 'white')
+        second.save()
+        build_product_renditions(second.pk)
+        for variant in first.renditions['variants'].values():
+            self.assertTrue(default_storage.exists(variant['jpeg']))
+
+    def test_deleted_product_releases_renditions(self):
+        first = Product.objects.create(name="Роза", price=100, image=make_jpeg('rose.jpg', (400, 300)))
+        second = Product.objects.create(name="Роза 2", price=100, image=make_jpeg('rose.jpg', (400, 300)))
+        build_product_renditions(first.pk)
+        build_product_renditions(second.pk)
+        first.refresh_from_db()
+        second.refresh_from_db()
+
+        # Варианты остаются, пока их использует другой товар
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertGreater(len(self.files()), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertEqual(self.files(), [])
+
+    def test_dedupe_media_command(self):
+        for i, name in enumerate(['rose.jpg', 'rose_copy.jpg', 'tulip.jpg']):
+            path = os.path.join(self.media_root, 'products', name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            Image.new('RGB', (400, 300), 'white' if name == 'tulip.jpg' else 'red').save(path, 'JPEG')
+            Product.objects.create(name=f"Товар {i}", price=100, image=f'products/{name}')
+        legacy = Product.objects.get(image='products/rose.jpg')
+        Product.objects.filter(pk=legacy.pk).update(
+            renditions={'image': 'products/rose.jpg', 'variants': {}}
+        )
+        Image.new('RGB', (10, 10)).save(os.path.join(self.media_root, 'products', 'orphan.jpg'), 'JPEG')
+        # Сирота в каталоге по содержимому, например вариант удалённого товара
+        os.makedirs(os.path.join(self.media_root, 'products', 'ab'))
+        Image.new('RGB', (10, 10)).save(os.path.join(self.media_root, 'products', 'ab', 'ab_card.jpg'), 'JPEG')
+
+        out = io.StringIO()
+        call_command('dedupe_media', dry_run=True, prune_orphans=True, stdout=out)
+        self.assertIn("Переименовано файлов: 3, уникальных: 2", out.getvalue())
+        self.assertEqual(len(self.files()), 5)
+
+        call_command('dedupe_media', prune_orphans=True, stdout=io.StringIO())
+        images = set(Product.objects.values_list('image', flat=True))
+        self.assertEqual(len(images), 2)
+        self.assertTrue(all(is_content_addressed(name) for name in images))
+        self.assertEqual(self.files(), sorted(images))
+        legacy.refresh_from_db()
+        self.assertEqual(legacy.renditions['image'], legacy.image.name)
+
+    def test_hashed_media_served_as_immutable(self):
+        product = Product.objects.create(name="Роза", price=100, image=make_jpeg('rose.jpg', (400, 300)))
+        request = RequestFactory().get(product.image.url)
+        response = serve_media(request, product.image.name, document_root=self.media_root)
+        self.assertEqual(response['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+
+        os.makedirs(os.path.join(self.media_root, 'avatars'))
+        Image.new('RGB', (10, 10)).save(os.path.join(self.media_root, 'avatars', 'legacy.jpg'), 'JPEG')
+        response = serve_media(request, 'avatars/legacy.jpg', document_root=self.media_root)
+        self.assertNotIn('Cache-Control', response)
+
+
+class CatalogQueryPlanTests(QueryPlanAssertions, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Product.objects.bulk_create([
+            Product(name=f"Роза {i}", price=100, available=i % 4 != 0) for i in range(PRODUCTS_PER_PAGE * 20)
+        ])
+        analyze()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_product_list_pages(self):
+        url = reverse('catalog:product_list')
+        response = self.assertViewQueriesIndexed(url)
+        self.assertViewQueriesIndexed(f"{url}?cursor={response.context['page'].next_cursor}")
+
+    def test_api_pages(self):
+        url = reverse('catalog:api_product_list')
+        response = self.assertViewQueriesIndexed(url)
+        self.assertViewQueriesIndexed(f"{url}?cursor={response.json()['next_cursor']}")
+
+    def test_available_products_snapshot(self):
+        self.assertQueryIndexed(Product.objects.filter(available=True).values_list('id', 'name'))
+
+
+class CatalogApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = [
+            Product.objects.create(name=f"Роза {i}", price=100 + i, description="Красная роза", available=i != 0)
+            for i in range(30)
+        ]
+        cls.hidden = cls.products[0]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_list_walks_available_products(self):
+        url = reverse('catalog:api_product_list')
+        seen, cursor = [], None
+        while True:
+            with self.assertNumQueries(1):
+                data = self.client.get(url, {'limit': 7, **({'cursor': cursor} if cursor else {})}).json()
+            seen.extend(product['id'] for product in data['results'])
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        expected = Product.objects.filter(available=True).order_by('-created_at', '-id').values_list('id', flat=True)
+        self.assertEqual(seen, list(expected))
+
+        product = data['results'][-1]
+        self.assertEqual(set(product), set(api.DEFAULT_FIELDS))
+        self.assertEqual(product['url'], self.products[1].get_absolute_url())
+        self.assertEqual(product['price'], '101.00')
+        self.assertIsNone(product['rating_avg'])
+
+    def test_sparse_fields(self):
+        data = self.client.get(reverse('catalog:api_product_list'), {'fields': 'price,id', 'limit': 1}).json()
+        self.assertEqual(list(data['results'][0]), ['price', 'id'])
+        self.assertEqual(self.client.get(reverse('catalog:api_product_list'), {'fields': 'id,secret'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('catalog:api_product_list'), {'limit': 1000}).status_code, 400)
+
+    def test_detail_includes_unavailable_product(self):
+        url = reverse('catalog:api_product_detail', args=[self.hidden.pk])
+        data = self.client.get(url, {'fields': 'id,available,price,name'}).json()
+        self.assertEqual(data, {'id': self.hidden.pk, 'available': False, 'price': '100.00', 'name': "Роза 0"})
+        self.assertEqual(self.client.get(reverse('catalog:api_product_detail', args=[0])).status_code, 404)
+
+    def test_bulk(self):
+        ids = [self.products[5].pk, 0, self.hidden.pk, self.products[5].pk]
+        url = reverse('catalog:api_product_bulk')
+        with self.assertNumQueries(1):
+            data = self.client.get(url, {'ids': ','.join(map(str, ids)), 'fields': 'id,available'}).json()
+        self.assertEqual(data['results'], [
+            {'id': self.products[5].pk, 'available': True},
+            {'id': self.hidden.pk, 'available': False},
+        ])
+        self.assertEqual(data['missing'], [0])
+
+        too_many = ','.join(str(pk) for pk in range(1, api.API_BULK_LIMIT + 2))
+        self.assertEqual(self.client.get(url, {'ids': too_many}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'ids': 'abc'}).status_code, 400)
+
+    def test_not_modified_until_catalog_changes(self):
+        url = reverse('catalog:api_product_detail', args=[self.products[1].pk])
+        response = self.client.get(url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertNotEqual(self.client.get(url, {'fields': 'id'})['ETag'], response['ETag'])
+
+        self.products[1].price = 500
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[1].save(update_fields=['price'])
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.json()['price'], '500.00')
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(name="Аллегрия", price=300, description="Оранжевые розы")
+
+    def test_product_list_not_modified_until_catalog_changes(self):
+        url = reverse('catalog:product_list')
+        response = self.client.get(url)
+        with self.assertNumQueries(0):
+            repeat = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(repeat.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name="Аллилуйя", price=300)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_product_detail_validators(self):
+        url = reverse('catalog:product_detail', args=[self.product.pk])
+        response = self.client.get(url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+        self.product.price = 350
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save(update_fields=['price'])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_etag_depends_on_user(self):
+        url = reverse('catalog:product_list')
+        anonymous = self.client.get(url)['ETag']
+        user = get_user_model().objects.create_user(username='buyer', email='buyer@example.com', password='pass')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=anonymous).status_code, 200)
+
+    def test_review_list_not_modified_until_review_changes(self):
+        from reviews.models import Review
+
+        user = get_user_model().objects.create_user(username='rater', email='rater@example.com', password='x')
+        review = Review.objects.create(product=self.product, user=user, rating=5, comment="Отлично")
+        url = reverse('reviews:review_list', args=[self.product.pk])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        review = Review.objects.get(pk=review.pk)
+        review.comment = "Хорошо"
+        with self.captureOnCommitCallbacks(execute=True):
+            review.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_process_local_cache_fails_deploy_check(self):
+        self.assertEqual([error.id for error in check_shared_cache(None)], ['flower_delivery.E001'])
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost:6379/1',
+    }})
+    def test_shared_cache_passes(self):
+        self.assertEqual(check_shared_cache(None), [])
+
+    def test_check_registered_for_deploy(self):
+        self.assertIn(check_shared_cache, registry.get_checks(include_deployment_checks=True))
+        self.assertNotIn(check_shared_cache, registry.get_checks())
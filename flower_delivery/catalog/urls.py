@@ -1,9 +1,13 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 app_name = 'catalog'
 
 urlpatterns = [
     path('', views.product_list, name='product_list'),
+    path('search/', views.product_search, name='product_search'),
     path('product/<int:pk>/', views.product_detail, name='product_detail'),
+    path('api/products/', api.product_list, name='api_product_list'),
+    path('api/products/bulk/', api.product_bulk, name='api_product_bulk'),
+    path('api/products/<int:pk>/', api.product_detail, name='api_product_detail'),
 ]
@@ -1,10 +1,50 @@
 from django.shortcuts import render, get_object_or_404
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from django.views.decorators.http import condition
+from flower_delivery.conditional import page_etag
+from .cache import cached_fragment, get_catalog_version
+from flower_delivery.pagination import keyset_paginate
 from .models import Product
+from .search import search_products
 
+PRODUCTS_PER_PAGE = 24
+SEARCH_RESULTS_LIMIT = 48
+# Поля, нужные карточке товара: полное описание в списке не загружается
+CARD_FIELDS = ('id', 'name', 'price', 'excerpt', 'image', 'renditions',
+               'rating_count', 'rating_sum', 'available', 'created_at')
+
+def _product_list_etag(request):
+    return page_etag(request, 'products', get_catalog_version(), request.GET.get('cursor', ''))
+
+@condition(etag_func=_product_list_etag)
 def product_list(request):
-    products = Product.objects.filter(available=True)
-    return render(request, 'catalog/product_list.html', {'products': products})
+    products = Product.objects.filter(available=True).only(*CARD_FIELDS)
+    page = keyset_paginate(products, request.GET.get('cursor'), PRODUCTS_PER_PAGE)
+    return render(request, 'catalog/product_list.html', {'products': page.object_list, 'page': page})
+
+def product_search(request):
+    query = request.GET.get('q', '').strip()
+    products = search_products(query, limit=SEARCH_RESULTS_LIMIT, fields=CARD_FIELDS) if query else []
+    return render(request, 'catalog/search.html', {'products': products, 'query': query})
+
+def product_detail_page(pk) -> dict:
+    """Заголовок и содержимое страницы товара, не зависящие от пользователя"""
+    def build():
+        product = get_object_or_404(Product, pk=pk)
+        body = render_to_string('catalog/includes/product_detail_body.html', {'product': product})
+        return {'title': product.name, 'body': body, 'updated_at': product.updated_at}
+
+    return cached_fragment('product_detail', (pk,), build)
+
+def _product_detail_etag(request, pk):
+    return page_etag(request, 'product', pk, get_catalog_version())
+
+def _product_detail_last_modified(request, pk):
+    # Берётся из закешированной страницы: проверка не обращается к БД
+    return product_detail_page(pk)['updated_at']
 
+@condition(etag_func=_product_detail_etag, last_modified_func=_product_detail_last_modified)
 def product_detail(request, pk):
-    product = get_object_or_404(Product, pk=pk)
-    return render(request, 'catalog/product_detail.html', {'product': product})
+    page = product_detail_page(pk)
+    return render(request, 'catalog/product_detail.html', {'title': page['title'], 'body': mark_safe(page['body'])})
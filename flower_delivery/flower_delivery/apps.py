@@ -0,0 +1,7 @@
+from django.apps import AppConfig
+
+class FlowerDeliveryConfig(AppConfig):
+    name = 'flower_delivery'
+
+    def ready(self):
+        import flower_delivery.checks
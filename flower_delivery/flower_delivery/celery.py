@@ -13,10 +13,22 @@ app.conf.beat_schedule = {
         'task': 'analytics.tasks.send_daily_report_task',
         'schedule': crontab(hour=18, minute=00),  # Каждый день в 18:00
     },
+    'drain-notification-outbox': {
+        'task': 'bot.tasks.drain_notification_outbox',
+        'schedule': 10.0,  # Каждые 10 секунд
+    },
+    'archive-orders': {
+        'task': 'orders.tasks.archive_orders_task',
+        'schedule': crontab(hour=3, minute=30),  # Каждую ночь в 3:30
+    },
 }
 
 app.conf.task_routes = {
     'analytics.tasks.send_daily_report_task': {'queue': 'analytics'},
+    'bot.tasks.drain_notification_outbox': {'queue': 'notifications'},
+    'catalog.tasks.build_product_renditions_task': {'queue': 'media'},
+    # Ночные пакетные задачи обрабатывает тот же воркер, что и отчёты
+    'orders.tasks.archive_orders_task': {'queue': 'analytics'},
 }
 
 app.conf.worker_prefetch_multiplier = 1
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# Кеши, которые каждый процесс держит отдельно
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Версии каталога и слотов хранятся в кеше: при кеше в памяти процесса
+    изменение в одном воркере не видно остальным, и они отдают устаревшие
+    страницы и 304 на изменившееся содержимое.
+    """
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend in PROCESS_LOCAL_CACHES:
+        return [Error(
+            "Кеш по умолчанию не общий для процессов",
+            hint="Укажите общий кеш (например, Redis через CACHE_URL).",
+            obj=backend,
+            id='flower_delivery.E001',
+        )]
+    return []
@@ -0,0 +1,17 @@
+import hashlib
+
+
+def page_etag(request, *parts) -> str:
+    """
+    ETag страницы по версии её данных.
+
+    Шапка сайта зависит от пользователя, поэтому он тоже входит в ETag:
+    ответ, закешированный одним пользователем, не подойдёт другому.
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        viewer = f'{user.pk}:{int(user.is_staff)}'
+    else:
+        viewer = 'anonymous'
+    key = ':'.join(str(part) for part in (viewer, *parts))
+    return hashlib.sha1(key.encode()).hexdigest()
@@ -0,0 +1,131 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from django.core import signing
+from django.core.exceptions import BadRequest
+from django.db.models import Q
+
+CURSOR_SALT = 'flower_delivery.pagination'
+
+
+class _CursorSerializer:
+    """JSON без потери точности: микросекунды в датах важны для ключа сортировки"""
+
+    @staticmethod
+    def _default(value):
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        raise TypeError(f"Неподдерживаемое значение курсора: {value!r}")
+
+    def dumps(self, obj):
+        return json.dumps(obj, default=self._default, separators=(',', ':')).encode('latin-1')
+
+    def loads(self, data):
+        return json.loads(data.decode('latin-1'))
+
+
+class KeysetPage:
+    """Страница выборки с курсором на следующую страницу"""
+
+    def __init__(self, object_list, next_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def _field_name(ordering_field: str) -> str:
+    return ordering_field.lstrip('-')
+
+
+def encode_cursor(values) -> str:
+    """Подписанный курсор из значений ключа сортировки"""
+    return signing.dumps(list(values), salt=CURSOR_SALT, serializer=_CursorSerializer, compress=True)
+
+
+def decode_cursor(model, ordering, token: str) -> list:
+    """Значения ключа сортировки из курсора, приведённые к типам полей модели"""
+    try:
+        raw = signing.loads(token, salt=CURSOR_SALT, serializer=_CursorSerializer)
+    except signing.BadSignature:
+        raise BadRequest("Некорректный курсор")
+    if not isinstance(raw, list) or len(raw) != len(ordering):
+        raise BadRequest("Некорректный курсор")
+    return [
+        model._meta.get_field(_field_name(field)).to_python(value)
+        for field, value in zip(ordering, raw)
+    ]
+
+
+def _after(ordering, values) -> Q:
+    """
+    Условие «строго после курсора» для составного ключа сортировки.
+
+    Нестрогая граница по первому полю вынесена отдельным условием: без неё
+    SQLite раскладывает OR на несколько поисков по индексу и сортирует результат заново.
+    """
+    condition = Q()
+    for index, field in enumerate(ordering):
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        step = Q(**{f'{_field_name(field)}__{lookup}': values[index]})
+        for previous, value in zip(ordering[:index], values[:index]):
+            step &= Q(**{_field_name(previous): value})
+        condition |= step
+    first = ordering[0]
+    return Q(**{f"{_field_name(first)}__{'lte' if first.startswith('-') else 'gte'}": values[0]}) & condition
+
+
+def keyset_paginate(queryset, cursor, per_page: int, ordering=('-created_at', '-id')) -> KeysetPage:
+    """
+    Постраничная выборка по ключу сортировки вместо OFFSET.
+
+    Стоимость страницы не зависит от её глубины: следующая страница
+    начинается строго после последней строки предыдущей.
+    """
+    ordering = tuple(ordering)
+    return _page(list(_window(queryset, cursor, per_page, ordering)), per_page, ordering)
+
+
+def keyset_paginate_many(querysets, cursor, per_page: int, ordering=('-created_at', '-id')) -> KeysetPage:
+    """
+    Постраничная выборка сразу из нескольких таблиц с общим ключом сортировки.
+
+    Из каждой выборки читается не больше страницы, строки сливаются в памяти.
+    Значения ключа должны быть уникальны во всех выборках вместе.
+    """
+    ordering = tuple(ordering)
+    rows = [row for queryset in querysets for row in _window(queryset, cursor, per_page, ordering)]
+    # Устойчивые сортировки от младшего поля к старшему дают составной порядок
+    for field in reversed(ordering):
+        rows.sort(key=lambda row: _value(row, _field_name(field)), reverse=field.startswith('-'))
+    return _page(rows, per_page, ordering)
+
+
+def _window(queryset, cursor, per_page, ordering):
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        queryset = queryset.filter(_after(ordering, decode_cursor(queryset.model, ordering, cursor)))
+    return queryset[:per_page + 1]
+
+
+def _value(row, name):
+    return row[name] if isinstance(row, dict) else getattr(row, name)
+
+
+def _page(rows, per_page, ordering) -> KeysetPage:
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(_value(rows[-1], _field_name(field)) for field in ordering)
+    return KeysetPage(rows, next_cursor)
+
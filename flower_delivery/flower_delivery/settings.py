@@ -32,6 +32,7 @@ INSTALLED_APPS = [
     'bot',
     'reviews',
     'analytics',
+    'flower_delivery.apps.FlowerDeliveryConfig',  # Проверки настроек проекта
     'django_celery_beat',  # Для расписаний Celery
 ]
 
@@ -118,6 +119,35 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'Europe/Moscow'
 
+# Общий кеш всех процессов: версии каталога и слотов, снимки, фрагменты, блокировки
+# и ETag на них опираются и должны совпадать у каждого воркера и задачи Celery
+CACHE_URL = os.getenv('CACHE_URL', 'redis://localhost:6379/1')
+if CACHE_URL.startswith('locmem://'):
+    # Кеш в памяти процесса (CACHE_URL=locmem://) — для тестов и запуска в одном процессе;
+    # проверка check --deploy не пропустит его в продакшен
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': CACHE_URL[len('locmem://'):],
+    }}
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+            'KEY_PREFIX': 'flower_delivery',
+        }
+    }
+
+# Архивирование заказов: выполненные и отменённые заказы старше этого срока
+# переносятся в архивные таблицы пачками по ORDER_ARCHIVE_BATCH_SIZE
+ORDER_ARCHIVE_AFTER_DAYS = int(os.getenv('ORDER_ARCHIVE_AFTER_DAYS', 90))
+ORDER_ARCHIVE_BATCH_SIZE = 500
+
+# Слоты доставки: часовые окна с 9:00 до 18:00, не больше DELIVERY_SLOT_CAPACITY
+# заказов в окне (вместимость отдельного слота меняется в админке)
+DELIVERY_SLOT_CAPACITY = int(os.getenv('DELIVERY_SLOT_CAPACITY', 20))
+DELIVERY_SLOT_DAYS_AHEAD = 3
+
 # Настройка для Windows
 if sys.platform == 'win32':
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
\ No newline at end of file
@@ -0,0 +1,115 @@
+"""
+Хранилище медиафайлов с адресацией по содержимому.
+
+Файл получает имя по SHA-256 своего содержимого: products/3f/3fa1…9c.jpg.
+Одинаковые файлы хранятся один раз, а URL такого файла никогда не меняет
+содержимого и может кешироваться браузером бессрочно.
+"""
+import hashlib
+import posixpath
+import re
+from django.apps import apps
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.functional import LazyObject
+from django.views.static import serve
+
+# Поля моделей, ссылающиеся на файлы хранилища: (приложение, модель, поле)
+CONTENT_REFERENCES = (
+    ('catalog', 'Product', 'image'),
+    ('users', 'CustomUser', 'avatar'),
+)
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+_HASHED_NAME = re.compile(r'(^|/)([0-9a-f]{2})/\2[0-9a-f]{62}\.[0-9a-z]+$')
+
+
+def content_hash(content) -> str:
+    """SHA-256 содержимого файла; позиция чтения возвращается в начало"""
+    digest = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return digest.hexdigest()
+
+
+def hashed_name(name: str, digest: str) -> str:
+    """Имя по содержимому в каталоге исходного имени: products/rose.JPG -> products/ab/ab….jpg"""
+    directory = posixpath.dirname(name)
+    extension = posixpath.splitext(name)[1].lower()
+    return posixpath.join(directory, digest[:2], f'{digest}{extension}')
+
+
+def is_content_addressed(name: str) -> bool:
+    return bool(_HASHED_NAME.search(name))
+
+
+def file_references(name: str) -> int:
+    """Количество ссылок на файл из полей CONTENT_REFERENCES"""
+    total = 0
+    for app_label, model_name, field_name in CONTENT_REFERENCES:
+        model = apps.get_model(app_label, model_name)
+        total += model._default_manager.filter(**{field_name: name}).count()
+    return total
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Файловое хранилище с именами по содержимому и подсчётом ссылок.
+
+    Повторная загрузка тех же байтов возвращает уже существующее имя, а delete()
+    удаляет файл, только когда на него не осталось ссылок из CONTENT_REFERENCES.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = hashed_name(name, content_hash(content))
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
+
+    def delete(self, name):
+        if name and file_references(name) == 0:
+            super().delete(name)
+
+    def delete_unreferenced(self, name):
+        """Удаление без подсчёта ссылок, для файлов, заведомо не используемых моделями"""
+        super().delete(name)
+
+
+class _DefaultContentStorage(LazyObject):
+    def _setup(self):
+        self._wrapped = ContentAddressedStorage()
+
+
+content_storage = _DefaultContentStorage()
+
+
+def get_content_storage():
+    """Хранилище для полей моделей; вызываемый объект не попадает в миграции как экземпляр"""
+    return content_storage
+
+
+def release_file(name: str) -> None:
+    """
+    Освобождение файла после удаления или замены ссылки на него.
+
+    Вызывается после фиксации транзакции; файл удаляется, только если
+    на него больше никто не ссылается.
+    """
+    if name and is_content_addressed(name):
+        content_storage.delete(name)
+
+
+def serve_media(request, path, document_root=None, show_indexes=False):
+    """Раздача медиа в режиме отладки с бессрочным кешированием файлов по содержимому"""
+    response = serve(request, path, document_root=document_root, show_indexes=show_indexes)
+    if is_content_addressed(path):
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
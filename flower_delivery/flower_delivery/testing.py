@@ -0,0 +1,54 @@
+"""
+Проверка планов выполнения горячих запросов в тестах.
+
+Запрос считается плохим, если SQLite читает таблицу целиком без индекса
+(«SCAN таблица») или досортировывает строки во временном B-дереве
+(«USE TEMP B-TREE FOR ORDER BY»). Проход по индексу в нужном порядке
+(«SCAN … USING INDEX») допустим: с LIMIT он останавливается на первых строках.
+"""
+import re
+import unittest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+_FULL_SCAN = re.compile(r'^SCAN \w+$')
+_TEMP_SORT = 'USE TEMP B-TREE'
+
+
+def explain(sql: str, params=()) -> list:
+    """Строки EXPLAIN QUERY PLAN для запроса"""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def plan_problems(plan) -> list:
+    return [step for step in plan if _FULL_SCAN.match(step) or _TEMP_SORT in step]
+
+
+def analyze() -> None:
+    """Статистика для планировщика, как на рабочей базе после ANALYZE"""
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', "Планы запросов проверяются для SQLite")
+class QueryPlanAssertions:
+    """Примесь к TestCase с проверками планов запросов"""
+
+    def assertQueryIndexed(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        plan = explain(sql, params)
+        self.assertFalse(plan_problems(plan), f"{sql}\n" + '\n'.join(plan))
+
+    def assertViewQueriesIndexed(self, url, **extra):
+        """Все SELECT, выполненные представлением, читают таблицы по индексам"""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, **extra)
+        self.assertEqual(response.status_code, 200)
+        selects = [query['sql'] for query in context.captured_queries if query['sql'].startswith('SELECT')]
+        self.assertTrue(selects)
+        for sql in selects:
+            plan = explain(sql)
+            self.assertFalse(plan_problems(plan), f"{sql}\n" + '\n'.join(plan))
+        return response
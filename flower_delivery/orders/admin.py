@@ -1,47 +1,59 @@
 from django.contrib import admin
-from .models import Order, OrderItem
-from bot.telegram import send_order_notification
+from django.db import transaction
+from .models import ArchivedOrder, ArchivedOrderItem, DeliverySlot, Order, OrderItem, OrderStatusHistory
+from .services import transition_orders
+from .slots import bump_slots_version
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 1
     readonly_fields = ['price']
 
+class OrderStatusHistoryInline(admin.TabularInline):
+    model = OrderStatusHistory
+    extra = 0
+    fields = ['from_status', 'to_status', 'changed_at']
+    readonly_fields = fields
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ['id', 'user', 'status', 'total_price', 'created_at']
+    list_display = ['id', 'user', 'status', 'total_amount', 'items_count', 'created_at']
     list_filter = ['status']
-    inlines = [OrderItemInline]
-    readonly_fields = ['created_at']
+    inlines = [OrderItemInline, OrderStatusHistoryInline]
+    readonly_fields = ['created_at', 'total_amount', 'items_count']
+
+    def get_readonly_fields(self, request, obj=None):
+        # Время доставки оформленного заказа задаёт его бронь в слоте и здесь не меняется
+        if obj is not None:
+            return [*self.readonly_fields, 'delivery_time']
+        return self.readonly_fields
     actions = ['mark_as_in_progress', 'mark_as_in_delivery', 'mark_as_completed', 'mark_as_canceled', 'delete_selected_orders']
 
-    def save_model(self, request, obj, form, change):
-        super().save_model(request, obj, form, change)
-        if change:
-            send_order_notification(obj.pk, is_new=False)
+    def _mark_as(self, request, queryset, status):
+        updated = transition_orders(queryset, status)
+        self.message_user(
+            request,
+            f"Статус «{dict(Order.STATUS_CHOICES)[status]}» установлен для заказов: {updated}"
+        )
 
     def mark_as_in_progress(self, request, queryset):
-        queryset.update(status='in_progress')
-        for order in queryset:
-            send_order_notification(order.pk, is_new=False)
+        self._mark_as(request, queryset, 'in_progress')
     mark_as_in_progress.short_description = "Отметить как в обработке"
 
     def mark_as_in_delivery(self, request, queryset):
-        queryset.update(status='in_delivery')
-        for order in queryset:
-            send_order_notification(order.pk, is_new=False)
+        self._mark_as(request, queryset, 'in_delivery')
     mark_as_in_delivery.short_description = "Отметить как в доставке"
 
     def mark_as_completed(self, request, queryset):
-        queryset.update(status='completed')
-        for order in queryset:
-            send_order_notification(order.pk, is_new=False)
+        self._mark_as(request, queryset, 'completed')
     mark_as_completed.short_description = "Отметить как выполнен"
 
     def mark_as_canceled(self, request, queryset):
-        queryset.update(status='canceled')
-        for order in queryset:
-            send_order_notification(order.pk, is_new=False)
+        self._mark_as(request, queryset, 'canceled')
     mark_as_canceled.short_description = "Отметить как отменен"
 
     def delete_selected_orders(self, request, queryset):
@@ -50,4 +62,39 @@ class OrderAdmin(admin.ModelAdmin):
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
-    list_display = ['order', 'product', 'price', 'quantity']
\ No newline at end of file
+    list_display = ['order', 'product', 'price', 'quantity']
+
+class ArchivedOrderItemInline(admin.TabularInline):
+    model = ArchivedOrderItem
+    extra = 0
+    fields = ['product', 'quantity', 'price']
+    readonly_fields = fields
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    """Архив только для просмотра: заказы в нём не изменяются"""
+    list_display = ['id', 'user', 'status', 'total_amount', 'items_count', 'created_at', 'archived_at']
+    list_filter = ['status']
+    inlines = [ArchivedOrderItemInline]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(DeliverySlot)
+class DeliverySlotAdmin(admin.ModelAdmin):
+    """Вместимость окна можно менять; число броней ведут только заказы"""
+    list_display = ['starts_at', 'ends_at', 'capacity', 'reserved']
+    list_editable = ['capacity']
+    readonly_fields = ['reserved']
+    date_hierarchy = 'starts_at'
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        transaction.on_commit(bump_slots_version)
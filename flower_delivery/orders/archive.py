@@ -0,0 +1,109 @@
+"""
+Архив заказов.
+
+Выполненные и отменённые заказы старше ORDER_ARCHIVE_AFTER_DAYS переносятся
+из рабочих таблиц в ArchivedOrder вместе с позициями и историей статусов.
+Рабочие таблицы остаются небольшими, а история покупателя и повторный заказ
+читают обе части через функции этого модуля.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+from flower_delivery.pagination import keyset_paginate_many
+from .models import ArchivedOrder, ArchivedOrderItem, ArchivedOrderStatusHistory, Order, OrderItem, OrderStatusHistory
+
+ARCHIVE_STATUSES = ('completed', 'canceled')
+ORDER_COLUMNS = (
+    'id', 'user_id', 'delivery_address', 'delivery_time', 'created_at', 'status', 'comment',
+    'updated_at', 'total_amount', 'items_count',
+)
+
+
+def archive_cutoff(days=None):
+    days = settings.ORDER_ARCHIVE_AFTER_DAYS if days is None else days
+    return timezone.now() - timedelta(days=days)
+
+
+def archivable_orders(cutoff):
+    return Order.objects.filter(status__in=ARCHIVE_STATUSES, created_at__lt=cutoff)
+
+
+def archive_batch(order_ids) -> int:
+    """
+    Перенос заказов в архив одной транзакцией.
+
+    Заказы, успевшие сменить статус, остаются на месте. Строки удаляются
+    без сигналов: пересчёт итогов и аналитики для них не нужен.
+    """
+    with transaction.atomic():
+        rows = list(
+            Order.objects.filter(pk__in=order_ids, status__in=ARCHIVE_STATUSES)
+            .select_for_update().order_by().values(*ORDER_COLUMNS)
+        )
+        ids = [row['id'] for row in rows]
+        if not ids:
+            return 0
+        now = timezone.now()
+        ArchivedOrder.objects.bulk_create([ArchivedOrder(archived_at=now, **row) for row in rows])
+        ArchivedOrderItem.objects.bulk_create([
+            ArchivedOrderItem(**row)
+            for row in OrderItem.objects.filter(order_id__in=ids).order_by('id')
+            .values('order_id', 'product_id', 'quantity', 'price')
+        ])
+        ArchivedOrderStatusHistory.objects.bulk_create([
+            ArchivedOrderStatusHistory(**row)
+            for row in OrderStatusHistory.objects.filter(order_id__in=ids).order_by('id')
+            .values('order_id', 'from_status', 'to_status', 'changed_at')
+        ])
+        for queryset in (
+            OrderItem.objects.filter(order_id__in=ids),
+            OrderStatusHistory.objects.filter(order_id__in=ids),
+            Order.objects.filter(pk__in=ids),
+        ):
+            queryset._raw_delete(queryset.db)
+    return len(ids)
+
+
+def archive_orders(days=None, batch_size=None) -> int:
+    """Архивирование всех подходящих заказов пачками; возвращает число перенесённых"""
+    cutoff = archive_cutoff(days)
+    batch_size = batch_size or settings.ORDER_ARCHIVE_BATCH_SIZE
+    total = 0
+    while True:
+        ids = list(archivable_orders(cutoff).order_by().values_list('pk', flat=True)[:batch_size])
+        archived = archive_batch(ids) if ids else 0
+        if not archived:
+            return total
+        total += archived
+
+
+def items_with_products(item_model=OrderItem):
+    # Только поля, которые выводятся в карточке заказа
+    return Prefetch('items', queryset=item_model.objects.select_related('product').only(
+        'order_id', 'quantity', 'price', 'product__name'
+    ))
+
+
+def customer_orders_page(user, cursor, per_page: int):
+    """Страница истории покупателя: рабочие и архивные заказы вместе, новые первыми"""
+    return keyset_paginate_many([
+        Order.objects.filter(user=user).prefetch_related(items_with_products(OrderItem)),
+        ArchivedOrder.objects.filter(user=user).prefetch_related(items_with_products(ArchivedOrderItem)),
+    ], cursor, per_page)
+
+
+def customer_order_rows(user, fields):
+    """values() по рабочим и архивным заказам покупателя одним запросом (UNION ALL)"""
+    return Order.objects.filter(user=user).order_by().values(*fields).union(
+        ArchivedOrder.objects.filter(user=user).order_by().values(*fields), all=True
+    )
+
+
+def find_order(order_id, **filters):
+    """Заказ из рабочей таблицы или из архива; None, если его нет"""
+    return (
+        Order.objects.filter(pk=order_id, **filters).first()
+        or ArchivedOrder.objects.filter(pk=order_id, **filters).first()
+    )
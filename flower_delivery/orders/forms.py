@@ -1,11 +1,18 @@
+from datetime import datetime, time, timedelta
 from django import forms
+from django.contrib.auth import get_user_model
+from django.db.models import Q
 from .models import Order
-from catalog.models import Product
+from catalog.cache import get_available_products
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 import pytz
+import uuid
 
 class OrderForm(forms.ModelForm):
+    # Выдаётся вместе с формой; повторная отправка той же формы не создаёт второй заказ
+    idempotency_key = forms.CharField(max_length=64, required=False, widget=forms.HiddenInput)
+
     class Meta:
         model = Order
         fields = ['delivery_address', 'delivery_time', 'comment']
@@ -29,21 +36,24 @@ class OrderForm(forms.ModelForm):
         user = kwargs.pop('user', None)
         reorder_data = kwargs.pop('reorder_data', None)
         super().__init__(*args, **kwargs)
+        if not self.is_bound:
+            self.fields['idempotency_key'].initial = uuid.uuid4().hex
         if user:
-            products = Product.objects.filter(available=True)
-            for product in products:
-                initial_quantity = 0
-                if reorder_data:
-                    order_item = reorder_data.items.filter(product=product).first()
-                    if order_item:
-                        initial_quantity = order_item.quantity
-                self.fields[f'quantity_{product.id}'] = forms.IntegerField(
+            initial_quantities = {}
+            if reorder_data:
+                initial_quantities = dict(reorder_data.items.values_list('product_id', 'quantity'))
+            for product_id, name in get_available_products():
+                self.fields[f'quantity_{product_id}'] = forms.IntegerField(
                     min_value=0,
-                    initial=initial_quantity,
-                    label=product.name,
+                    initial=initial_quantities.get(product_id, 0),
+                    label=name,
                     widget=forms.NumberInput(attrs={'class': 'form-control'})
                 )
     
+    def save(self, commit=True):
+        self.instance.idempotency_key = self.cleaned_data.get('idempotency_key') or None
+        return super().save(commit)
+
     def clean_delivery_time(self):
         delivery_time = self.cleaned_data.get('delivery_time')
         if delivery_time:
@@ -61,4 +71,46 @@ class OrderForm(forms.ModelForm):
             if delivery_time < (now + timezone.timedelta(seconds=5)):
                 raise ValidationError("Время доставки должно быть не ранее чем через 5 секунд от текущего времени")
         
-        return delivery_time
\ No newline at end of file
+        return delivery_time
+
+class OrderBoardFilterForm(forms.Form):
+    """Фильтры доски заказов для персонала"""
+    status = forms.ChoiceField(
+        label='Статус', required=False, choices=[('', 'Все статусы'), *Order.STATUS_CHOICES],
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    delivery_from = forms.DateField(
+        label='Доставка с', required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    delivery_to = forms.DateField(
+        label='Доставка по', required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    customer = forms.CharField(
+        label='Покупатель', required=False, max_length=254,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Email или имя пользователя'})
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        delivery_from, delivery_to = cleaned_data.get('delivery_from'), cleaned_data.get('delivery_to')
+        if delivery_from and delivery_to and delivery_from > delivery_to:
+            raise ValidationError("Начало периода доставки позже его конца")
+        return cleaned_data
+
+    def filter(self, queryset):
+        """Заказы, подходящие под заполненные фильтры; даты считаются по Москве"""
+        data = self.cleaned_data
+        moscow_tz = pytz.timezone('Europe/Moscow')
+        if data.get('status'):
+            queryset = queryset.filter(status=data['status'])
+        if data.get('delivery_from'):
+            start = moscow_tz.localize(datetime.combine(data['delivery_from'], time.min))
+            queryset = queryset.filter(delivery_time__gte=start)
+        if data.get('delivery_to'):
+            end = moscow_tz.localize(datetime.combine(data['delivery_to'] + timedelta(days=1), time.min))
+            queryset = queryset.filter(delivery_time__lt=end)
+        if data.get('customer'):
+            customer = data['customer'].strip()
+            users = get_user_model().objects.filter(Q(email__iexact=customer) | Q(username__iexact=customer))
+            queryset = queryset.filter(user__in=users)
+        return queryset
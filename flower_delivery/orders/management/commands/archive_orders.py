@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from orders.archive import archivable_orders, archive_cutoff, archive_orders
+
+
+class Command(BaseCommand):
+    help = "Перенос выполненных и отменённых заказов старше заданного срока в архив"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ORDER_ARCHIVE_AFTER_DAYS,
+                            help="Возраст заказа в днях, после которого он уходит в архив")
+        parser.add_argument('--batch-size', type=int, default=settings.ORDER_ARCHIVE_BATCH_SIZE,
+                            help="Заказов в одной транзакции")
+        parser.add_argument('--dry-run', action='store_true', help="Только посчитать подходящие заказы")
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            count = archivable_orders(archive_cutoff(options['days'])).count()
+            self.stdout.write(f"[проверка] Заказов к архивированию: {count}")
+            return
+        archived = archive_orders(days=options['days'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Перенесено в архив заказов: {archived}"))
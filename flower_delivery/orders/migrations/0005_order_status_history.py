@@ -0,0 +1,31 @@
+# Generated by Django 5.0.4 on 2026-10-18 08:22
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_order_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderStatusHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(blank=True, choices=[('new', 'Новый'), ('in_progress', 'В обработке'), ('in_delivery', 'В доставке'), ('completed', 'Выполнен'), ('canceled', 'Отменен')], max_length=20, verbose_name='Предыдущий статус')),
+                ('to_status', models.CharField(choices=[('new', 'Новый'), ('in_progress', 'В обработке'), ('in_delivery', 'В доставке'), ('completed', 'Выполнен'), ('canceled', 'Отменен')], max_length=20, verbose_name='Новый статус')),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата изменения')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_history', to='orders.order')),
+            ],
+            options={
+                'verbose_name': 'Изменение статуса',
+                'verbose_name_plural': 'История статусов',
+                'ordering': ['changed_at', 'id'],
+                'indexes': [models.Index(fields=['order', 'changed_at'], name='orders_orde_order_i_7978aa_idx')],
+            },
+        ),
+    ]
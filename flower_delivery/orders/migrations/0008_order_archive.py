@@ -0,0 +1,76 @@
+# Generated by Django 5.0.4 on 2026-10-18 09:19
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_product_available_created_idx'),
+        ('orders', '0007_order_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('delivery_address', models.TextField(verbose_name='Адрес доставки')),
+                ('delivery_time', models.DateTimeField(verbose_name='Время доставки')),
+                ('created_at', models.DateTimeField(verbose_name='Дата создания')),
+                ('status', models.CharField(choices=[('new', 'Новый'), ('in_progress', 'В обработке'), ('in_delivery', 'В доставке'), ('completed', 'Выполнен'), ('canceled', 'Отменен')], max_length=20, verbose_name='Статус')),
+                ('comment', models.TextField(blank=True, verbose_name='Комментарий')),
+                ('updated_at', models.DateTimeField(verbose_name='Дата обновления')),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Сумма заказа')),
+                ('items_count', models.PositiveIntegerField(verbose_name='Количество позиций')),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата архивации')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_orders', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Архивный заказ',
+                'verbose_name_plural': 'Архив заказов',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(verbose_name='Количество')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Цена')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='orders.archivedorder')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_order_items', to='catalog.product')),
+            ],
+            options={
+                'verbose_name': 'Позиция архивного заказа',
+                'verbose_name_plural': 'Позиции архивных заказов',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderStatusHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(blank=True, choices=[('new', 'Новый'), ('in_progress', 'В обработке'), ('in_delivery', 'В доставке'), ('completed', 'Выполнен'), ('canceled', 'Отменен')], max_length=20, verbose_name='Предыдущий статус')),
+                ('to_status', models.CharField(choices=[('new', 'Новый'), ('in_progress', 'В обработке'), ('in_delivery', 'В доставке'), ('completed', 'Выполнен'), ('canceled', 'Отменен')], max_length=20, verbose_name='Новый статус')),
+                ('changed_at', models.DateTimeField(verbose_name='Дата изменения')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_history', to='orders.archivedorder')),
+            ],
+            options={
+                'verbose_name': 'Изменение статуса архивного заказа',
+                'verbose_name_plural': 'История статусов архивных заказов',
+                'ordering': ['changed_at', 'id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='archive_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedorderstatushistory',
+            index=models.Index(fields=['order', 'changed_at'], name='archive_history_order_idx'),
+        ),
+    ]
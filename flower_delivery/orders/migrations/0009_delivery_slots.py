@@ -0,0 +1,34 @@
+# Generated by Django 5.0.4 on 2026-10-18 09:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_order_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliverySlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('starts_at', models.DateTimeField(unique=True, verbose_name='Начало')),
+                ('ends_at', models.DateTimeField(verbose_name='Конец')),
+                ('capacity', models.PositiveIntegerField(verbose_name='Вместимость')),
+                ('reserved', models.PositiveIntegerField(default=0, editable=False, verbose_name='Забронировано')),
+            ],
+            options={
+                'verbose_name': 'Слот доставки',
+                'verbose_name_plural': 'Слоты доставки',
+                'ordering': ['starts_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='delivery_slot',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to='orders.deliveryslot', verbose_name='Слот доставки'),
+        ),
+    ]
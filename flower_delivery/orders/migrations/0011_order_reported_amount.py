@@ -0,0 +1,25 @@
+# Generated by Django 5.0.4 on 2026-10-18 09:38
+
+from django.db import migrations, models
+
+
+def mark_counted_orders(apps, schema_editor):
+    # Какие заказы уже попали в отчёт, не записано; считаем учтёнными все неотменённые по текущей сумме
+    Order = apps.get_model('orders', 'Order')
+    Order.objects.exclude(status='canceled').update(reported_amount=models.F('total_amount'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0010_order_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='reported_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=12, null=True, verbose_name='Учтено в отчёте'),
+        ),
+        migrations.RunPython(mark_counted_orders, migrations.RunPython.noop),
+    ]
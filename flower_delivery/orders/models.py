@@ -1,6 +1,55 @@
-from django.db import models
+from decimal import Decimal
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Count, Value
+from django.db.models.functions import Coalesce
 from django.conf import settings
+from django.utils import timezone
 from catalog.models import Product
+import pytz
+
+
+class OrderQuerySet(models.QuerySet):
+    def refresh_totals(self):
+        """Пересчёт сохранённых итогов заказов одним UPDATE"""
+        items = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+        return self.update(
+            total_amount=Coalesce(
+                Subquery(items.annotate(amount=Sum(F('price') * F('quantity'))).values('amount')),
+                Value(Decimal('0.00')),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            ),
+            items_count=Coalesce(
+                Subquery(items.annotate(count=Count('pk')).values('count')),
+                Value(0),
+            ),
+            updated_at=timezone.now(),
+        )
+
+class DeliverySlot(models.Model):
+    """
+    Окно доставки с ограниченным числом заказов.
+
+    reserved меняется только условным UPDATE (см. orders.slots), без блокировок таблицы.
+    """
+    starts_at = models.DateTimeField('Начало', unique=True)
+    ends_at = models.DateTimeField('Конец')
+    capacity = models.PositiveIntegerField('Вместимость')
+    reserved = models.PositiveIntegerField('Забронировано', default=0, editable=False)
+
+    class Meta:
+        verbose_name = 'Слот доставки'
+        verbose_name_plural = 'Слоты доставки'
+        ordering = ['starts_at']
+
+    def __str__(self):
+        moscow_tz = pytz.timezone('Europe/Moscow')
+        start = timezone.localtime(self.starts_at, moscow_tz)
+        end = timezone.localtime(self.ends_at, moscow_tz)
+        return f'{start:%d.%m.%Y %H:%M}–{end:%H:%M} ({self.reserved}/{self.capacity})'
+
+    @property
+    def free(self) -> int:
+        return max(self.capacity - self.reserved, 0)
 
 class Order(models.Model):
     STATUS_CHOICES = (
@@ -18,6 +67,15 @@ class Order(models.Model):
     )
     delivery_address = models.TextField('Адрес доставки')
     delivery_time = models.DateTimeField('Время доставки')
+    delivery_slot = models.ForeignKey(
+        DeliverySlot,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='orders',
+        verbose_name='Слот доставки'
+    )
     created_at = models.DateTimeField('Дата создания', auto_now_add=True)
     status = models.CharField(
         'Статус',
@@ -26,16 +84,60 @@ class Order(models.Model):
         default='new'
     )
     comment = models.TextField('Комментарий', blank=True)
+    updated_at = models.DateTimeField('Дата обновления', auto_now=True)
+    total_amount = models.DecimalField('Сумма заказа', max_digits=12, decimal_places=2, default=0, editable=False)
+    items_count = models.PositiveIntegerField('Количество позиций', default=0, editable=False)
+    # Сумма, с которой заказ учтён в дневном отчёте; None — заказ в отчёте не учтён
+    reported_amount = models.DecimalField(
+        'Учтено в отчёте', max_digits=12, decimal_places=2, null=True, blank=True, editable=False
+    )
+    # Токен из формы оформления: повторная отправка той же формы находит уже созданный заказ
+    idempotency_key = models.CharField('Ключ идемпотентности', max_length=64, null=True, blank=True, editable=False)
+
+    objects = OrderQuerySet.as_manager()
+    is_archived = False
 
     class Meta:
         ordering = ['-created_at']
+        # Индексы по возрастанию: SQLite читает их в обратном порядке для ORDER BY created_at DESC, id DESC
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='order_user_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+            models.Index(fields=['created_at'], name='order_created_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'idempotency_key'], name='order_user_idempotency_key'),
+        ]
 
     def __str__(self):
         return f'Заказ №{self.id}'
 
-    @property
-    def total_price(self):
-        return sum(item.total_price for item in self.items.all())
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # Итоги, учёт в отчёте и бронь слота поддерживаются на уровне БД,
+            # не затираем их устаревшими значениями экземпляра
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in ('total_amount', 'items_count', 'reported_amount', 'delivery_slot')
+            ]
+        elif kwargs.get('update_fields'):
+            # Дата обновления служит валидатором для условных GET-запросов
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'updated_at'}
+        # История статусов пишется в post_save, в той же транзакции
+        with transaction.atomic(savepoint=False):
+            if not self._state.adding and 'status' in kwargs['update_fields']:
+                # Прежний статус берётся из строки под блокировкой, а не из экземпляра:
+                # он мог устареть, и тогда один переход был бы учтён дважды
+                self._loaded_status = (
+                    Order.objects.select_for_update().filter(pk=self.pk).values_list('status', flat=True).first()
+                )
+            super().save(*args, **kwargs)
+
+    def refresh_totals(self):
+        """Пересчёт итогов заказа по его позициям"""
+        Order.objects.filter(pk=self.pk).refresh_totals()
+        self.refresh_from_db(fields=['total_amount', 'items_count'])
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
@@ -46,6 +148,13 @@ class OrderItem(models.Model):
     class Meta:
         unique_together = ['order', 'product']
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем исходный заказ, чтобы при переносе позиции пересчитать оба
+        instance._loaded_order_id = instance.__dict__.get('order_id')
+        return instance
+
     @property
     def total_price(self):
         return self.price * self.quantity
@@ -57,3 +166,91 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return f'{self.product.name} x{self.quantity}'
+
+
+class OrderStatusHistory(models.Model):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='status_history')
+    from_status = models.CharField('Предыдущий статус', max_length=20, choices=Order.STATUS_CHOICES, blank=True)
+    to_status = models.CharField('Новый статус', max_length=20, choices=Order.STATUS_CHOICES)
+    changed_at = models.DateTimeField('Дата изменения', default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Изменение статуса'
+        verbose_name_plural = 'История статусов'
+        ordering = ['changed_at', 'id']
+        indexes = [models.Index(fields=['order', 'changed_at'])]
+
+    def __str__(self):
+        return f'{self.order}: {self.from_status or "—"} → {self.to_status}'
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("История статусов доступна только для добавления")
+        super().save(*args, **kwargs)
+
+
+class ArchivedOrder(models.Model):
+    """
+    Выполненный или отменённый заказ, перенесённый из orders_order (см. orders.archive).
+
+    Сохраняет id исходного заказа, поэтому ссылки на заказ продолжают работать.
+    Архивные заказы не изменяются.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='archived_orders'
+    )
+    delivery_address = models.TextField('Адрес доставки')
+    delivery_time = models.DateTimeField('Время доставки')
+    created_at = models.DateTimeField('Дата создания')
+    status = models.CharField('Статус', max_length=20, choices=Order.STATUS_CHOICES)
+    comment = models.TextField('Комментарий', blank=True)
+    updated_at = models.DateTimeField('Дата обновления')
+    total_amount = models.DecimalField('Сумма заказа', max_digits=12, decimal_places=2)
+    items_count = models.PositiveIntegerField('Количество позиций')
+    archived_at = models.DateTimeField('Дата архивации', default=timezone.now)
+
+    is_archived = True
+
+    class Meta:
+        verbose_name = 'Архивный заказ'
+        verbose_name_plural = 'Архив заказов'
+        ordering = ['-created_at']
+        # id задан явно и не совпадает с rowid SQLite, поэтому входит в индекс для сортировки
+        indexes = [models.Index(fields=['user', 'created_at', 'id'], name='archive_user_created_idx')]
+
+    def __str__(self):
+        return f'Заказ №{self.id}'
+
+
+class ArchivedOrderItem(models.Model):
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name='archived_order_items')
+    quantity = models.PositiveIntegerField('Количество')
+    price = models.DecimalField('Цена', max_digits=10, decimal_places=2)
+
+    class Meta:
+        verbose_name = 'Позиция архивного заказа'
+        verbose_name_plural = 'Позиции архивных заказов'
+
+    @property
+    def total_price(self):
+        return self.price * self.quantity
+
+    def __str__(self):
+        return f'{self.product.name} x{self.quantity}'
+
+
+class ArchivedOrderStatusHistory(models.Model):
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='status_history')
+    from_status = models.CharField('Предыдущий статус', max_length=20, choices=Order.STATUS_CHOICES, blank=True)
+    to_status = models.CharField('Новый статус', max_length=20, choices=Order.STATUS_CHOICES)
+    changed_at = models.DateTimeField('Дата изменения')
+
+    class Meta:
+        verbose_name = 'Изменение статуса архивного заказа'
+        verbose_name_plural = 'История статусов архивных заказов'
+        ordering = ['changed_at', 'id']
+        indexes = [models.Index(fields=['order', 'changed_at'], name='archive_history_order_idx')]
@@ -0,0 +1,192 @@
+from collections import defaultdict
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from analytics.counters import apply_daily_delta, business_date, record_order
+from bot.outbox import enqueue_order_notification, enqueue_order_notifications, enqueue_status_digest
+from catalog.models import Product
+from .archive import customer_order_rows
+from .models import Order, OrderItem, OrderStatusHistory
+from .slots import release_slots, reserve_slot, restore_slots
+
+# При массовой смене статуса большего числа заказов отправляется одна сводка
+DIGEST_THRESHOLD = 10
+RECENT_ORDERS_LIMIT = 5
+
+
+def parse_quantities(data) -> dict:
+    """Сбор количеств из полей quantity_<id> с проверкой значений"""
+    quantities = {}
+    for field_name, value in data.items():
+        if not field_name.startswith('quantity_'):
+            continue
+        product_id = field_name[len('quantity_'):]
+        if value in (None, ''):
+            continue
+        try:
+            product_id = int(product_id)
+            quantity = int(value)
+        except (TypeError, ValueError):
+            raise ValidationError("Некорректное количество товара")
+        if quantity < 0:
+            raise ValidationError("Количество товара не может быть отрицательным")
+        if quantity > 0:
+            quantities[product_id] = quantity
+    return quantities
+
+
+def submitted_order(user, idempotency_key):
+    """Заказ, уже созданный покупателем по этому ключу идемпотентности, или None"""
+    if not idempotency_key:
+        return None
+    return Order.objects.filter(user=user, idempotency_key=idempotency_key).first()
+
+
+def place_order(order: Order, quantities: dict) -> Order:
+    """
+    Создание заказа со всеми позициями в одной транзакции.
+
+    Товары загружаются одним запросом, позиции пишутся одним bulk_create.
+    Место в окне доставки бронируется в той же транзакции.
+
+    Если у заказа задан idempotency_key и заказ с этим ключом уже есть,
+    возвращается он, без записей, поправок аналитики и уведомлений. При
+    одновременной отправке второй INSERT упирается в уникальный индекс,
+    транзакция откатывается целиком и тоже возвращается первый заказ.
+    """
+    if not quantities:
+        raise ValidationError("Выберите хотя бы один товар")
+    existing = submitted_order(order.user_id, order.idempotency_key)
+    if existing is not None:
+        return existing
+    try:
+        return _create_order(order, quantities)
+    except IntegrityError:
+        existing = submitted_order(order.user_id, order.idempotency_key)
+        if existing is None:
+            raise
+        return existing
+
+
+def _create_order(order: Order, quantities: dict) -> Order:
+    with transaction.atomic():
+        products = Product.objects.filter(available=True).order_by().in_bulk(list(quantities))
+        missing = set(quantities) - set(products)
+        if missing:
+            raise ValidationError("Некоторые товары недоступны для заказа")
+        order.delivery_slot_id = reserve_slot(order.delivery_time)
+
+        items = [
+            OrderItem(
+                product=products[product_id],
+                price=products[product_id].price,
+                quantity=quantity,
+            )
+            for product_id, quantity in quantities.items()
+        ]
+        # bulk_create не вызывает сигналы, поэтому итоги считаем здесь же
+        order.total_amount = sum(item.total_price for item in items)
+        order.items_count = len(items)
+        order.reported_amount = order.total_amount
+        order.save()
+        for item in items:
+            item.order = order
+        OrderItem.objects.bulk_create(items)
+        record_order(order)
+        enqueue_order_notification(order.pk, order.status, is_new=True)
+    return order
+
+
+def recent_order_summaries(user, limit: int = RECENT_ORDERS_LIMIT) -> list:
+    """
+    Последние заказы покупателя для профиля и повторного заказа.
+
+    Одна выборка по рабочим и архивным заказам с сохранёнными итогами,
+    без позиций и товаров.
+    """
+    statuses = dict(Order.STATUS_CHOICES)
+    rows = customer_order_rows(
+        user, ('id', 'created_at', 'delivery_time', 'status', 'total_amount', 'items_count')
+    ).order_by('-created_at', '-id')[:limit]
+    return [{**row, 'status_display': statuses[row['status']]} for row in rows]
+
+
+def apply_report_changes(rows, status: str) -> None:
+    """
+    Корректировка дневной аналитики при отмене заказов или её откате.
+
+    rows — кортежи (pk, старый статус, created_at, total_amount, reported_amount).
+    Отмена вычитает ровно ту сумму, с которой заказ был учтён, а неучтённые
+    заказы (например, созданные в админке) не трогает. Откат отмены учитывает
+    заказ заново по его текущей сумме. Поправки группируются по дням.
+    """
+    deltas = defaultdict(lambda: [0, Decimal('0.00')])
+    uncounted, counted = [], []
+    for pk, old_status, created_at, total_amount, reported_amount in rows:
+        if status == 'canceled' and reported_amount is not None:
+            uncounted.append(pk)
+            sign, amount = -1, -reported_amount
+        elif status != 'canceled' and old_status == 'canceled' and reported_amount is None:
+            counted.append(pk)
+            sign, amount = 1, total_amount
+        else:
+            continue
+        delta = deltas[business_date(created_at)]
+        delta[0] += sign
+        delta[1] += amount
+    if uncounted:
+        Order.objects.filter(pk__in=uncounted).update(reported_amount=None)
+    if counted:
+        Order.objects.filter(pk__in=counted).update(reported_amount=F('total_amount'))
+    for day, (orders, revenue) in deltas.items():
+        apply_daily_delta(day, orders, revenue)
+
+
+def apply_status_change(order: Order, old_status: str) -> None:
+    """Корректировка дневной аналитики при смене статуса одного заказа"""
+    if order.status == old_status or 'canceled' not in (order.status, old_status):
+        return
+    # Сумма и отметка учёта поддерживаются в БД, экземпляр может быть устаревшим
+    row = Order.objects.filter(pk=order.pk).values_list('created_at', 'total_amount', 'reported_amount').get()
+    apply_report_changes([(order.pk, old_status, *row)], order.status)
+
+
+def transition_orders(queryset, status: str) -> int:
+    """
+    Массовая смена статуса заказов.
+
+    Статусы обновляются одним UPDATE, история пишется одним INSERT, поправки
+    аналитики группируются по дням, брони — по слотам доставки, а уведомления
+    ставятся в outbox пачкой (или одной сводкой для больших выборок).
+    Сигнал status_changed при этом не отправляется. Возвращает количество изменённых заказов.
+    """
+    with transaction.atomic():
+        rows = list(
+            queryset.exclude(status=status)
+            .select_for_update()
+            .order_by('pk')
+            .values_list('pk', 'status', 'created_at', 'total_amount', 'reported_amount')
+        )
+        if not rows:
+            return 0
+        order_ids = [row[0] for row in rows]
+        now = timezone.now()
+        Order.objects.filter(pk__in=order_ids).update(status=status, updated_at=now)
+        OrderStatusHistory.objects.bulk_create([
+            OrderStatusHistory(order_id=pk, from_status=old_status, to_status=status, changed_at=now)
+            for pk, old_status, *_ in rows
+        ])
+
+        apply_report_changes(rows, status)
+        if status == 'canceled':
+            release_slots(order_ids)
+        else:
+            restore_slots([pk for pk, old_status, *_ in rows if old_status == 'canceled'])
+
+        if len(order_ids) > DIGEST_THRESHOLD:
+            enqueue_status_digest(order_ids, status)
+        else:
+            enqueue_order_notifications(order_ids, status, is_new=False)
+    return len(order_ids)
@@ -1,13 +1,53 @@
-from django.db.models.signals import post_save
-from django.dispatch import receiver
-from .models import Order
-from bot.telegram import send_order_notification
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver, Signal
+from .models import Order, OrderItem, OrderStatusHistory
+from .services import apply_status_change
+from .slots import release_slots, restore_slots
+from bot.outbox import enqueue_order_notification
+
+# Отправляется ровно один раз на каждое фактическое изменение статуса заказа
+status_changed = Signal()
 
 @receiver(post_save, sender=Order)
-def order_status_changed(sender, instance, **kwargs):
-    try:
-        old_instance = Order.objects.get(pk=instance.pk)
-        if old_instance.status != instance.status:
-            send_order_notification(instance.pk, is_new=False)
-    except Order.DoesNotExist:
-        pass
\ No newline at end of file
+def order_status_changed(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and 'status' not in update_fields:
+        return
+    old_status = getattr(instance, '_loaded_status', None)
+    if not created and old_status in (None, instance.status):
+        return
+
+    OrderStatusHistory.objects.create(
+        order=instance,
+        from_status=old_status or '',
+        to_status=instance.status
+    )
+    instance._loaded_status = instance.status
+    if not created:
+        status_changed.send(sender=Order, order=instance, old_status=old_status)
+
+@receiver(status_changed)
+def adjust_daily_report(sender, order, old_status, **kwargs):
+    apply_status_change(order, old_status)
+
+@receiver(status_changed)
+def adjust_delivery_slot(sender, order, old_status, **kwargs):
+    if order.status == 'canceled':
+        release_slots([order.pk])
+    elif old_status == 'canceled':
+        restore_slots([order.pk])
+
+@receiver(pre_delete, sender=Order)
+def release_delivery_slot(sender, instance, **kwargs):
+    # До удаления строки: снятие брони с уже удалённого заказа ничего не изменит
+    release_slots([instance.pk])
+
+@receiver(status_changed)
+def notify_status_change(sender, order, old_status, **kwargs):
+    enqueue_order_notification(order.pk, order.status, is_new=False)
+
+
+@receiver([post_save, post_delete], sender=OrderItem)
+def order_item_changed(sender, instance, **kwargs):
+    order_ids = {instance.order_id, getattr(instance, '_loaded_order_id', None)} - {None}
+    Order.objects.filter(pk__in=order_ids).refresh_totals()
+    instance._loaded_order_id = instance.order_id
@@ -0,0 +1,178 @@
+"""
+Слоты доставки.
+
+День делится на часовые окна с 9:00 до 18:00 по Москве, окна создаются по мере
+надобности с вместимостью DELIVERY_SLOT_CAPACITY. Место в окне бронируется
+условным UPDATE ... WHERE reserved < capacity внутри транзакции заказа:
+параллельные оформления не блокируют таблицу и не могут переполнить окно.
+Свободные места для формы заказа читаются из кеша, который сбрасывается
+после каждой зафиксированной брони или её отмены.
+"""
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from datetime import time as day_time
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+import pytz
+from .models import DeliverySlot, Order
+
+DELIVERY_HOURS = range(9, 18)
+SLOT_LENGTH = timedelta(hours=1)
+SLOTS_VERSION_KEY = 'orders:slots:version'
+AVAILABILITY_TIMEOUT = 60 * 60
+
+MOSCOW_TZ = pytz.timezone('Europe/Moscow')
+
+
+def get_slots_version() -> int:
+    version = cache.get(SLOTS_VERSION_KEY)
+    if version is None:
+        cache.add(SLOTS_VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(SLOTS_VERSION_KEY)
+    return version
+
+
+def bump_slots_version() -> int:
+    """Сброс закешированной доступности слотов"""
+    try:
+        return cache.incr(SLOTS_VERSION_KEY)
+    except ValueError:
+        version = int(time.time() * 1000)
+        cache.set(SLOTS_VERSION_KEY, version, None)
+        return version
+
+
+def slot_start(delivery_time) -> datetime:
+    """Начало часового окна, в которое попадает время доставки"""
+    local = timezone.localtime(delivery_time, MOSCOW_TZ)
+    return MOSCOW_TZ.localize(datetime.combine(local.date(), day_time(local.hour)))
+
+
+def ensure_slots(day) -> None:
+    """Создание недостающих окон на день; существующие не меняются"""
+    starts = [MOSCOW_TZ.localize(datetime.combine(day, day_time(hour))) for hour in DELIVERY_HOURS]
+    DeliverySlot.objects.bulk_create([
+        DeliverySlot(starts_at=start, ends_at=start + SLOT_LENGTH, capacity=settings.DELIVERY_SLOT_CAPACITY)
+        for start in starts
+    ], ignore_conflicts=True)
+
+
+def find_slot(delivery_time):
+    """id окна для времени доставки (окна дня создаются при необходимости); None вне рабочих часов"""
+    start = slot_start(delivery_time)
+    if start.hour not in DELIVERY_HOURS:
+        return None
+    slot_id = DeliverySlot.objects.filter(starts_at=start).values_list('pk', flat=True).first()
+    if slot_id is None:
+        ensure_slots(start.date())
+        slot_id = DeliverySlot.objects.filter(starts_at=start).values_list('pk', flat=True).get()
+    return slot_id
+
+
+def reserve_slot(delivery_time):
+    """
+    Бронирование места в окне доставки; возвращает id слота.
+
+    Вызывается внутри транзакции заказа: при её откате бронь исчезает вместе
+    с заказом. Для времени вне рабочих часов слота нет и возвращается None,
+    само время проверяет форма заказа.
+    """
+    slot_id = find_slot(delivery_time)
+    if slot_id is None:
+        return None
+    reserved = DeliverySlot.objects.filter(pk=slot_id, reserved__lt=F('capacity')).update(
+        reserved=F('reserved') + 1
+    )
+    if not reserved:
+        raise ValidationError("На выбранное время доставки нет свободных мест, выберите другое окно")
+    transaction.on_commit(bump_slots_version)
+    return slot_id
+
+
+def adjust_reservations(deltas: dict) -> None:
+    """
+    Изменение числа броней по слотам: {slot_id: +n или -n}.
+
+    Вызывается из release_slots и restore_slots после того, как бронь
+    отмечена или снята в строке заказа.
+    """
+    deltas = {slot_id: delta for slot_id, delta in deltas.items() if slot_id and delta}
+    if not deltas:
+        return
+    for slot_id, delta in deltas.items():
+        queryset = DeliverySlot.objects.filter(pk=slot_id)
+        if delta < 0:
+            # Счётчик не уходит в минус, даже если слот правили вручную
+            queryset = queryset.filter(reserved__gte=-delta)
+        queryset.update(reserved=F('reserved') + delta)
+    transaction.on_commit(bump_slots_version)
+
+
+def slot_availability(days: int = None) -> list:
+    """
+    Ещё не закончившиеся окна на ближайшие дни с числом свободных мест.
+
+    Строки берутся из кеша по версии слотов, заказы не пересчитываются.
+    Список только для показа: место проверяет и бронирует reserve_slot.
+    """
+    days = settings.DELIVERY_SLOT_DAYS_AHEAD if days is None else days
+    now = timezone.now()
+    today = timezone.localtime(now, MOSCOW_TZ).date()
+    key = f'orders:slots:{get_slots_version()}:{today}:{days}'
+    rows = cache.get(key)
+    if rows is None:
+        for offset in range(days):
+            ensure_slots(today + timedelta(days=offset))
+        start = MOSCOW_TZ.localize(datetime.combine(today, day_time.min))
+        rows = [
+            {**row, 'free': max(row['capacity'] - row['reserved'], 0)}
+            for row in DeliverySlot.objects.filter(
+                starts_at__gte=start, starts_at__lt=start + timedelta(days=days)
+            ).values('id', 'starts_at', 'ends_at', 'capacity', 'reserved')
+        ]
+        cache.set(key, rows, AVAILABILITY_TIMEOUT)
+    return [row for row in rows if row['ends_at'] > now]
+
+
+def release_slots(order_ids) -> None:
+    """
+    Освобождение мест, занятых заказами (отмена или удаление).
+
+    Бронь отмечена в самом заказе полем delivery_slot. Оно снимается условным
+    UPDATE ... WHERE delivery_slot_id = слот, и место возвращается в окно по
+    числу действительно изменённых строк: повторная отмена устаревшим
+    экземпляром ничего не освобождает.
+    """
+    slot_ids = list(
+        Order.objects.filter(pk__in=order_ids, delivery_slot__isnull=False)
+        .order_by().values_list('delivery_slot_id', flat=True).distinct()
+    )
+    adjust_reservations({
+        slot_id: -Order.objects.filter(pk__in=order_ids, delivery_slot_id=slot_id).update(delivery_slot=None)
+        for slot_id in slot_ids
+    })
+
+
+def restore_slots(order_ids) -> None:
+    """
+    Повторное занятие мест заказами, возвращёнными из отмены.
+
+    Окно определяется по текущему времени доставки, место занимается даже
+    сверх вместимости. Заказ, уже держащий место, не учитывается дважды.
+    """
+    by_slot = defaultdict(list)
+    for pk, delivery_time in Order.objects.filter(pk__in=order_ids, delivery_slot__isnull=True).values_list(
+        'pk', 'delivery_time'
+    ):
+        slot_id = find_slot(delivery_time)
+        if slot_id is not None:
+            by_slot[slot_id].append(pk)
+    adjust_reservations({
+        slot_id: Order.objects.filter(pk__in=pks, delivery_slot__isnull=True).update(delivery_slot_id=slot_id)
+        for slot_id, pks in by_slot.items()
+    })
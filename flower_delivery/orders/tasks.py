@@ -0,0 +1,13 @@
+import logging
+from celery import shared_task
+from .archive import archive_orders
+
+logger = logging.getLogger(__name__)
+
+@shared_task
+def archive_orders_task():
+    """
+    Задача Celery для ночного архивирования старых заказов.
+    """
+    archived = archive_orders()
+    logger.info(f"Перенесено в архив заказов: {archived}")
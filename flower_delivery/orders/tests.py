@@ -1,13 +1,50 @@
-from django.test import TransactionTestCase, Client
+from django.test import TestCase, TransactionTestCase, Client
 from django.urls import reverse
 from django.contrib.auth import get_user_model
-from orders.models import Order, OrderItem
+from orders.archive import archive_orders, find_order
+from orders.models import ArchivedOrder, ArchivedOrderItem, DeliverySlot, Order, OrderItem, OrderStatusHistory
+from orders.services import place_order, parse_quantities, recent_order_summaries, transition_orders
+from orders.slots import ensure_slots, restore_slots, slot_availability
+from orders.forms import OrderForm
+from orders.views import HISTORY_PER_PAGE, ORDERS_PER_PAGE
 from catalog.models import Product
 from analytics.models import DailyReport
+from analytics.counters import business_date
+from flower_delivery.testing import QueryPlanAssertions, analyze
+from bot.models import NotificationOutbox
 from decimal import Decimal
+from io import StringIO
+from django.core.management import call_command
 from django.utils import timezone
+from django.db import OperationalError, connection
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 import pytz
 from unittest.mock import patch
+import threading
+import time
+
+
+def delivery_at(day, hour, minute=30):
+    """Время доставки в указанный день и час по Москве"""
+    return pytz.timezone('Europe/Moscow').localize(timezone.datetime(day.year, day.month, day.day, hour, minute))
+
+
+def place_order_retrying(new_order, quantities):
+    """
+    place_order из параллельного потока.
+
+    Тестовая база SQLite в памяти с общим кешем отвечает «table is locked»,
+    пока чужая транзакция пишет; рабочая СУБД в таком случае просто ждёт.
+    """
+    for _ in range(500):
+        try:
+            return place_order(new_order(), quantities)
+        except OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            time.sleep(0.005)
+    raise AssertionError("Не удалось дождаться освобождения базы")
 
 class OrderCreateViewTest(TransactionTestCase):
     def setUp(self):
@@ -68,7 +105,1052 @@ class OrderCreateViewTest(TransactionTestCase):
         order_item = OrderItem.objects.get(order=order)
         self.assertEqual(order_item.quantity, 2)
 
+        # Уведомление ставится в outbox, а не отправляется из запроса
+        outbox = NotificationOutbox.objects.get()
+        self.assertEqual(outbox.payload, {'order_id': order.pk, 'is_new': True, 'status': 'new'})
+
         # Проверяем обновление аналитики
         report = DailyReport.objects.get(date=self.fixed_time.date())
         self.assertEqual(report.order_count, 1)
         self.assertEqual(report.total_revenue, Decimal('600.00'))
+
+
+    def test_repeated_submission_creates_one_order(self):
+        cache.clear()
+        response = self.client.get(reverse('orders:order_create'))
+        key = response.context['form']['idempotency_key'].value()
+        self.assertTrue(key)
+        self.assertContains(response, f'name="idempotency_key" value="{key}"')
+
+        order_data = {
+            'delivery_address': 'Москва, ул. Пушкина, д. 10',
+            'delivery_time': (self.fixed_time + timezone.timedelta(hours=1)).strftime('%Y-%m-%dT%H:%M'),
+            'idempotency_key': key,
+            f'quantity_{self.product.id}': 2,
+        }
+        self.assertEqual(self.client.post(reverse('orders:order_create'), data=order_data).status_code, 302)
+        order = Order.objects.get()
+        self.assertEqual(order.idempotency_key, key)
+
+        # Повтор возвращает принятый заказ, даже если окно уже заполнено
+        DeliverySlot.objects.filter(pk=order.delivery_slot_id).update(capacity=1)
+        cache.clear()
+        response = self.client.post(reverse('orders:order_create'), data=order_data)
+        self.assertRedirects(response, reverse('orders:order_list'), fetch_redirect_response=False)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(NotificationOutbox.objects.count(), 1)
+        self.assertEqual(DailyReport.objects.get(date=self.fixed_time.date()).order_count, 1)
+
+        # Новая форма — новый заказ
+        response = self.client.get(reverse('orders:order_create'))
+        order_data['idempotency_key'] = response.context['form']['idempotency_key'].value()
+        order_data['delivery_time'] = (self.fixed_time + timezone.timedelta(hours=2)).strftime('%Y-%m-%dT%H:%M')
+        self.client.post(reverse('orders:order_create'), data=order_data)
+        self.assertEqual(Order.objects.count(), 2)
+
+
+class PlaceOrderServiceTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='serviceuser',
+            email='serviceuser@example.com',
+            password='testpass123'
+        )
+        self.products = [
+            Product.objects.create(name=f'Роза {i}', price=100 + i, available=True)
+            for i in range(20)
+        ]
+
+    def _new_order(self):
+        return Order(
+            user=self.user,
+            delivery_address='Москва, ул. Пушкина, д. 10',
+            delivery_time=timezone.now() + timezone.timedelta(hours=1)
+        )
+
+    def test_place_order_query_budget(self):
+        quantities = {product.id: 2 for product in self.products}
+        DailyReport.objects.create(date=business_date())
+        order = self._new_order()
+        order.delivery_time = delivery_at(timezone.now().date() + timezone.timedelta(days=1), 12)
+        ensure_slots(order.delivery_time.date())
+        # in_bulk + id слота + условный UPDATE брони + INSERT заказа + INSERT истории статусов
+        # + bulk_create позиций + UPDATE отчёта + INSERT в outbox + SAVEPOINT/RELEASE
+        with self.assertNumQueries(10):
+            order = place_order(order, quantities)
+
+        self.assertEqual(order.items.count(), 20)
+        self.assertEqual(
+            sum(item.total_price for item in order.items.all()),
+            sum(Decimal(product.price) * 2 for product in self.products)
+        )
+
+    def test_place_order_with_same_key_returns_existing(self):
+        quantities = {self.products[0].id: 1}
+        first = self._new_order()
+        first.idempotency_key = 'key-1'
+        place_order(first, quantities)
+
+        repeat = self._new_order()
+        repeat.idempotency_key = 'key-1'
+        with self.assertNumQueries(1):
+            self.assertEqual(place_order(repeat, quantities).pk, first.pk)
+        self.assertIsNone(repeat.pk)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(NotificationOutbox.objects.count(), 1)
+        self.assertEqual(DailyReport.objects.get().order_count, 1)
+
+        # Ключ действует в пределах покупателя
+        other = Order(
+            user=get_user_model().objects.create_user(
+                username='otheruser', email='otheruser@example.com', password='testpass123'
+            ),
+            delivery_address='Москва',
+            delivery_time=timezone.now() + timezone.timedelta(hours=1),
+            idempotency_key='key-1',
+        )
+        self.assertNotEqual(place_order(other, quantities).pk, first.pk)
+
+    def test_concurrent_duplicate_rolls_back_to_existing(self):
+        quantities = {self.products[0].id: 1}
+        first = self._new_order()
+        first.idempotency_key = 'key-2'
+        place_order(first, quantities)
+
+        # Параллельный запрос не увидел первый заказ при проверке и дошёл до INSERT
+        repeat = self._new_order()
+        repeat.idempotency_key = 'key-2'
+        with patch('orders.services.submitted_order', side_effect=[None, first]):
+            self.assertEqual(place_order(repeat, quantities), first)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(OrderItem.objects.count(), 1)
+        self.assertEqual(NotificationOutbox.objects.count(), 1)
+        self.assertEqual(DailyReport.objects.get().order_count, 1)
+
+    def test_place_order_without_items(self):
+        with self.assertRaises(ValidationError):
+            place_order(self._new_order(), {})
+        self.assertEqual(Order.objects.count(), 0)
+
+    def test_place_order_unavailable_product_rolls_back(self):
+        self.products[0].available = False
+        self.products[0].save()
+        quantities = {product.id: 1 for product in self.products[:3]}
+        with self.assertRaises(ValidationError):
+            place_order(self._new_order(), quantities)
+        self.assertEqual(Order.objects.count(), 0)
+        self.assertEqual(OrderItem.objects.count(), 0)
+
+    def test_parse_quantities(self):
+        data = {'quantity_1': '2', 'quantity_2': 0, 'quantity_3': '', 'comment': 'x'}
+        self.assertEqual(parse_quantities(data), {1: 2})
+        with self.assertRaises(ValidationError):
+            parse_quantities({'quantity_1': '-1'})
+        with self.assertRaises(ValidationError):
+            parse_quantities({'quantity_1': 'abc'})
+
+
+class OrderTotalsTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='totalsuser',
+            email='totalsuser@example.com',
+            password='testpass123'
+        )
+        self.rose = Product.objects.create(name='Роза', price=100, available=True)
+        self.tulip = Product.objects.create(name='Тюльпан', price=50, available=True)
+        self.order = Order.objects.create(
+            user=self.user,
+            delivery_address='Москва, ул. Пушкина, д. 10',
+            delivery_time=timezone.now() + timezone.timedelta(hours=1)
+        )
+
+    def test_totals_follow_item_changes(self):
+        item = OrderItem.objects.create(order=self.order, product=self.rose, quantity=2)
+        OrderItem.objects.create(order=self.order, product=self.tulip, quantity=3)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, Decimal('350.00'))
+        self.assertEqual(self.order.items_count, 2)
+
+        item.quantity = 1
+        item.save()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, Decimal('250.00'))
+
+        item.delete()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, Decimal('150.00'))
+        self.assertEqual(self.order.items_count, 1)
+
+    def test_stale_instance_save_keeps_totals(self):
+        OrderItem.objects.create(order=self.order, product=self.rose, quantity=2)
+        self.order.comment = 'Позвонить заранее'
+        self.order.save()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, Decimal('200.00'))
+
+    def test_item_moved_to_another_order(self):
+        other = Order.objects.create(
+            user=self.user,
+            delivery_address='Москва, ул. Ленина, д. 1',
+            delivery_time=timezone.now() + timezone.timedelta(hours=2)
+        )
+        OrderItem.objects.create(order=self.order, product=self.rose, quantity=2)
+        item = OrderItem.objects.get(order=self.order)
+        item.order = other
+        item.save()
+        self.order.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.order.total_amount, Decimal('0.00'))
+        self.assertEqual(other.total_amount, Decimal('200.00'))
+
+    def test_place_order_sets_totals(self):
+        order = place_order(
+            Order(
+                user=self.user,
+                delivery_address='Москва, ул. Пушкина, д. 10',
+                delivery_time=timezone.now() + timezone.timedelta(hours=1)
+            ),
+            {self.rose.id: 1, self.tulip.id: 4}
+        )
+        order.refresh_from_db()
+        self.assertEqual(order.total_amount, Decimal('300.00'))
+        self.assertEqual(order.items_count, 2)
+
+
+class OrderFormSnapshotTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='formuser',
+            email='formuser@example.com',
+            password='testpass123'
+        )
+        # Версия каталога поднимается после COMMIT, в тестах его имитирует captureOnCommitCallbacks
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products = [
+                Product.objects.create(name=f'Сорт {i}', price=200, available=True)
+                for i in range(120)
+            ]
+        OrderForm(user=self.user)  # прогрев снимка каталога
+
+    def test_form_builds_without_queries(self):
+        with self.assertNumQueries(0):
+            form = OrderForm(user=self.user)
+        self.assertEqual(
+            len([name for name in form.fields if name.startswith('quantity_')]),
+            120
+        )
+
+    def test_reorder_prefill_single_query(self):
+        order = Order.objects.create(
+            user=self.user,
+            delivery_address='Москва, ул. Пушкина, д. 10',
+            delivery_time=timezone.now() + timezone.timedelta(hours=1)
+        )
+        OrderItem.objects.create(order=order, product=self.products[0], quantity=3)
+        OrderItem.objects.create(order=order, product=self.products[5], quantity=1)
+
+        with self.assertNumQueries(1):
+            form = OrderForm(user=self.user, reorder_data=order)
+        self.assertEqual(form.fields[f'quantity_{self.products[0].id}'].initial, 3)
+        self.assertEqual(form.fields[f'quantity_{self.products[5].id}'].initial, 1)
+        self.assertEqual(form.fields[f'quantity_{self.products[1].id}'].initial, 0)
+
+    def test_snapshot_invalidated_on_product_change(self):
+        product = self.products[0]
+        product.available = False
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        form = OrderForm(user=self.user)
+        self.assertNotIn(f'quantity_{product.id}', form.fields)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            new_product = Product.objects.create(name='Новинка', price=500, available=True)
+        form = OrderForm(user=self.user)
+        self.assertEqual(form.fields[f'quantity_{new_product.id}'].label, 'Новинка')
+
+
+class OrderCancellationAnalyticsTest(TestCase):
+    def setUp(self):
+        self.staff = get_user_model().objects.create_user(
+            username='staff',
+            email='staff@example.com',
+            password='testpass123',
+            is_staff=True
+        )
+        product = Product.objects.create(name='Роза', price=250, available=True)
+        self.order = place_order(
+            Order(
+                user=self.staff,
+                delivery_address='Москва, ул. Пушкина, д. 10',
+                delivery_time=timezone.now() + timezone.timedelta(hours=1)
+            ),
+            {product.id: 2}
+        )
+        self.client.login(email='staff@example.com', password='testpass123')
+
+    def test_cancel_and_restore_adjusts_report(self):
+        report_date = business_date(self.order.created_at)
+        url = reverse('orders:update_order_status', args=[self.order.id])
+
+        self.client.post(url, {'status': 'canceled'})
+        report = DailyReport.objects.get(date=report_date)
+        self.assertEqual(report.order_count, 0)
+        self.assertEqual(report.total_revenue, Decimal('0.00'))
+
+        self.client.post(url, {'status': 'in_progress'})
+        report.refresh_from_db()
+        self.assertEqual(report.order_count, 1)
+        self.assertEqual(report.total_revenue, Decimal('500.00'))
+
+    def test_cancel_reverses_recorded_amount_after_items_change(self):
+        report_date = business_date(self.order.created_at)
+        item = self.order.items.get()
+        item.quantity = 10
+        item.save()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, Decimal('2500.00'))
+
+        self.order.status = 'canceled'
+        self.order.save(update_fields=['status'])
+        report = DailyReport.objects.get(date=report_date)
+        self.assertEqual(report.order_count, 0)
+        self.assertEqual(report.total_revenue, Decimal('0.00'))
+
+        # Откат отмены учитывает заказ по текущей сумме, следующая отмена вычитает её же
+        transition_orders(Order.objects.filter(pk=self.order.pk), 'new')
+        report.refresh_from_db()
+        self.assertEqual((report.order_count, report.total_revenue), (1, Decimal('2500.00')))
+        transition_orders(Order.objects.filter(pk=self.order.pk), 'canceled')
+        report.refresh_from_db()
+        self.assertEqual((report.order_count, report.total_revenue), (0, Decimal('0.00')))
+
+    def test_cancel_uncounted_order_leaves_report(self):
+        # Заказы из админки или Order.objects.create в отчёт не попадали
+        report_date = business_date(self.order.created_at)
+        orders = [
+            Order.objects.create(
+                user=self.staff,
+                delivery_address='Москва',
+                delivery_time=timezone.now() + timezone.timedelta(hours=1),
+                total_amount=Decimal('700.00'),
+            )
+            for _ in range(3)
+        ]
+        orders[0].status = 'canceled'
+        orders[0].save(update_fields=['status'])
+        transition_orders(Order.objects.filter(pk=orders[1].pk), 'canceled')
+        report = DailyReport.objects.get(date=report_date)
+        self.assertEqual((report.order_count, report.total_revenue), (1, Decimal('500.00')))
+
+        # Единственный заказ своего дня: счётчик не уходит в минус
+        old_day = timezone.now() - timezone.timedelta(days=10)
+        Order.objects.filter(pk=orders[2].pk).update(created_at=old_day)
+        transition_orders(Order.objects.filter(pk=orders[2].pk), 'canceled')
+        self.assertFalse(DailyReport.objects.filter(date=business_date(old_day), order_count__gt=0).exists())
+        self.assertEqual(Order.objects.filter(status='canceled').count(), 3)
+
+
+class OrderStatusHistoryTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='historyuser',
+            email='historyuser@example.com',
+            password='testpass123'
+        )
+        product = Product.objects.create(name='Роза', price=100, available=True)
+        place_order(
+            Order(
+                user=self.user,
+                delivery_address='Москва, ул. Пушкина, д. 10',
+                delivery_time=timezone.now() + timezone.timedelta(hours=1)
+            ),
+            {product.id: 1}
+        )
+        self.order = Order.objects.get()
+
+    def test_creation_is_recorded(self):
+        history = list(self.order.status_history.values_list('from_status', 'to_status'))
+        self.assertEqual(history, [('', 'new')])
+
+    def test_transition_recorded_once(self):
+        self.order.status = 'in_progress'
+        # SELECT прежнего статуса FOR UPDATE + UPDATE заказа + INSERT в историю + INSERT в outbox
+        with self.assertNumQueries(4):
+            self.order.save(update_fields=['status'])
+
+        self.order.save()
+        self.order.comment = 'Без изменений статуса'
+        self.order.save()
+        transitions = list(
+            OrderStatusHistory.objects.filter(order=self.order).values_list('from_status', 'to_status')
+        )
+        self.assertEqual(transitions, [('', 'new'), ('new', 'in_progress')])
+        self.assertEqual(
+            list(NotificationOutbox.objects.values_list('payload', flat=True)),
+            [
+                {'order_id': self.order.pk, 'is_new': True, 'status': 'new'},
+                {'order_id': self.order.pk, 'is_new': False, 'status': 'in_progress'},
+            ]
+        )
+
+    def test_stale_instances_record_one_transition(self):
+        # Два сотрудника открыли заказ до отмены и оба сохраняют его отменённым
+        first, second = Order.objects.get(pk=self.order.pk), Order.objects.get(pk=self.order.pk)
+        for order in (first, second):
+            order.status = 'canceled'
+            order.save()
+        transitions = list(self.order.status_history.values_list('from_status', 'to_status'))
+        self.assertEqual(transitions, [('', 'new'), ('new', 'canceled')])
+        self.assertEqual(NotificationOutbox.objects.count(), 2)
+
+        # Экземпляр, загруженный до отмены, возвращает заказ в работу настоящим переходом
+        self.order.status = 'new'
+        self.order.save(update_fields=['status'])
+        self.assertEqual(self.order.status_history.order_by('pk').last().from_status, 'canceled')
+
+    def test_history_is_append_only(self):
+        entry = self.order.status_history.get()
+        entry.to_status = 'completed'
+        with self.assertRaises(ValueError):
+            entry.save()
+
+
+class BulkStatusTransitionTest(TestCase):
+    def setUp(self):
+        self.staff = get_user_model().objects.create_user(
+            username='bulkstaff',
+            email='bulkstaff@example.com',
+            password='testpass123',
+            is_staff=True,
+            is_superuser=True
+        )
+        delivery_time = timezone.now() + timezone.timedelta(hours=2)
+        Order.objects.bulk_create([
+            Order(
+                user=self.staff,
+                delivery_address=f'Москва, ул. Цветочная, д. {i}',
+                delivery_time=delivery_time,
+                total_amount=Decimal('100.00'),
+                items_count=1,
+                reported_amount=Decimal('100.00')
+            )
+            for i in range(300)
+        ])
+
+    def test_large_batch_uses_fixed_queries_and_digest(self):
+        # SELECT FOR UPDATE + UPDATE + INSERT истории (2 пачки для SQLite) + INSERT сводки
+        # + SAVEPOINT/RELEASE
+        with self.assertNumQueries(7):
+            updated = transition_orders(Order.objects.all(), 'in_delivery')
+
+        self.assertEqual(updated, 300)
+        self.assertEqual(Order.objects.filter(status='in_delivery').count(), 300)
+        self.assertEqual(OrderStatusHistory.objects.filter(to_status='in_delivery').count(), 300)
+        digest = NotificationOutbox.objects.get()
+        self.assertEqual(digest.kind, 'digest')
+        self.assertEqual(len(digest.payload['order_ids']), 300)
+
+        # Повторная смена на тот же статус ничего не меняет
+        self.assertEqual(transition_orders(Order.objects.all(), 'in_delivery'), 0)
+
+    def test_small_batch_enqueues_individual_notifications(self):
+        orders = Order.objects.order_by('pk')[:3]
+        transition_orders(Order.objects.filter(pk__in=[o.pk for o in orders]), 'in_progress')
+        self.assertEqual(
+            list(NotificationOutbox.objects.values_list('kind', flat=True)),
+            ['order', 'order', 'order']
+        )
+
+    def test_cancellation_adjusts_daily_report(self):
+        report_date = business_date()
+        DailyReport.objects.create(date=report_date, order_count=300, total_revenue=Decimal('30000.00'))
+        canceled_ids = list(Order.objects.values_list('pk', flat=True)[:50])
+        transition_orders(Order.objects.filter(pk__in=canceled_ids), 'canceled')
+        report = DailyReport.objects.get(date=report_date)
+        self.assertEqual(report.order_count, 250)
+        self.assertEqual(report.total_revenue, Decimal('25000.00'))
+
+    def test_admin_action_responds_immediately(self):
+        self.client.login(email='bulkstaff@example.com', password='testpass123')
+        response = self.client.post(reverse('admin:orders_order_changelist'), {
+            'action': 'mark_as_in_delivery',
+            '_selected_action': list(Order.objects.values_list('pk', flat=True)),
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Order.objects.filter(status='in_delivery').count(), 300)
+        self.assertEqual(NotificationOutbox.objects.count(), 1)
+
+
+class OrderConditionalGetTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='etaguser',
+            email='etaguser@example.com',
+            password='testpass123'
+        )
+        self.other = get_user_model().objects.create_user(
+            username='otheruser',
+            email='otheruser@example.com',
+            password='testpass123'
+        )
+        product = Product.objects.create(name='Роза', price=100, available=True)
+        self.order = place_order(
+            Order(
+                user=self.user,
+                delivery_address='Москва, ул. Пушкина, д. 10',
+                delivery_time=timezone.now() + timezone.timedelta(hours=1)
+            ),
+            {product.id: 1}
+        )
+        self.client.login(email='etaguser@example.com', password='testpass123')
+
+    def test_order_detail_not_modified_until_status_changes(self):
+        url = reverse('orders:order_detail', args=[self.order.pk])
+        response = self.client.get(url)
+        self.assertTrue(response.has_header('ETag'))
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        # Сессия, пользователь и одна выборка валидаторов
+        with self.assertNumQueries(3):
+            repeat = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(repeat.status_code, 304)
+
+        self.order.status = 'in_progress'
+        self.order.save(update_fields=['status'])
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+
+    def test_bulk_transition_changes_validators(self):
+        url = reverse('orders:order_list')
+        response = self.client.get(url)
+        transition_orders(Order.objects.filter(pk=self.order.pk), 'completed')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_order_list_not_modified(self):
+        url = reverse('orders:order_list')
+        response = self.client.get(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304
+        )
+
+    def test_foreign_order_is_never_not_modified(self):
+        url = reverse('orders:order_detail', args=[self.order.pk])
+        etag = self.client.get(url)['ETag']
+        self.client.login(email='otheruser@example.com', password='testpass123')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='*').status_code, 403)
+
+
+class OrderQueryPlanTest(QueryPlanAssertions, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = get_user_model().objects.create_superuser(
+            username='planstaff', email='planstaff@example.com', password='testpass123'
+        )
+        customers = [
+            get_user_model().objects.create_user(
+                username=f'plancustomer{i}', email=f'plancustomer{i}@example.com', password='testpass123'
+            )
+            for i in range(10)
+        ]
+        cls.customer = customers[0]
+        statuses = [status for status, _ in Order.STATUS_CHOICES]
+        delivery_time = timezone.now() + timezone.timedelta(days=1)
+        Order.objects.bulk_create([
+            Order(
+                user=customers[i % len(customers)],
+                delivery_address='Москва',
+                delivery_time=delivery_time,
+                status=statuses[i % len(statuses)],
+            )
+            for i in range(500)
+        ])
+        analyze()
+
+    def test_customer_order_list(self):
+        self.client.force_login(self.customer)
+        self.assertQueryIndexed(Order.objects.filter(user=self.customer))
+        self.assertViewQueriesIndexed(reverse('orders:order_list'))
+
+    def test_all_orders(self):
+        self.client.force_login(self.staff)
+        self.assertQueryIndexed(Order.objects.all()[:50])
+        response = self.assertViewQueriesIndexed(reverse('orders:all_orders'))
+        self.assertViewQueriesIndexed(reverse('orders:all_orders') + f"?cursor={response.context['page'].next_cursor}")
+        self.assertViewQueriesIndexed(reverse('orders:all_orders') + '?status=completed')
+
+    def test_admin_status_filter(self):
+        self.client.force_login(self.staff)
+        self.assertQueryIndexed(Order.objects.filter(status='completed').order_by('-created_at', '-pk')[:100])
+        self.assertViewQueriesIndexed(reverse('admin:orders_order_changelist') + '?status__exact=completed')
+
+
+class OrderBoardTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = get_user_model().objects.create_user(
+            username='boardstaff', email='boardstaff@example.com', password='testpass123', is_staff=True
+        )
+        customers = [
+            get_user_model().objects.create_user(
+                username=f'boardcustomer{i}', email=f'boardcustomer{i}@example.com', password='testpass123'
+            )
+            for i in range(20)
+        ]
+        cls.customer = customers[3]
+        products = Product.objects.bulk_create([Product(name=f'Роза {i}', price=100 + i) for i in range(50)])
+        statuses = [status for status, _ in Order.STATUS_CHOICES]
+        moscow_tz = pytz.timezone('Europe/Moscow')
+        cls.first_day = moscow_tz.localize(timezone.datetime(2024, 3, 1, 10, 0))
+        orders = Order.objects.bulk_create([
+            Order(
+                user=customers[i % len(customers)],
+                delivery_address=f'Москва, ул. Пушкина, д. {i}',
+                delivery_time=cls.first_day + timezone.timedelta(days=i % 30),
+                status=statuses[i % len(statuses)],
+                total_amount=Decimal('300.00'),
+                items_count=2,
+            )
+            for i in range(10000)
+        ], batch_size=1000)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=products[(order.pk + shift) % len(products)], quantity=1, price=150)
+            for order in orders for shift in (0, 1)
+        ], batch_size=1000)
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+        self.url = reverse('orders:all_orders')
+
+    def test_page_has_fixed_query_budget(self):
+        # Сессия, пользователь, заказы с покупателями, позиции с товарами
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url)
+        orders = response.context['orders']
+        self.assertEqual(len(orders), ORDERS_PER_PAGE)
+        self.assertEqual(
+            [order.pk for order in orders],
+            list(Order.objects.order_by('-created_at', '-id').values_list('pk', flat=True)[:ORDERS_PER_PAGE])
+        )
+        self.assertContains(response, orders[0].user.username)
+        self.assertContains(response, orders[0].items.all()[0].product.name)
+
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url, {'status': 'new', 'cursor': response.context['page'].next_cursor})
+        self.assertEqual(len(response.context['orders']), ORDERS_PER_PAGE)
+
+    def test_filters_are_kept_across_pages(self):
+        params = {
+            'status': 'completed',
+            'delivery_from': '2024-03-05',
+            'delivery_to': '2024-03-14',
+            'customer': self.customer.email.upper(),
+        }
+        expected = list(
+            Order.objects.filter(
+                status='completed', user=self.customer,
+                delivery_time__gte=self.first_day + timezone.timedelta(days=4),
+                delivery_time__lt=self.first_day + timezone.timedelta(days=14),
+            ).order_by('-created_at', '-id').values_list('pk', flat=True)
+        )
+        self.assertTrue(expected)
+
+        seen, cursor = [], None
+        while True:
+            response = self.client.get(self.url, {**params, **({'cursor': cursor} if cursor else {})})
+            seen.extend(order.pk for order in response.context['orders'])
+            page = response.context['page']
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+            self.assertContains(response, 'customer=BOARDCUSTOMER3%40EXAMPLE.COM')
+        self.assertEqual(seen, expected)
+
+    def test_invalid_delivery_window(self):
+        response = self.client.get(self.url, {'delivery_from': '2024-03-10', 'delivery_to': '2024-03-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['orders'])
+        self.assertContains(response, 'Начало периода доставки позже его конца')
+
+    def test_board_is_staff_only(self):
+        self.client.force_login(self.customer)
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+
+class OrderHistoryTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username='corporate', email='corporate@example.com', password='testpass123'
+        )
+        other = get_user_model().objects.create_user(
+            username='historyother', email='historyother@example.com', password='testpass123'
+        )
+        products = Product.objects.bulk_create([Product(name=f'Пион {i}', price=200) for i in range(10)])
+        orders = Order.objects.bulk_create([
+            Order(
+                user=cls.user if i % 4 else other,
+                delivery_address='Москва',
+                delivery_time=timezone.now() + timezone.timedelta(days=1),
+                total_amount=Decimal('400.00'),
+                items_count=2,
+            )
+            for i in range(60)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=products[(order.pk + shift) % len(products)], quantity=1, price=200)
+            for order in orders for shift in (0, 1)
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_history_is_paginated_with_products_prefetched(self):
+        url = reverse('orders:order_list')
+        seen, cursor = [], None
+        while True:
+            # Сессия, пользователь, валидаторы, заказы с позициями и архивные заказы
+            with self.assertNumQueries(6):
+                response = self.client.get(url, {'cursor': cursor} if cursor else {})
+            self.assertLessEqual(len(response.context['orders']), HISTORY_PER_PAGE)
+            seen.extend(order.pk for order in response.context['orders'])
+            if not response.context['page'].has_next:
+                break
+            cursor = response.context['page'].next_cursor
+        expected = Order.objects.filter(user=self.user).order_by('-created_at', '-id').values_list('pk', flat=True)
+        self.assertEqual(seen, list(expected))
+        self.assertContains(response, 'Пион')
+
+    def test_pages_have_distinct_etags(self):
+        url = reverse('orders:order_list')
+        first = self.client.get(url)
+        second = self.client.get(url, {'cursor': first.context['page'].next_cursor})
+        self.assertNotEqual(first['ETag'], second['ETag'])
+
+    def test_recent_order_summaries(self):
+        with self.assertNumQueries(1):
+            summaries = recent_order_summaries(self.user, limit=3)
+        latest = Order.objects.filter(user=self.user).order_by('-created_at', '-id')[:3]
+        self.assertEqual([summary['id'] for summary in summaries], [order.pk for order in latest])
+        self.assertEqual(summaries[0]['total_amount'], Decimal('400.00'))
+        self.assertEqual(summaries[0]['items_count'], 2)
+        self.assertEqual(summaries[0]['status_display'], 'Новый')
+
+    def test_profile_shows_recent_orders(self):
+        response = self.client.get(reverse('users:profile'))
+        self.assertEqual(len(response.context['recent_orders']), 5)
+        self.assertContains(response, reverse('orders:reorder', args=[response.context['recent_orders'][0]['id']]))
+
+
+class OrderArchiveTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='archiveuser', email='archiveuser@example.com', password='testpass123'
+        )
+        self.product = Product.objects.create(name='Гортензия', price=500, available=True)
+        old = timezone.now() - timezone.timedelta(days=200)
+        self.orders = {}
+        for name, status, created_at in [
+            ('completed', 'completed', old),
+            ('canceled', 'canceled', old + timezone.timedelta(days=1)),
+            ('delivering', 'in_delivery', old + timezone.timedelta(days=2)),
+            ('recent', 'completed', timezone.now()),
+        ]:
+            order = place_order(
+                Order(
+                    user=self.user,
+                    delivery_address='Москва, ул. Пушкина, д. 10',
+                    delivery_time=timezone.now() + timezone.timedelta(hours=1)
+                ),
+                {self.product.id: 2}
+            )
+            transition_orders(Order.objects.filter(pk=order.pk), status)
+            Order.objects.filter(pk=order.pk).update(created_at=created_at)
+            self.orders[name] = order.pk
+        self.client.force_login(self.user)
+
+    def test_archives_old_finished_orders_in_batches(self):
+        reports = list(DailyReport.objects.values_list('date', 'order_count', 'total_revenue'))
+        self.assertEqual(archive_orders(days=90, batch_size=1), 2)
+
+        archived = {self.orders['completed'], self.orders['canceled']}
+        self.assertEqual(set(ArchivedOrder.objects.values_list('pk', flat=True)), archived)
+        self.assertFalse(Order.objects.filter(pk__in=archived).exists())
+        self.assertFalse(OrderItem.objects.filter(order_id__in=archived).exists())
+        self.assertFalse(OrderStatusHistory.objects.filter(order_id__in=archived).exists())
+
+        order = ArchivedOrder.objects.get(pk=self.orders['canceled'])
+        self.assertEqual(order.status, 'canceled')
+        self.assertEqual(order.total_amount, Decimal('1000.00'))
+        self.assertEqual(list(order.items.values_list('product_id', 'quantity')), [(self.product.pk, 2)])
+        self.assertEqual(
+            list(order.status_history.values_list('from_status', 'to_status')), [('', 'new'), ('new', 'canceled')]
+        )
+        # Архивирование не трогает дневную аналитику
+        self.assertEqual(list(DailyReport.objects.values_list('date', 'order_count', 'total_revenue')), reports)
+        self.assertEqual(archive_orders(days=90), 0)
+
+    def test_history_reads_archived_orders(self):
+        archive_orders(days=90)
+        response = self.client.get(reverse('orders:order_list'))
+        expected = [self.orders[name] for name in ('recent', 'delivering', 'canceled', 'completed')]
+        self.assertEqual([order.pk for order in response.context['orders']], expected)
+        self.assertContains(response, 'Гортензия', count=4)
+
+        with patch('orders.views.HISTORY_PER_PAGE', 2):
+            first = self.client.get(reverse('orders:order_list'))
+            second = self.client.get(reverse('orders:order_list'), {'cursor': first.context['page'].next_cursor})
+        self.assertEqual([order.pk for order in second.context['orders']], expected[2:])
+        self.assertFalse(second.context['page'].has_next)
+
+        self.assertEqual(
+            [summary['id'] for summary in recent_order_summaries(self.user)], expected
+        )
+
+    def test_archived_order_detail_and_reorder(self):
+        archive_orders(days=90)
+        order_id = self.orders['completed']
+        self.assertIsInstance(find_order(order_id), ArchivedOrder)
+        self.assertIsNone(find_order(order_id, user=get_user_model().objects.create_user(
+            username='stranger', email='stranger@example.com', password='testpass123'
+        )))
+
+        response = self.client.get(reverse('orders:order_detail', args=[order_id]))
+        self.assertContains(response, 'Гортензия')
+        self.assertTrue(response.has_header('ETag'))
+
+        working_hours = pytz.timezone('Europe/Moscow').localize(timezone.datetime(2024, 1, 1, 12, 0))
+        with patch('orders.views.timezone.localtime', return_value=working_hours):
+            response = self.client.get(reverse('orders:reorder', args=[order_id]))
+        self.assertEqual(response.context['form'].fields[f'quantity_{self.product.pk}'].initial, 2)
+        self.assertEqual(
+            self.client.get(reverse('orders:update_order_status', args=[order_id])).status_code, 302
+        )
+
+    def test_command(self):
+        out = StringIO()
+        call_command('archive_orders', days=90, dry_run=True, stdout=out)
+        self.assertIn('Заказов к архивированию: 2', out.getvalue())
+        self.assertFalse(ArchivedOrder.objects.exists())
+        call_command('archive_orders', days=90, stdout=out)
+        self.assertIn('Перенесено в архив заказов: 2', out.getvalue())
+        self.assertEqual(ArchivedOrderItem.objects.count(), 2)
+
+
+class DeliverySlotTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='slotuser', email='slotuser@example.com', password='testpass123'
+        )
+        cache.clear()
+        self.product = Product.objects.create(name='Тюльпан', price=150, available=True)
+        self.day = timezone.now().date() + timezone.timedelta(days=1)
+        self.delivery_time = delivery_at(self.day, 11)
+        ensure_slots(self.day)
+        self.slot = DeliverySlot.objects.get(starts_at=delivery_at(self.day, 11, 0))
+        self.slot.capacity = 2
+        self.slot.save()
+
+    def _place(self, delivery_time=None):
+        return place_order(
+            Order(
+                user=self.user,
+                delivery_address='Москва, ул. Пушкина, д. 10',
+                delivery_time=delivery_time or self.delivery_time
+            ),
+            {self.product.id: 1}
+        )
+
+    def test_reservation_fills_slot(self):
+        first, second = self._place(), self._place()
+        self.assertEqual({first.delivery_slot_id, second.delivery_slot_id}, {self.slot.pk})
+        with self.assertRaises(ValidationError):
+            self._place()
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.reserved, 2)
+        self.assertEqual(Order.objects.count(), 2)
+
+        # Соседнее окно не затронуто
+        self.assertIsNotNone(self._place(delivery_at(self.day, 12)).delivery_slot_id)
+
+    def test_slots_created_on_demand(self):
+        day = self.day + timezone.timedelta(days=5)
+        order = self._place(delivery_at(day, 17, 59))
+        self.assertEqual(order.delivery_slot.starts_at, delivery_at(day, 17, 0))
+        self.assertEqual(DeliverySlot.objects.filter(starts_at__date=day).count(), 9)
+        # Вне рабочих часов слот не бронируется
+        self.assertIsNone(self._place(delivery_at(day, 20)).delivery_slot_id)
+
+    def test_cancel_releases_and_restore_reserves(self):
+        order = self._place()
+        self._place()
+        order.status = 'canceled'
+        order.save(update_fields=['status'])
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.reserved, 1)
+        self._place()
+
+        # Возврат из отмены занимает место даже сверх вместимости
+        transition_orders(Order.objects.filter(pk=order.pk), 'new')
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.reserved, 3)
+
+        transition_orders(Order.objects.all(), 'canceled')
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.reserved, 0)
+
+    def test_stale_double_cancel_releases_once(self):
+        order = self._place()
+        self._place()
+        # Два сотрудника открыли заказ до отмены; второй сохраняет устаревший экземпляр целиком
+        first, second = Order.objects.get(pk=order.pk), Order.objects.get(pk=order.pk)
+        first.status = 'canceled'
+        first.save(update_fields=['status'])
+        second.status = 'canceled'
+        second.save()
+        transition_orders(Order.objects.filter(pk=order.pk), 'canceled')
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.reserved, 1)
+        order.refresh_from_db()
+        self.assertIsNone(order.delivery_slot_id)
+
+        # Откат отмены занимает место один раз, даже если его повторяют
+        transition_orders(Order.objects.filter(pk=order.pk), 'new')
+        restore_slots([order.pk])
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.reserved, 2)
+
+    def test_delete_releases_slot(self):
+        self._place().delete()
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.reserved, 0)
+
+        canceled = self._place()
+        transition_orders(Order.objects.filter(pk=canceled.pk), 'canceled')
+        canceled.delete()
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.reserved, 0)
+
+    def test_admin_keeps_delivery_time_of_placed_order(self):
+        order = self._place()
+        staff = get_user_model().objects.create_superuser(
+            username='slotadmin', email='slotadmin@example.com', password='testpass123'
+        )
+        self.client.force_login(staff)
+        response = self.client.get(reverse('admin:orders_order_change', args=[order.pk]))
+        self.assertNotIn('delivery_time', response.context['adminform'].form.fields)
+
+    def test_availability_is_cached_until_reservation_commits(self):
+        with patch('django.utils.timezone.now', return_value=delivery_at(self.day, 8)):
+            slots = slot_availability(days=1)
+            self.assertEqual(len(slots), 9)
+            self.assertEqual(next(row['free'] for row in slots if row['id'] == self.slot.pk), 2)
+            with self.assertNumQueries(0):
+                slot_availability(days=1)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self._place()
+                self._place()
+            slots = slot_availability(days=1)
+        self.assertEqual(next(row['free'] for row in slots if row['id'] == self.slot.pk), 0)
+
+        # Устаревший кеш не мешает оформлению: место проверяет только условный UPDATE
+        DeliverySlot.objects.filter(pk=self.slot.pk).update(reserved=1)
+        form = OrderForm(data={
+            'delivery_address': 'Москва', 'delivery_time': self.delivery_time.strftime('%Y-%m-%dT%H:%M'),
+        })
+        with patch('django.utils.timezone.now', return_value=delivery_at(self.day, 8)):
+            self.assertFalse(next(row['free'] for row in slot_availability(days=1) if row['id'] == self.slot.pk))
+            self.assertTrue(form.is_valid())
+        self.assertEqual(self._place().delivery_slot_id, self.slot.pk)
+
+
+class DeliverySlotConcurrencyTest(TransactionTestCase):
+    THREADS = 8
+    CAPACITY = 3
+
+    def test_parallel_checkouts_never_overbook(self):
+        user = get_user_model().objects.create_user(
+            username='rushuser', email='rushuser@example.com', password='testpass123'
+        )
+        product = Product.objects.create(name='Мимоза', price=300, available=True)
+        day = timezone.now().date() + timezone.timedelta(days=1)
+        ensure_slots(day)
+        slot = DeliverySlot.objects.get(starts_at=delivery_at(day, 10, 0))
+        slot.capacity = self.CAPACITY
+        slot.save()
+
+        placed, rejected, errors = [], [], []
+        barrier = threading.Barrier(self.THREADS)
+
+        def worker():
+            try:
+                barrier.wait()
+                placed.append(place_order_retrying(
+                    lambda: Order(user=user, delivery_address='Москва', delivery_time=delivery_at(day, 10)),
+                    {product.id: 1},
+                ).pk)
+            except ValidationError:
+                rejected.append(1)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(placed), self.CAPACITY)
+        self.assertEqual(len(rejected), self.THREADS - self.CAPACITY)
+        slot.refresh_from_db()
+        self.assertEqual(slot.reserved, self.CAPACITY)
+        self.assertEqual(Order.objects.filter(delivery_slot=slot).count(), self.CAPACITY)
+
+
+class IdempotentSubmissionConcurrencyTest(TransactionTestCase):
+    THREADS = 6
+
+    def test_concurrent_identical_submissions_create_one_order(self):
+        user = get_user_model().objects.create_user(
+            username='doubleclick', email='doubleclick@example.com', password='testpass123'
+        )
+        product = Product.objects.create(name='Лилия', price=400, available=True)
+        day = timezone.now().date() + timezone.timedelta(days=1)
+        results, errors = [], []
+        barrier = threading.Barrier(self.THREADS)
+
+        def worker():
+            try:
+                barrier.wait()
+                results.append(place_order_retrying(
+                    lambda: Order(
+                        user=user, delivery_address='Москва', delivery_time=delivery_at(day, 15),
+                        idempotency_key='same-form',
+                    ),
+                    {product.id: 3},
+                ).pk)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        order = Order.objects.get()
+        self.assertEqual(results, [order.pk] * self.THREADS)
+        self.assertEqual(order.items.get().quantity, 3)
+        self.assertEqual(NotificationOutbox.objects.count(), 1)
+        self.assertEqual(DailyReport.objects.get().order_count, 1)
+        self.assertEqual(order.delivery_slot.reserved, 1)
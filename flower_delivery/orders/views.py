@@ -1,22 +1,21 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.utils import timezone
-from django.core.exceptions import PermissionDenied
-from .models import Order, OrderItem
-from catalog.models import Product
-from .forms import OrderForm
-from bot.telegram import send_order_notification
-from analytics.models import DailyReport
-from decimal import Decimal
-from django.http import HttpResponseForbidden
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.db.models import Count, Max
+from django.views.decorators.http import condition
+from flower_delivery.conditional import page_etag
+from flower_delivery.pagination import keyset_paginate
+from .archive import customer_orders_page, find_order, items_with_products
+from .models import ArchivedOrder, Order
+from .forms import OrderBoardFilterForm, OrderForm
+from .services import place_order, parse_quantities, recent_order_summaries, submitted_order
+from .slots import slot_availability
+from django.http import Http404, HttpResponseForbidden
 import pytz
 
-def update_daily_report(order):
-    today = timezone.now().date()
-    report, created = DailyReport.objects.get_or_create(date=today)
-    report.order_count += 1
-    report.total_revenue = Decimal(str(report.total_revenue)) + order.total_price
-    report.save()
+ORDERS_PER_PAGE = 50
+HISTORY_PER_PAGE = 20
 
 @login_required
 def order_create(request):
@@ -33,43 +32,76 @@ def order_create(request):
         if form.is_valid():
             order = form.save(commit=False)
             order.user = request.user
-            order.save()
-
-            items_added = False
-            for field_name, value in request.POST.items():
-                if field_name.startswith('quantity_') and value.isdigit() and int(value) > 0:
-                    product_id = field_name.split('_')[1]
-                    product = Product.objects.get(id=product_id)
-                    OrderItem.objects.create(
-                        order=order,
-                        product=product,
-                        price=product.price,
-                        quantity=int(value)
-                    )
-                    items_added = True
-
-            if not items_added:
-                order.delete()
-                form.add_error(None, "Выберите хотя бы один товар")
-                return render(request, 'orders/order_create.html', {'form': form})
-
-            update_daily_report(order)
-            send_order_notification(order.pk, is_new=True)
+            try:
+                place_order(order, parse_quantities(form.cleaned_data))
+            except ValidationError as e:
+                form.add_error(None, e)
+                return render(request, 'orders/order_create.html', {
+                    'form': form, 'delivery_slots': slot_availability(),
+                })
+
+            return redirect('orders:order_list')
+        elif submitted_order(request.user, request.POST.get('idempotency_key')):
+            # Повтор уже принятой формы: время доставки могло перестать проходить проверку
             return redirect('orders:order_list')
         else:
             print(f"Form errors: {form.errors}")
     else:
         form = OrderForm(user=request.user)
-    return render(request, 'orders/order_create.html', {'form': form})
+    return render(request, 'orders/order_create.html', {
+        'form': form, 'recent_orders': recent_order_summaries(request.user),
+        'delivery_slots': slot_availability(),
+    })
+
+def _order_list_validators(request):
+    # Одна агрегирующая выборка на запрос, даже если её используют и ETag, и Last-Modified
+    if not hasattr(request, '_order_list_validators'):
+        request._order_list_validators = Order.objects.filter(user=request.user).aggregate(
+            last_modified=Max('updated_at'), count=Count('id')
+        )
+    return request._order_list_validators
+
+def _order_list_etag(request):
+    validators = _order_list_validators(request)
+    return page_etag(
+        request, 'orders', validators['count'], validators['last_modified'], request.GET.get('cursor', '')
+    )
+
+def _order_list_last_modified(request):
+    return _order_list_validators(request)['last_modified']
 
 @login_required
+@condition(etag_func=_order_list_etag, last_modified_func=_order_list_last_modified)
 def order_list(request):
-    orders = Order.objects.filter(user=request.user).prefetch_related('items')
-    return render(request, 'orders/order_list.html', {'orders': orders})
+    page = customer_orders_page(request.user, request.GET.get('cursor'), HISTORY_PER_PAGE)
+    return render(request, 'orders/order_list.html', {'orders': page.object_list, 'page': page})
+
+def _order_validators(request, order_id):
+    if not hasattr(request, '_order_validators'):
+        row = (
+            Order.objects.filter(pk=order_id).values_list('user_id', 'updated_at').first()
+            or ArchivedOrder.objects.filter(pk=order_id).values_list('user_id', 'updated_at').first()
+        )
+        # Для чужого заказа валидаторов нет: представление само ответит отказом
+        if row is None or (row[0] != request.user.pk and not request.user.is_staff):
+            row = None
+        request._order_validators = row
+    return request._order_validators
+
+def _order_detail_etag(request, order_id):
+    validators = _order_validators(request, order_id)
+    return page_etag(request, 'order', order_id, validators[1]) if validators else None
+
+def _order_detail_last_modified(request, order_id):
+    validators = _order_validators(request, order_id)
+    return validators[1] if validators else None
 
 @login_required
+@condition(etag_func=_order_detail_etag, last_modified_func=_order_detail_last_modified)
 def order_detail(request, order_id):
-    order = get_object_or_404(Order, id=order_id)
+    order = find_order(order_id)
+    if order is None:
+        raise Http404("Заказ не найден")
     if order.user != request.user and not request.user.is_staff:
         raise PermissionDenied("У вас нет доступа к этому заказу")
     return render(request, 'orders/order_detail.html', {'order': order})
@@ -83,14 +115,15 @@ def update_order_status(request, order_id):
         if new_status in dict(Order.STATUS_CHOICES):
             order.status = new_status
             order.save(update_fields=['status'])
-            send_order_notification(order.pk, is_new=False)
             return redirect('orders:all_orders')
 
     return render(request, 'orders/update_order_status.html', {'order': order})
 
 @login_required
 def reorder(request, order_id):
-    original_order = get_object_or_404(Order, id=order_id, user=request.user)
+    original_order = find_order(order_id, user=request.user)
+    if original_order is None:
+        raise Http404("Заказ не найден")
     moscow_tz = pytz.timezone('Europe/Moscow')
     current_time = timezone.localtime(timezone.now(), moscow_tz)
 
@@ -104,28 +137,16 @@ def reorder(request, order_id):
         if form.is_valid():
             new_order = form.save(commit=False)
             new_order.user = request.user
-            new_order.save()
-
-            items_added = False
-            for field_name, value in request.POST.items():
-                if field_name.startswith('quantity_') and value.isdigit() and int(value) > 0:
-                    product_id = field_name.split('_')[1]
-                    product = Product.objects.get(id=product_id)
-                    OrderItem.objects.create(
-                        order=new_order,
-                        product=product,
-                        price=product.price,
-                        quantity=int(value)
-                    )
-                    items_added = True
-
-            if not items_added:
-                new_order.delete()
-                form.add_error(None, "Выберите хотя бы один товар")
-                return render(request, 'orders/order_create.html', {'form': form, 'reorder': True})
-
-            update_daily_report(new_order)
-            send_order_notification(new_order.pk, is_new=True)
+            try:
+                place_order(new_order, parse_quantities(form.cleaned_data))
+            except ValidationError as e:
+                form.add_error(None, e)
+                return render(request, 'orders/order_create.html', {
+                    'form': form, 'reorder': True, 'delivery_slots': slot_availability(),
+                })
+
+            return redirect('orders:order_list')
+        elif submitted_order(request.user, request.POST.get('idempotency_key')):
             return redirect('orders:order_list')
     else:
         initial_data = {
@@ -135,9 +156,22 @@ def reorder(request, order_id):
         }
         form = OrderForm(initial=initial_data, user=request.user, reorder_data=original_order)
 
-    return render(request, 'orders/order_create.html', {'form': form, 'reorder': True})
+    return render(request, 'orders/order_create.html', {
+        'form': form, 'reorder': True, 'delivery_slots': slot_availability(),
+    })
 
 @user_passes_test(lambda u: u.is_staff)
 def all_orders(request):
-    orders = Order.objects.all().prefetch_related('items')
-    return render(request, 'orders/all_orders.html', {'orders': orders})
+    form = OrderBoardFilterForm(request.GET)
+    orders = Order.objects.none()
+    page = None
+    if form.is_valid():
+        # Страница доски — фиксированное число запросов: заказы с покупателями и позиции с товарами
+        orders = form.filter(Order.objects.select_related('user')).prefetch_related(items_with_products())
+        page = keyset_paginate(orders, request.GET.get('cursor'), ORDERS_PER_PAGE)
+        orders = page.object_list
+    filters = request.GET.copy()
+    filters.pop('cursor', None)
+    return render(request, 'orders/all_orders.html', {
+        'orders': orders, 'page': page, 'form': form, 'filters': filters.urlencode(),
+    })
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from reviews.ratings import reconcile_ratings
+
+
+class Command(BaseCommand):
+    help = "Пересчёт количества и суммы оценок товаров по отзывам"
+
+    def handle(self, *args, **options):
+        updated = reconcile_ratings()
+        self.stdout.write(self.style.SUCCESS(f"Пересчитаны оценки товаров: {updated}"))
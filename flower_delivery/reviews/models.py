@@ -21,6 +21,15 @@ class Review(models.Model):
         verbose_name = 'Отзыв'
         verbose_name_plural = 'Отзывы'
         ordering = ['-created_at']
+        indexes = [models.Index(fields=['product', 'created_at'], name='review_product_created_idx')]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Исходные значения нужны для поправки агрегатов товара при редактировании
+        instance._loaded_rating = instance.__dict__.get('rating')
+        instance._loaded_product_id = instance.__dict__.get('product_id')
+        return instance
 
     def __str__(self):
         return f'Отзыв на {self.product.name} от {self.user.username}'
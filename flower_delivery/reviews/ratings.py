@@ -0,0 +1,37 @@
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from catalog.cache import bump_catalog_version_on_commit
+from catalog.models import Product
+from .models import Review
+
+
+def apply_rating_delta(product_id: int, count: int = 0, rating: int = 0) -> None:
+    """Атомарная поправка агрегатов оценок товара без чтения строки"""
+    if not product_id or not (count or rating):
+        return
+    Product.objects.filter(pk=product_id).update(
+        rating_count=F('rating_count') + count,
+        rating_sum=F('rating_sum') + rating,
+        updated_at=timezone.now(),
+    )
+    bump_catalog_version_on_commit()
+
+
+def reconcile_ratings(products=None) -> int:
+    """
+    Пересчёт агрегатов оценок с нуля.
+
+    Выполняется одним UPDATE с группирующими подзапросами,
+    возвращает количество обновлённых товаров.
+    """
+    if products is None:
+        products = Product.objects.all()
+    reviews = Review.objects.filter(product=OuterRef('pk')).order_by().values('product')
+    updated = products.update(
+        rating_count=Coalesce(Subquery(reviews.annotate(count=Count('pk')).values('count')), Value(0)),
+        rating_sum=Coalesce(Subquery(reviews.annotate(total=Sum('rating')).values('total')), Value(0)),
+        updated_at=timezone.now(),
+    )
+    bump_catalog_version_on_commit()
+    return updated
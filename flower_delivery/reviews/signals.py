@@ -0,0 +1,33 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from catalog.cache import bump_catalog_version_on_commit
+from .models import Review
+from .ratings import apply_rating_delta
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, **kwargs):
+    product_id, rating = instance.__dict__.get('product_id'), instance.__dict__.get('rating')
+    old_product_id = getattr(instance, '_loaded_product_id', None)
+    old_rating = getattr(instance, '_loaded_rating', None)
+    # Отзыв, загруженный через only()/defer() без этих полей, не отслеживается:
+    # расхождение исправит reconcile_ratings
+    tracked = None not in (old_product_id, old_rating, product_id, rating)
+    if created:
+        apply_rating_delta(product_id, 1, rating)
+    elif tracked and old_product_id != product_id:
+        apply_rating_delta(old_product_id, -1, -old_rating)
+        apply_rating_delta(product_id, 1, rating)
+    elif tracked and old_rating != rating:
+        apply_rating_delta(product_id, 0, rating - old_rating)
+    else:
+        # Агрегаты не изменились, но текст отзыва на страницах мог измениться
+        bump_catalog_version_on_commit()
+    instance._loaded_product_id = product_id
+    instance._loaded_rating = rating
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    # При каскадном удалении вместе с товаром UPDATE просто не затронет ни одной строки
+    product_id = getattr(instance, '_loaded_product_id', None) or instance.product_id
+    rating = getattr(instance, '_loaded_rating', None) or instance.rating
+    apply_rating_delta(product_id, -1, -rating)
@@ -1,9 +1,13 @@
+from io import StringIO
+from django.core.management import call_command
 from django.test import TestCase
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from catalog.models import Product
 from reviews.models import Review
 from reviews.forms import ReviewForm  # Импортируем форму
+from reviews.views import REVIEWS_PER_PAGE
+from flower_delivery.testing import QueryPlanAssertions, analyze
 
 class ReviewTestCase(TestCase):
     def setUp(self):
@@ -89,4 +93,133 @@ class ReviewTestCase(TestCase):
         self.assertRedirects(
             response,
             f"{reverse('users:login')}?next={reverse('reviews:review_create', args=[self.product.pk])}"
-        )
\ No newline at end of file
+        )
+
+class ProductRatingTestCase(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='rater',
+            email='rater@example.com',
+            password='testpass'
+        )
+        self.product = Product.objects.create(name='Аллегрия', price=300, available=True)
+        self.other = Product.objects.create(name='Аллилуйя', price=300, available=True)
+
+    def _review(self, product, rating):
+        return Review.objects.create(product=product, user=self.user, rating=rating, comment='Букет')
+
+    def _ratings(self, product):
+        product.refresh_from_db()
+        return product.rating_count, product.rating_sum
+
+    def test_create_edit_delete(self):
+        first = self._review(self.product, 5)
+        self._review(self.product, 4)
+        self.assertEqual(self._ratings(self.product), (2, 9))
+        self.assertEqual(self.product.rating_avg, 4.5)
+
+        first = Review.objects.get(pk=first.pk)
+        first.rating = 1
+        first.save()
+        self.assertEqual(self._ratings(self.product), (2, 5))
+
+        first.product = self.other
+        first.save()
+        self.assertEqual(self._ratings(self.product), (1, 4))
+        self.assertEqual(self._ratings(self.other), (1, 1))
+
+        first.delete()
+        self.assertEqual(self._ratings(self.other), (0, 0))
+        self.assertIsNone(self.other.rating_avg)
+
+    def test_rating_update_is_atomic(self):
+        review = self._review(self.product, 3)
+        with self.assertNumQueries(2):
+            review.rating = 5
+            review.save(update_fields=['rating'])
+        self.assertEqual(self._ratings(self.product), (1, 5))
+
+    def test_reconcile_command(self):
+        self._review(self.product, 5)
+        self._review(self.product, 2)
+        self._review(self.other, 4)
+        Product.objects.update(rating_count=100, rating_sum=7)
+        out = StringIO()
+        with self.assertNumQueries(1):
+            call_command('reconcile_ratings', stdout=out)
+        self.assertEqual(self._ratings(self.product), (2, 7))
+        self.assertEqual(self._ratings(self.other), (1, 4))
+
+    def test_pages_show_rating_without_extra_queries(self):
+        for rating in (5, 4, 4):
+            self._review(self.product, rating)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('catalog:product_detail', args=[self.product.pk]))
+        self.assertContains(response, '4,3')
+        self.assertContains(response, 'Посмотреть отзывы (3)')
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('catalog:product_list'))
+        self.assertContains(response, '4,3')
+
+
+class ReviewListPaginationTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(name='Аллегрия', price=300, available=True)
+        users = [
+            get_user_model().objects.create_user(username=f'user{i}', email=f'user{i}@example.com', password='testpass')
+            for i in range(5)
+        ]
+        Review.objects.bulk_create([
+            Review(product=cls.product, user=users[i % len(users)], rating=i % 5 + 1, comment=f'Отзыв {i}')
+            for i in range(REVIEWS_PER_PAGE * 2 + 3)
+        ])
+
+    def test_page_query_count_is_bounded(self):
+        # Товар и страница отзывов вместе с авторами
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('reviews:review_list', args=[self.product.pk]))
+        self.assertEqual(len(response.context['reviews']), REVIEWS_PER_PAGE)
+        self.assertTrue(response.context['page'].has_next)
+        self.assertContains(response, 'user0')
+
+    def test_json_endpoint_walks_all_reviews(self):
+        url = reverse('reviews:review_list_json', args=[self.product.pk])
+        seen, cursor = [], None
+        while True:
+            with self.assertNumQueries(1):
+                response = self.client.get(url, {'cursor': cursor} if cursor else {})
+            data = response.json()
+            seen.extend(review['id'] for review in data['results'])
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(len(seen), Review.objects.count())
+        self.assertEqual(seen, list(Review.objects.order_by('-created_at', '-id').values_list('id', flat=True)))
+        self.assertEqual(set(data['results'][0]), {'id', 'user', 'rating', 'comment', 'created_at'})
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('reviews:review_list_json', args=[self.product.pk]), {'cursor': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ReviewQueryPlanTestCase(QueryPlanAssertions, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        products = Product.objects.bulk_create([Product(name=f'Роза {i}', price=300) for i in range(20)])
+        cls.product = products[0]
+        users = [
+            get_user_model().objects.create_user(username=f'planuser{i}', email=f'planuser{i}@example.com', password='testpass')
+            for i in range(5)
+        ]
+        Review.objects.bulk_create([
+            Review(product=products[i % len(products)], user=users[i % len(users)], rating=5, comment=f'Отзыв {i}')
+            for i in range(1000)
+        ])
+        analyze()
+
+    def test_review_pages(self):
+        url = reverse('reviews:review_list_json', args=[self.product.pk])
+        response = self.assertViewQueriesIndexed(url)
+        self.assertViewQueriesIndexed(f"{url}?cursor={response.json()['next_cursor']}")
+        self.assertViewQueriesIndexed(reverse('reviews:review_list', args=[self.product.pk]))
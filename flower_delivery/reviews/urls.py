@@ -6,4 +6,5 @@ app_name = 'reviews'
 urlpatterns = [
     path('create/<int:product_id>/', views.review_create, name='review_create'),
     path('list/<int:product_id>/', views.review_list, name='review_list'),
+    path('list/<int:product_id>/json/', views.review_list_json, name='review_list_json'),
 ]
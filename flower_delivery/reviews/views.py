@@ -1,9 +1,16 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.views.decorators.http import condition, require_GET
+from catalog.cache import get_catalog_version
 from catalog.models import Product
+from flower_delivery.conditional import page_etag
+from flower_delivery.pagination import keyset_paginate
 from .models import Review
 from .forms import ReviewForm
 
+REVIEWS_PER_PAGE = 20
+
 @login_required
 def review_create(request, product_id):
     product = get_object_or_404(Product, pk=product_id)
@@ -19,7 +26,39 @@ def review_create(request, product_id):
         form = ReviewForm()
     return render(request, 'reviews/review_form.html', {'form': form, 'product': product})
 
+def _review_page(request, product_id):
+    reviews = (
+        Review.objects.filter(product_id=product_id)
+        .select_related('user')
+        .only('id', 'rating', 'comment', 'created_at', 'user__username')
+    )
+    return keyset_paginate(reviews, request.GET.get('cursor'), REVIEWS_PER_PAGE)
+
+def _review_list_etag(request, product_id):
+    # Версия каталога меняется при любом изменении отзывов
+    return page_etag(request, 'reviews', product_id, get_catalog_version(), request.GET.get('cursor', ''))
+
+@condition(etag_func=_review_list_etag)
 def review_list(request, product_id):
-    product = get_object_or_404(Product, pk=product_id)
-    reviews = product.reviews.all()
-    return render(request, 'reviews/review_list.html', {'product': product, 'reviews': reviews})
\ No newline at end of file
+    product = get_object_or_404(Product.objects.only('id', 'name'), pk=product_id)
+    page = _review_page(request, product.pk)
+    return render(request, 'reviews/review_list.html', {'product': product, 'reviews': page.object_list, 'page': page})
+
+@require_GET
+@condition(etag_func=_review_list_etag)
+def review_list_json(request, product_id):
+    """Страница отзывов для бесконечной прокрутки"""
+    page = _review_page(request, product_id)
+    return JsonResponse({
+        'results': [
+            {
+                'id': review.pk,
+                'user': review.user.username,
+                'rating': review.rating,
+                'comment': review.comment,
+                'created_at': review.created_at.isoformat(),
+            }
+            for review in page
+        ],
+        'next_cursor': page.next_cursor,
+    })
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.4 on 2026-10-18 09:01
+
+import flower_delivery.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_customuser_address_customuser_avatar'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customuser',
+            name='avatar',
+            field=models.ImageField(blank=True, null=True, storage=flower_delivery.storage.get_content_storage, upload_to='avatars/', verbose_name='Аватар'),
+        ),
+    ]
@@ -1,14 +1,22 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from flower_delivery.storage import get_content_storage
 
 class CustomUser(AbstractUser):
     email = models.EmailField("Email", unique=True)
     phone = models.CharField("Телефон", max_length=20, blank=True, null=True)
-    avatar = models.ImageField("Аватар", upload_to='avatars/', blank=True, null=True)
+    avatar = models.ImageField("Аватар", upload_to='avatars/', storage=get_content_storage, blank=True, null=True)
     address = models.CharField("Адрес", max_length=255, blank=True, null=True)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Прежний аватар освобождается после замены
+        instance._loaded_avatar = instance.__dict__.get('avatar')
+        return instance
+
     def __str__(self):
         return self.email
\ No newline at end of file
@@ -0,0 +1,19 @@
+from functools import partial
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from flower_delivery.storage import release_file
+from .models import CustomUser
+
+@receiver(post_save, sender=CustomUser)
+def release_replaced_avatar(sender, instance, **kwargs):
+    old_avatar = getattr(instance, '_loaded_avatar', None)
+    new_avatar = instance.avatar.name if instance.avatar else None
+    if old_avatar and old_avatar != new_avatar:
+        transaction.on_commit(partial(release_file, old_avatar))
+    instance._loaded_avatar = new_avatar
+
+@receiver(post_delete, sender=CustomUser)
+def release_deleted_avatar(sender, instance, **kwargs):
+    if instance.avatar:
+        transaction.on_commit(partial(release_file, instance.avatar.name))
@@ -2,6 +2,7 @@ from django.shortcuts import render, redirect
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth import login as auth_login, logout as auth_logout
 from django.contrib.auth.decorators import login_required
+from orders.services import recent_order_summaries
 from .forms import CustomUserCreationForm, CustomAuthenticationForm, UserProfileForm
 
 def register(request):
@@ -39,4 +40,6 @@ def profile(request):
             return redirect('users:profile')
     else:
         form = UserProfileForm(instance=request.user)
-    return render(request, 'users/profile.html', {'form': form})
+    return render(request, 'users/profile.html', {
+        'form': form, 'recent_orders': recent_order_summaries(request.user),
+    })